@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Client, PersonnelClient ,Personnel, TypeLogiciel,TypeProbleme,Ticket,Logiciel,Utilisateur,Fichier,Role,Rapport
+from .models import Client, PersonnelClient ,Personnel, TypeLogiciel,TypeProbleme,Ticket,Logiciel,Utilisateur,Fichier,Role,Rapport,MailSortant,ProfilTechnicien
 
 admin.site.register(Client),
 admin.site.register(PersonnelClient),
@@ -12,5 +12,5 @@ admin.site.register(Utilisateur),
 admin.site.register(Fichier),
 admin.site.register(Role),
 admin.site.register(Rapport),
-
-
+admin.site.register(MailSortant),
+admin.site.register(ProfilTechnicien),
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SupportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'support'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
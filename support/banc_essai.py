@@ -0,0 +1,379 @@
+import hashlib
+import json
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    Client, Fichier, Logiciel, Personnel, PersonnelClient, ProfilTechnicien, Rapport, Role,
+    Televersement, Ticket, TypeLogiciel, TypeProbleme, Utilisateur,
+)
+from .statistiques import reconstruire
+from .televersement import chemin_partiel
+
+
+# === Banc d'essai des routes de l'API support ===
+#
+# peupler() crée un jeu de données synthétique de taille paramétrable, puis
+# executer() appelle chaque route de support/urls.py avec un vrai jeton JWT
+# (en-tête Authorization, comme un client réel) et relève pour chaque scénario
+# le nombre de requêtes SQL, la latence p50/p95 et la taille de la réponse.
+#
+# Les caches sont vidés avant chaque appel : on mesure le chemin froid, le
+# seul dont le nombre de requêtes ne dépend pas de l'ordre des scénarios.
+# BUDGETS borne le nombre de requêtes de chaque scénario ; ces bornes ne
+# dépendent pas de la taille du jeu : un champ imbriqué ajouté sans
+# préchargement (N+1) les fait dépasser dès que la page compte plus de
+# quelques lignes. Des budgets de latence ou de taille peuvent s'y ajouter
+# (commande benchmark_routes --budgets).
+#
+# Toute route doit avoir un scénario ou figurer dans ROUTES_IGNOREES :
+# une nouvelle route sans scénario fait échouer le banc.
+
+TAILLES = {
+    "clients": 20,
+    "personnels_par_client": 2,
+    "techniciens": 5,
+    "logiciels": 10,
+    "types_problemes": 6,
+    "tickets": 300,
+    "fichiers_par_ticket": 2,
+    "part_rapports": 0.5,
+}
+
+ROUTES_IGNOREES = {
+    "ticket-evenements": "flux SSE sans fin (réponse asynchrone jamais terminée)",
+}
+
+
+class Scenario:
+    def __init__(self, nom, route, methode="get", utilisateur="technicien", kwargs=None,
+                 params=None, donnees=None, format="json", type_contenu=None, statut=200):
+        self.nom = nom
+        self.route = route
+        self.methode = methode
+        self.utilisateur = utilisateur
+        # kwargs et donnees : fonctions (contexte, iteration) appelées hors mesure
+        self.kwargs = kwargs
+        self.params = params or {}
+        self.donnees = donnees
+        self.format = format
+        self.type_contenu = type_contenu
+        self.statut = statut
+
+
+SCENARIOS = [
+    Scenario("roles", "role-list-create"),
+    Scenario("utilisateurs", "utilisateur-list"),
+    Scenario("utilisateur-creation", "utilisateur-create", methode="post", statut=201,
+             donnees=lambda ctx, i: {
+                 "email": f"nouveau{i}@banc.local", "nom": "N", "prenom": str(i),
+                 "password": "banc-essai", "roles": [ctx.roles["personnel"].pk],
+             }),
+    Scenario("clients", "client-list-create"),
+    Scenario("client-detail", "client-detail", kwargs=lambda ctx, i: {"pk": ctx.clients[0].pk}),
+    Scenario("personnels", "personnel-list"),
+    Scenario("personnel-creation", "personnel-create", methode="post", statut=201,
+             donnees=lambda ctx, i: {"utilisateur": ctx.nouveau_personnel(i).pk, "poste": "Comptable"}),
+    Scenario("personnel-clients", "personnel-client-list-create", utilisateur="personnel"),
+    Scenario("personnel-client-detail", "personnel-client-detail",
+             kwargs=lambda ctx, i: {"pk": ctx.liens[0].pk}),
+    Scenario("types-logiciels", "type-logiciel-list-create"),
+    Scenario("types-problemes", "type-probleme-list-create"),
+    Scenario("logiciels", "logiciel-list-create"),
+    Scenario("logiciel-detail", "logiciel-detail", kwargs=lambda ctx, i: {"pk": ctx.logiciels[0].pk}),
+    Scenario("tickets", "ticket-list-create"),
+    Scenario("tickets-resume", "ticket-list-create", params={"view": "summary"}),
+    Scenario("tickets-filtres", "ticket-list-create", params={"statut": "en_cours", "ordering": "date_creation"}),
+    Scenario("ticket-creation", "ticket-list-create", methode="post", utilisateur="personnel", statut=201,
+             donnees=lambda ctx, i: {
+                 "lien": ctx.liens[0].pk, "logiciel": ctx.logiciels[0].pk,
+                 "description": f"Ticket du banc d'essai {i}",
+             }),
+    Scenario("ticket-detail", "ticket-detail", kwargs=lambda ctx, i: {"pk": ctx.tickets[0].pk}),
+    Scenario("ticket-recherche", "ticket-recherche", params={"q": "imprimante"}),
+    Scenario("evenements-jeton", "ticket-evenements-jeton", methode="post"),
+    Scenario("ticket-actions", "ticket-actions", methode="post",
+             donnees=lambda ctx, i: {
+                 "ids": [t.pk for t in ctx.tickets[:50]],
+                 "statut": ("en_cours", "en_attente")[i % 2],
+             }),
+    Scenario("ticket-import", "ticket-import", methode="post", format=None,
+             type_contenu="application/x-ndjson", donnees=lambda ctx, i: ctx.lignes_import(i, 50)),
+    Scenario("ticket-export", "ticket-export"),
+    Scenario("ticket-export-csv", "ticket-export", params={"type": "csv"}),
+    Scenario("mes-tickets", "mes-tickets", utilisateur="personnel"),
+    Scenario("tableau-de-bord", "tableau-de-bord"),
+    Scenario("rapports", "rapport-list-create"),
+    Scenario("fichiers", "fichier-list"),
+    Scenario("fichiers-tickets", "fichier-list", params={"expand": "ticket"}),
+    Scenario("fichier-telechargement", "fichier-telecharger",
+             kwargs=lambda ctx, i: {"pk": ctx.fichier_telechargeable.pk}),
+    Scenario("televersement-creation", "televersement-create", methode="post", statut=201,
+             donnees=lambda ctx, i: {"nom": "journal.txt", "taille": 1024}),
+    Scenario("televersement-detail", "televersement-detail",
+             kwargs=lambda ctx, i: {"pk": ctx.televersement.pk}),
+    Scenario("televersement-fin", "televersement-terminer", methode="post",
+             kwargs=lambda ctx, i: {"pk": ctx.televersement_complet(i).pk}),
+    Scenario("me", "me"),
+]
+
+# Nombre maximal de requêtes SQL par appel (authentification JWT comprise)
+BUDGETS = {
+    "roles": {"requetes": 3},
+    "utilisateurs": {"requetes": 5},
+    "utilisateur-creation": {"requetes": 10},
+    "clients": {"requetes": 3},
+    "client-detail": {"requetes": 2},
+    "personnels": {"requetes": 5},
+    "personnel-creation": {"requetes": 3},
+    "personnel-clients": {"requetes": 5},
+    "personnel-client-detail": {"requetes": 5},
+    "types-logiciels": {"requetes": 3},
+    "types-problemes": {"requetes": 3},
+    "logiciels": {"requetes": 4},
+    "logiciel-detail": {"requetes": 4},
+    "tickets": {"requetes": 9},
+    "tickets-resume": {"requetes": 2},
+    "tickets-filtres": {"requetes": 9},
+    "ticket-creation": {"requetes": 24},
+    "ticket-detail": {"requetes": 10},
+    "ticket-recherche": {"requetes": 4},
+    "evenements-jeton": {"requetes": 1},
+    "ticket-actions": {"requetes": 10},
+    "ticket-import": {"requetes": 13},
+    "ticket-export": {"requetes": 2},
+    "ticket-export-csv": {"requetes": 2},
+    "mes-tickets": {"requetes": 10},
+    "tableau-de-bord": {"requetes": 5},
+    "rapports": {"requetes": 2},
+    "fichiers": {"requetes": 2},
+    "fichiers-tickets": {"requetes": 10},
+    "fichier-telechargement": {"requetes": 2},
+    "televersement-creation": {"requetes": 2},
+    "televersement-detail": {"requetes": 2},
+    "televersement-fin": {"requetes": 8},
+    "me": {"requetes": 3},
+}
+
+
+# === Jeu de données ===
+
+class Contexte:
+    """Objets du jeu de données utilisés par les scénarios."""
+
+    def __init__(self, roles, technicien, personnel, clients, liens, logiciels, tickets, fichier):
+        self.roles = roles
+        self.technicien = technicien
+        self.personnel = personnel
+        self.clients = clients
+        self.liens = liens
+        self.logiciels = logiciels
+        self.tickets = tickets
+        self.fichier_telechargeable = fichier
+        self.televersement = Televersement.objects.create(utilisateur=technicien, nom="journal.txt", taille=1024)
+
+    def nouveau_personnel(self, iteration):
+        utilisateur = Utilisateur.objects.create(
+            email=f"poste{iteration}@banc.local", nom="P", prenom=str(iteration)
+        )
+        utilisateur.roles.add(self.roles["personnel"])
+        return utilisateur
+
+    def televersement_complet(self, iteration):
+        contenu = f"morceau {iteration}\n".encode() * 64
+        televersement = Televersement.objects.create(
+            utilisateur=self.technicien, nom="journal.txt", taille=len(contenu), recu=len(contenu)
+        )
+        os.makedirs(settings.TELEVERSEMENT_DIR, exist_ok=True)
+        with open(chemin_partiel(televersement), "wb") as partiel:
+            partiel.write(contenu)
+        return televersement
+
+    def lignes_import(self, iteration, nombre):
+        lien = self.liens[0]
+        return "".join(
+            json.dumps({
+                "personnel": lien.personnel.email, "client": lien.client.nom,
+                "logiciel": self.logiciels[n % len(self.logiciels)].nom,
+                "technicien": self.technicien.email, "description": f"Import {iteration}-{n}",
+                "statut": "clos", "date_creation": "2024-01-02", "date_cloture": "2024-01-05",
+                "rapport": "Réglé par téléphone",
+            }) + "\n"
+            for n in range(nombre)
+        )
+
+
+MOTS = ["imprimante", "licence", "installation", "lenteur", "connexion", "sauvegarde",
+        "mise à jour", "export", "facturation", "messagerie"]
+
+
+def peupler(**tailles):
+    """Insère le jeu de données (bulk_create) et retourne son Contexte."""
+    tailles = {**TAILLES, **{cle: valeur for cle, valeur in tailles.items() if valeur is not None}}
+    rng = random.Random(42)
+    with transaction.atomic():
+        roles = {nom: Role.objects.get_or_create(nom=nom)[0]
+                 for nom in ("personnel", "technicien", "administrateur", "superviseur")}
+        types_problemes = TypeProbleme.objects.bulk_create(
+            [TypeProbleme(nom=f"Problème {i}") for i in range(tailles["types_problemes"])]
+        )
+        type_logiciel = TypeLogiciel.objects.create(nom="Gestion")
+        logiciels = Logiciel.objects.bulk_create(
+            [Logiciel(nom=f"Logiciel {i}", type_logiciel=type_logiciel) for i in range(tailles["logiciels"])]
+        )
+        Logiciel.type_problemes.through.objects.bulk_create([
+            Logiciel.type_problemes.through(logiciel_id=logiciel.pk, typeprobleme_id=type_probleme.pk)
+            for logiciel in logiciels
+            for type_probleme in rng.sample(types_problemes, min(3, len(types_problemes)))
+        ])
+        clients = Client.objects.bulk_create([Client(nom=f"Client {i}") for i in range(tailles["clients"])])
+
+        nombre_personnels = tailles["clients"] * tailles["personnels_par_client"]
+        utilisateurs = Utilisateur.objects.bulk_create(
+            [Utilisateur(email=f"personnel{i}@banc.local", nom="P", prenom=str(i)) for i in range(nombre_personnels)]
+            + [Utilisateur(email=f"tech{i}@banc.local", nom="T", prenom=str(i), is_staff=True)
+               for i in range(tailles["techniciens"])]
+        )
+        personnels, techniciens = utilisateurs[:nombre_personnels], utilisateurs[nombre_personnels:]
+        Through = Utilisateur.roles.through
+        Through.objects.bulk_create(
+            [Through(utilisateur_id=u.pk, role_id=roles["personnel"].pk) for u in personnels]
+            + [Through(utilisateur_id=u.pk, role_id=roles[nom].pk)
+               for u in techniciens for nom in ("technicien", "administrateur")]
+        )
+        Personnel.objects.bulk_create([Personnel(utilisateur=p, poste="Comptable") for p in personnels])
+        ProfilTechnicien.objects.bulk_create([ProfilTechnicien(technicien=t) for t in techniciens])
+        liens = PersonnelClient.objects.bulk_create(
+            [PersonnelClient(personnel=p, client=clients[i % len(clients)]) for i, p in enumerate(personnels)]
+        )
+
+        statuts = ["clos"] * 6 + ["en_cours"] * 2 + ["en_attente"] * 2
+        tickets = Ticket.objects.bulk_create([
+            Ticket(
+                lien=liens[i % len(liens)] if i % 4 else liens[0], logiciel=rng.choice(logiciels),
+                technicien=rng.choice(techniciens), statut=rng.choice(statuts),
+                description=f"Problème de {rng.choice(MOTS)} et de {rng.choice(MOTS)} ({i})",
+            )
+            for i in range(tailles["tickets"])
+        ])
+        for ticket in tickets:
+            ticket.date_creation = date.today() - timedelta(days=rng.randrange(365))
+            if ticket.statut == "clos":
+                ticket.date_cloture = ticket.date_creation + timedelta(days=rng.randrange(10))
+        Ticket.objects.bulk_update(tickets, ["date_creation", "date_cloture"])
+        Rapport.objects.bulk_create([
+            Rapport(ticket=ticket, contenu=f"Résolu : {rng.choice(MOTS)}")
+            for ticket in tickets if rng.random() < tailles["part_rapports"]
+        ])
+
+        # Un seul blob réel sur disque, référencé par toutes les pièces jointes
+        fichier = Fichier(ticket=tickets[0], nom="capture.png")
+        fichier.fichier.save("capture.png", ContentFile(hashlib.sha256(b"banc").digest() * 256), save=True)
+        Fichier.objects.bulk_create([
+            Fichier(ticket=ticket, fichier=fichier.fichier.name, nom=f"piece{n}.png")
+            for ticket in tickets for n in range(tailles["fichiers_par_ticket"])
+        ])
+        reconstruire()
+
+    # Tickets du plus récent au plus ancien, comme les listes
+    tickets.sort(key=lambda t: (t.date_creation, t.pk), reverse=True)
+    return Contexte(roles, techniciens[0], personnels[0], clients, liens, logiciels, tickets, fichier)
+
+
+# === Mesure ===
+
+def routes_sans_scenario():
+    from . import urls
+
+    couvertes = {scenario.route for scenario in SCENARIOS} | set(ROUTES_IGNOREES)
+    return sorted(motif.name for motif in urls.urlpatterns if motif.name not in couvertes)
+
+
+def centile(valeurs, proportion):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * proportion))]
+
+
+def clients_api(contexte):
+    clients = {}
+    for nom, utilisateur in (("technicien", contexte.technicien), ("personnel", contexte.personnel)):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(utilisateur)}")
+        clients[nom] = client
+    return clients
+
+
+def appeler(client, scenario, contexte, iteration):
+    """Un appel : (statut, requêtes, durée en ms, octets). Préparation hors mesure."""
+    kwargs = scenario.kwargs(contexte, iteration) if scenario.kwargs else {}
+    url = reverse(scenario.route, kwargs=kwargs)
+    options = {}
+    if scenario.methode == "get":
+        options["data"] = scenario.params
+    else:
+        if scenario.params:
+            url += "?" + "&".join(f"{cle}={valeur}" for cle, valeur in scenario.params.items())
+        options["data"] = scenario.donnees(contexte, iteration) if scenario.donnees else {}
+        if scenario.format:
+            options["format"] = scenario.format
+        if scenario.type_contenu:
+            options["content_type"] = scenario.type_contenu
+
+    for alias in ("default", "references"):
+        caches[alias].clear()
+    with CaptureQueriesContext(connection) as requetes:
+        debut = time.perf_counter()
+        reponse = getattr(client, scenario.methode)(url, **options)
+        # Réponses en flux : les requêtes ont lieu pendant la lecture du corps
+        corps = b"".join(reponse.streaming_content) if reponse.streaming else reponse.content
+        duree = (time.perf_counter() - debut) * 1000
+    return reponse.status_code, len(requetes), duree, len(corps)
+
+
+def executer(contexte, repetitions=5, budgets=None, scenarios=None):
+    """Retourne {"resultats": {...}, "depassements": [...], "ignorees": {...}}."""
+    budgets = {**BUDGETS, **(budgets or {})}
+    clients = clients_api(contexte)
+    resultats, depassements = {}, []
+
+    for scenario in scenarios or SCENARIOS:
+        statuts, requetes, durees, octets = set(), [], [], []
+        for iteration in range(repetitions):
+            statut, nombre, duree, taille = appeler(clients[scenario.utilisateur], scenario, contexte, iteration)
+            statuts.add(statut)
+            requetes.append(nombre)
+            durees.append(duree)
+            octets.append(taille)
+
+        mesure = {
+            "route": scenario.route,
+            "methode": scenario.methode.upper(),
+            "statuts": sorted(statuts),
+            "requetes": max(requetes),
+            "p50_ms": round(statistics.median(durees), 3),
+            "p95_ms": round(centile(durees, 0.95), 3),
+            "octets": max(octets),
+        }
+        resultats[scenario.nom] = mesure
+
+        if statuts != {scenario.statut}:
+            depassements.append(f"{scenario.nom} : statut {sorted(statuts)}, attendu {scenario.statut}")
+        for indicateur, maximum in budgets.get(scenario.nom, {}).items():
+            if mesure[indicateur] > maximum:
+                depassements.append(f"{scenario.nom} : {indicateur} = {mesure[indicateur]} > {maximum}")
+
+    for route in routes_sans_scenario():
+        depassements.append(f"{route} : route sans scénario dans support/banc_essai.py")
+    return {"resultats": resultats, "depassements": depassements, "ignorees": ROUTES_IGNOREES}
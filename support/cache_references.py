@@ -0,0 +1,79 @@
+import hashlib
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from .models import Client, Logiciel, Role, TypeLogiciel, TypeProbleme
+
+
+# === Cache des données de référence ===
+#
+# Les listes de rôles, clients, logiciels et types changent rarement mais sont
+# chargées par chaque écran. Chaque groupe a un numéro de version stocké dans
+# le cache "references" (settings.CACHES) ; les entrées sont rangées sous cette
+# version. Invalider un groupe revient à changer sa version : les anciennes
+# entrées ne sont plus jamais lues et expirent d'elles-mêmes, ce qui marche
+# avec n'importe quel backend (locmem, fichiers, Redis).
+
+ALIAS_CACHE = "references"
+DUREE_CACHE = 3600
+
+# Groupe de cache -> modèles dont il dépend (signaux de support/signals.py)
+GROUPES = {
+    "roles": [Role],
+    "types_logiciels": [TypeLogiciel],
+    "types_problemes": [TypeProbleme],
+    "clients": [Client],
+    "logiciels": [Logiciel, TypeLogiciel, TypeProbleme, Logiciel.type_problemes.through],
+}
+
+
+def cache_references():
+    return caches[ALIAS_CACHE]
+
+
+def version(groupe):
+    cache = cache_references()
+    cle = f"ref:{groupe}:version"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = uuid.uuid4().hex
+        # add : deux processus qui initialisent en même temps gardent la même version
+        if not cache.add(cle, valeur, None):
+            valeur = cache.get(cle, valeur)
+    return valeur
+
+
+def cle_entree(groupe, roles, chemin):
+    partition = hashlib.sha256(f"{','.join(sorted(roles))}|{chemin}".encode()).hexdigest()[:32]
+    return f"ref:{groupe}:{version(groupe)}:{partition}"
+
+
+def lire(cle):
+    return cache_references().get(cle)
+
+
+def ecrire(cle, donnees):
+    entree = {"donnees": donnees, "etag": etag(donnees)}
+    cache_references().set(cle, entree, DUREE_CACHE)
+    return entree
+
+
+def etag(donnees):
+    return '"' + hashlib.sha256(JSONRenderer().render(donnees)).hexdigest()[:32] + '"'
+
+
+def invalider(groupe):
+    cache_references().set(f"ref:{groupe}:version", uuid.uuid4().hex, None)
+
+
+def invalider_modele(model):
+    groupes = [groupe for groupe, modeles in GROUPES.items() if model in modeles]
+    for groupe in groupes:
+        invalider(groupe)
+        # Une seconde fois après le commit : une lecture concurrente a pu remettre
+        # en cache l'état d'avant la transaction sous la nouvelle version
+        transaction.on_commit(lambda groupe=groupe: invalider(groupe))
+    return groupes
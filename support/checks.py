@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core import checks
+
+
+# === Vérifications de configuration (manage.py check, runserver, migrate) ===
+#
+# Les caches invalidés par un processus doivent être vus par tous les autres :
+# un cache propre à chaque processus sert des données périmées aux autres workers.
+
+LOCMEM = "django.core.cache.backends.locmem.LocMemCache"
+DUMMY = "django.core.cache.backends.dummy.DummyCache"
+
+
+def backend_cache(alias):
+    return settings.CACHES.get(alias, {}).get("BACKEND")
+
+
+@checks.register(checks.Tags.caches)
+def verifier_cache_references(app_configs, **kwargs):
+    if settings.DEBUG or backend_cache("references") != LOCMEM:
+        return []
+    return [checks.Error(
+        "Le cache 'references' est propre à chaque processus : ses invalidations "
+        "ne sont pas vues des autres workers.",
+        hint="Utiliser FileBasedCache (un hôte) ou RedisCache dans CACHES['references'].",
+        id="support.E001",
+    )]
+
+
+@checks.register(checks.Tags.caches)
+def verifier_cache_defaut(app_configs, **kwargs):
+    if settings.DEBUG or backend_cache("default") != LOCMEM:
+        return []
+    return [checks.Error(
+        "Le cache par défaut est propre à chaque processus : les destinataires des "
+        "notifications invalidés par un worker restent en cache dans les autres.",
+        hint="Utiliser FileBasedCache (un hôte) ou RedisCache dans CACHES['default'].",
+        id="support.E002",
+    )]
+
+
+def erreur_cache_coherence():
+    """Lecture de ses écritures (support.routeurs) : écriture notée dans un cache que tous les workers lisent."""
+    if not settings.BASE_LECTURE or backend_cache("default") not in (LOCMEM, DUMMY):
+        return None
+    return checks.Error(
+        "BASE_LECTURE est configurée mais le cache par défaut n'est pas partagé : un client JWT "
+        "qui vient d'écrire peut relire des lignes périmées de la réplique via un autre worker.",
+        hint="Utiliser FileBasedCache (un hôte) ou RedisCache dans CACHES['default'].",
+        id="support.E003",
+    )
+
+
+@checks.register(checks.Tags.caches)
+def verifier_cache_coherence(app_configs, **kwargs):
+    erreur = erreur_cache_coherence()
+    return [erreur] if erreur else []
@@ -0,0 +1,211 @@
+import csv
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.duration import duration_iso_string
+from rest_framework import serializers
+
+from . import metriques, statistiques
+from .models import Logiciel, PersonnelClient, Rapport, Ticket, Utilisateur
+
+
+# === Import / export en masse des tickets ===
+#
+# Format commun (NDJSON : un objet JSON par ligne ; CSV : une colonne par champ) :
+#   personnel, client   -> lien PersonnelClient (email du personnel, nom du client)
+#   logiciel            -> nom ou id
+#   technicien          -> email ou id, vide si non assigné
+#   description, statut, date_creation, date_cloture, temps_traitement (ISO 8601), rapport
+# L'export produit exactement ce format : un export se réimporte tel quel.
+#
+# L'import lit le corps de la requête ligne par ligne, valide par lots de
+# IMPORT_TAILLE_LOT, résout les clés étrangères dans des tables en mémoire
+# chargées une fois, et insère chaque lot par bulk_create dans sa propre
+# transaction. Aucun signal n'est émis : pas de mail ni d'événement temps réel ;
+# les statistiques sont mises à jour une fois par lot. Les index plein texte
+# suivent via leurs triggers.
+
+COLONNES = [
+    "personnel", "client", "logiciel", "technicien", "description", "statut",
+    "date_creation", "date_cloture", "temps_traitement", "rapport",
+]
+MAX_ERREURS = 100
+
+
+class TablesReferences:
+    """Clés naturelles et ids -> pk, chargés une seule fois pour tout l'import."""
+
+    def __init__(self):
+        self.liens = {
+            (email.lower(), nom.lower()): (pk, client_id)
+            for pk, email, nom, client_id in PersonnelClient.objects.values_list(
+                "pk", "personnel__email", "client__nom", "client_id"
+            )
+        }
+        self.logiciels = {}
+        for pk, nom in Logiciel.objects.values_list("pk", "nom"):
+            self.logiciels[str(pk)] = self.logiciels[nom.lower()] = pk
+        self.techniciens = {}
+        for pk, email in Utilisateur.objects.filter(roles__nom="technicien").values_list("pk", "email"):
+            self.techniciens[str(pk)] = self.techniciens[email.lower()] = pk
+
+
+class TicketImportSerializer(serializers.Serializer):
+    personnel = serializers.EmailField()
+    client = serializers.CharField()
+    logiciel = serializers.CharField()
+    technicien = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+    description = serializers.CharField()
+    statut = serializers.ChoiceField(choices=Ticket.STATUTS, required=False, default="en_attente")
+    date_creation = serializers.DateField(required=False, allow_null=True)
+    date_cloture = serializers.DateField(required=False, allow_null=True)
+    temps_traitement = serializers.DurationField(required=False, allow_null=True)
+    rapport = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+    def validate(self, data):
+        tables = self.context["tables"]
+        erreurs = {}
+        lien = tables.liens.get((data["personnel"].lower(), data["client"].lower()))
+        if lien is None:
+            erreurs["client"] = "Aucun lien entre ce personnel et ce client."
+        logiciel = tables.logiciels.get(data["logiciel"].lower())
+        if logiciel is None:
+            erreurs["logiciel"] = "Logiciel inconnu."
+        technicien = None
+        if data.get("technicien"):
+            technicien = tables.techniciens.get(data["technicien"].lower())
+            if technicien is None:
+                erreurs["technicien"] = "Technicien inconnu."
+        if erreurs:
+            raise serializers.ValidationError(erreurs)
+        data["lien_id"], data["client_id"] = lien
+        data["logiciel_id"], data["technicien_id"] = logiciel, technicien
+        return data
+
+
+def lire_ndjson(lignes):
+    for numero, ligne in enumerate(lignes, start=1):
+        ligne = ligne.strip()
+        if not ligne:
+            continue
+        try:
+            enregistrement = json.loads(ligne)
+        except ValueError:
+            yield numero, None
+            continue
+        yield numero, enregistrement if isinstance(enregistrement, dict) else None
+
+
+def lire_csv(lignes):
+    lecteur = csv.DictReader(lignes)
+    for enregistrement in lecteur:
+        # Numéro de la ligne physique où finit l'enregistrement (en-tête et
+        # cellules sur plusieurs lignes compris), comme pour le NDJSON.
+        # Une cellule vide vaut « absent ».
+        yield lecteur.line_num, {cle: valeur for cle, valeur in enregistrement.items() if cle and valeur != ""}
+
+
+def par_lots(iterable, taille):
+    lot = []
+    for element in iterable:
+        lot.append(element)
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+def importer(enregistrements, taille_lot=None):
+    """enregistrements : itérable de (numéro de ligne, dict ou None si illisible)."""
+    taille_lot = taille_lot or settings.IMPORT_TAILLE_LOT
+    tables = TablesReferences()
+    resultat = {"importes": 0, "rejetes": 0, "erreurs": []}
+
+    for lot in par_lots(enregistrements, taille_lot):
+        valides = []
+        for numero, enregistrement in lot:
+            if enregistrement is None:
+                erreurs = {"ligne": "Enregistrement illisible."}
+            else:
+                serializer = TicketImportSerializer(data=enregistrement, context={"tables": tables})
+                if serializer.is_valid():
+                    valides.append(serializer.validated_data)
+                    continue
+                erreurs = serializer.errors
+            resultat["rejetes"] += 1
+            if len(resultat["erreurs"]) < MAX_ERREURS:
+                resultat["erreurs"].append({"ligne": numero, "erreurs": erreurs})
+        if valides:
+            inserer_lot(valides)
+            resultat["importes"] += len(valides)
+    return resultat
+
+
+def inserer_lot(donnees):
+    tickets = [
+        Ticket(
+            lien_id=d["lien_id"], logiciel_id=d["logiciel_id"], technicien_id=d["technicien_id"],
+            description=d["description"], statut=d["statut"], date_cloture=d.get("date_cloture"),
+            temps_traitement=d.get("temps_traitement"),
+        )
+        for d in donnees
+    ]
+    with transaction.atomic():
+        Ticket.objects.bulk_create(tickets)
+        # auto_now_add impose la date du jour à l'insertion : on rétablit les dates d'origine
+        historiques = []
+        for ticket, d in zip(tickets, donnees):
+            if d.get("date_creation"):
+                ticket.date_creation = d["date_creation"]
+                historiques.append(ticket)
+        if historiques:
+            Ticket.objects.bulk_update(historiques, ["date_creation"])
+        Rapport.objects.bulk_create(
+            [Rapport(ticket=t, contenu=d["rapport"]) for t, d in zip(tickets, donnees) if d.get("rapport")]
+        )
+        statistiques.ajouter(
+            statistiques.etat_ticket(t, client_id=d["client_id"]) for t, d in zip(tickets, donnees)
+        )
+        metriques.compter_evenements([{"type": "ticket_cree"}] * len(tickets), "import")
+
+
+# === Export ===
+
+def lignes_export(queryset, chunk_size=2000):
+    """Dictionnaires au format d'import ; iterator() : mémoire constante."""
+    champs = {
+        "id": "id", "personnel": "lien__personnel__email", "client": "lien__client__nom",
+        "logiciel": "logiciel__nom", "technicien": "technicien__email", "description": "description",
+        "statut": "statut", "date_creation": "date_creation", "date_cloture": "date_cloture",
+        "temps_traitement": "temps_traitement", "rapport": "rapport__contenu",
+    }
+    valeurs = queryset.order_by("id").values_list(*champs.values())
+    for ligne in valeurs.iterator(chunk_size=chunk_size):
+        enregistrement = dict(zip(champs, ligne))
+        for date in ("date_creation", "date_cloture"):
+            if enregistrement[date]:
+                enregistrement[date] = enregistrement[date].isoformat()
+        if enregistrement["temps_traitement"] is not None:
+            enregistrement["temps_traitement"] = duration_iso_string(enregistrement["temps_traitement"])
+        yield enregistrement
+
+
+def export_ndjson(queryset):
+    for enregistrement in lignes_export(queryset):
+        yield json.dumps(enregistrement, ensure_ascii=False) + "\n"
+
+
+class _Tampon:
+    """Pseudo-fichier pour csv.writer : renvoie la ligne au lieu de l'écrire."""
+
+    def write(self, valeur):
+        return valeur
+
+
+def export_csv(queryset):
+    writer = csv.writer(_Tampon())
+    yield writer.writerow(["id"] + COLONNES)
+    for enregistrement in lignes_export(queryset):
+        yield writer.writerow(["" if v is None else v for v in enregistrement.values()])
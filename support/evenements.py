@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("support.evenements")
+
+
+# === Événements des tickets (flux SSE) ===
+#
+# Les signaux de support/signals.py publient un événement après le commit de
+# chaque création, assignation ou clôture de ticket. Le flux /api/tickets/evenements/
+# s'abonne au bus et ne transmet à chaque client que les tickets qui le concernent.
+#
+# settings.EVENEMENTS_BACKEND choisit le bus :
+#   - BusLocal : en mémoire, dans le processus (un seul worker ASGI qui traite
+#     aussi les écritures, ou tests) ;
+#   - BusPostgres : NOTIFY à la publication, un fil par processus en LISTEN qui
+#     redistribue aux abonnés locaux ; fonctionne avec plusieurs workers, sous
+#     psycopg2 comme sous psycopg 3 (>= 3.2), pool de connexions compris : le fil
+#     écoute sur une connexion dédiée, hors pool.
+
+TYPES = ("ticket_cree", "ticket_assigne", "ticket_clos")
+ROLES_TOUT_VOIR = ("administrateur", "superviseur")
+
+
+def evenements_ticket(ancien, ticket, personnel_id):
+    """Événements déduits de l'état précédent (format statistiques.etat_ticket) et du ticket."""
+    types = []
+    if ancien is None:
+        types.append("ticket_cree")
+    else:
+        if ticket.technicien_id and ticket.technicien_id != ancien["technicien_id"]:
+            types.append("ticket_assigne")
+        if ticket.statut == "clos" and ancien["statut"] != "clos":
+            types.append("ticket_clos")
+    donnees = {
+        "ticket": ticket.pk,
+        "statut": ticket.statut,
+        "technicien": ticket.technicien_id,
+        "client": ticket.lien.client_id,
+        "personnel": personnel_id,
+        "logiciel": ticket.logiciel_id,
+    }
+    return [{"type": type_, **donnees} for type_ in types]
+
+
+def publier_apres_commit(evenements):
+    for evenement in evenements:
+        transaction.on_commit(lambda evenement=evenement: bus().publier(evenement))
+
+
+def concerne(evenement, utilisateur_id, clients, tout_voir=False):
+    return (
+        tout_voir
+        or evenement["personnel"] == utilisateur_id
+        or evenement["technicien"] == utilisateur_id
+        or evenement["client"] in clients
+    )
+
+
+@lru_cache(maxsize=None)
+def bus():
+    return import_string(settings.EVENEMENTS_BACKEND)()
+
+
+# === Abonnement : une file asyncio par connexion ===
+
+class Abonnement:
+    def __init__(self, bus, taille):
+        self.bus = bus
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue(taille)
+        self.perdus = False
+
+    def recevoir(self, evenement):
+        # Appelé depuis n'importe quel fil (vue synchrone, fil LISTEN)
+        try:
+            self.boucle.call_soon_threadsafe(self._deposer, evenement)
+        except RuntimeError:
+            # Boucle fermée : la connexion est partie
+            self.bus.desabonner(self)
+
+    def _deposer(self, evenement):
+        try:
+            self.file.put_nowait(evenement)
+        except asyncio.QueueFull:
+            # Client trop lent : il devra se resynchroniser
+            self.perdus = True
+
+    async def suivant(self, delai):
+        return await asyncio.wait_for(self.file.get(), delai)
+
+    def fermer(self):
+        self.bus.desabonner(self)
+
+
+class BusLocal:
+    def __init__(self):
+        self._abonnes = set()
+        self._verrou = threading.Lock()
+
+    def publier(self, evenement):
+        self.diffuser(evenement)
+
+    def diffuser(self, evenement):
+        with self._verrou:
+            abonnes = list(self._abonnes)
+        for abonnement in abonnes:
+            abonnement.recevoir(evenement)
+
+    def abonner(self, taille=100):
+        abonnement = Abonnement(self, taille)
+        with self._verrou:
+            self._abonnes.add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            self._abonnes.discard(abonnement)
+
+    @property
+    def nombre_abonnes(self):
+        return len(self._abonnes)
+
+
+class BusPostgres(BusLocal):
+    CANAL = "support_tickets"
+    DELAI_ECOUTE = 5  # secondes d'attente d'une notification avant de vérifier l'arrêt
+
+    def __init__(self):
+        super().__init__()
+        self._ecoute = None
+        self.pret = threading.Event()
+        self._arret = threading.Event()
+
+    def publier(self, evenement):
+        with connections["default"].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.CANAL, json.dumps(evenement)])
+
+    def abonner(self, taille=100):
+        with self._verrou:
+            if self._ecoute is None:
+                self._ecoute = threading.Thread(target=self._ecouter, name="support-listen", daemon=True)
+                self._ecoute.start()
+        return super().abonner(taille)
+
+    def arreter(self):
+        self._arret.set()
+        if self._ecoute is not None:
+            self._ecoute.join()
+
+    def _connexion_dediee(self):
+        # Hors pool : la connexion reste en LISTEN toute la vie du fil
+        modele = connections["default"]
+        options = {cle: valeur for cle, valeur in modele.settings_dict["OPTIONS"].items() if cle != "pool"}
+        return modele.__class__({**modele.settings_dict, "OPTIONS": options}, modele.alias)
+
+    def _notifications(self, brute):
+        """Notifications reçues en DELAI_ECOUTE secondes au plus."""
+        from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+        if is_psycopg3:
+            yield from brute.notifies(timeout=self.DELAI_ECOUTE)
+            return
+        if select.select([brute], [], [], self.DELAI_ECOUTE) == ([], [], []):
+            return
+        brute.poll()
+        while brute.notifies:
+            yield brute.notifies.pop(0)
+
+    def _ecouter(self):
+        attente = 1
+        while not self._arret.is_set():
+            connexion = self._connexion_dediee()
+            try:
+                connexion.ensure_connection()
+                with connexion.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.CANAL}")
+                self.pret.set()
+                attente = 1
+                while not self._arret.is_set():
+                    for notification in self._notifications(connexion.connection):
+                        self.diffuser(json.loads(notification.payload))
+            except Exception:
+                self.pret.clear()
+                logger.exception("Écoute %s interrompue, nouvelle tentative dans %s s", self.CANAL, attente)
+                self._arret.wait(attente)
+                attente = min(attente * 2, 60)
+            finally:
+                connexion.close()
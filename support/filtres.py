@@ -0,0 +1,59 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Ticket
+
+
+# === Filtres des listes de tickets ===
+#
+#   ?statut=en_attente,en_cours   ?client=3,4   ?logiciel=2
+#   ?technicien=5   ?technicien=aucun   ?date_debut=2025-01-01&date_fin=2025-01-31
+#
+# Le tri (?ordering=) est choisi dans la liste blanche `ordres` de la
+# pagination par curseur (support/pagination.py), qui en a besoin pour
+# construire ses curseurs.
+
+class TicketFiltre(BaseFilterBackend):
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+        filtres = {}
+
+        if params.get("statut"):
+            statuts = self.liste(params["statut"])
+            valides = {valeur for valeur, _ in Ticket.STATUTS}
+            if not set(statuts) <= valides:
+                raise ValidationError({"statut": f"Valeurs possibles : {', '.join(sorted(valides))}."})
+            filtres["statut__in"] = statuts
+
+        for param, champ in (("client", "lien__client_id__in"), ("logiciel", "logiciel_id__in")):
+            if params.get(param):
+                filtres[champ] = self.identifiants(param, params[param])
+
+        if params.get("technicien"):
+            if params["technicien"] == "aucun":
+                filtres["technicien__isnull"] = True
+            else:
+                filtres["technicien_id__in"] = self.identifiants("technicien", params["technicien"])
+
+        for param, champ in (("date_debut", "date_creation__gte"), ("date_fin", "date_creation__lte")):
+            if params.get(param):
+                try:
+                    valeur = parse_date(params[param])
+                except ValueError:
+                    valeur = None
+                if valeur is None:
+                    raise ValidationError({param: "Date attendue au format AAAA-MM-JJ."})
+                filtres[champ] = valeur
+
+        return queryset.filter(**filtres) if filtres else queryset
+
+    def liste(self, valeur):
+        return [element.strip() for element in valeur.split(",") if element.strip()]
+
+    def identifiants(self, param, valeur):
+        try:
+            return [int(element) for element in self.liste(valeur)]
+        except ValueError:
+            raise ValidationError({param: "Liste d'identifiants attendue (ex. 1,2,3)."})
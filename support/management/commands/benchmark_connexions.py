@@ -0,0 +1,145 @@
+import importlib.util
+import json
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.urls import NoReverseMatch, reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from support.models import Role, Utilisateur
+
+
+class Command(BaseCommand):
+    help = (
+        "Charge une route légère (par défaut /api/me/) depuis plusieurs fils sur une base de test "
+        "jetable et compare latence, débit et connexions ouvertes : une connexion par requête, "
+        "connexions persistantes (CONN_MAX_AGE), puis pool psycopg 3 s'il est installé."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fils", type=int, default=8)
+        parser.add_argument("--requetes", type=int, default=200, help="Requêtes par fil.")
+        parser.add_argument("--route", default="me", help="Nom d'une route sans paramètre.")
+        parser.add_argument("--conn-max-age", type=int, default=60)
+        parser.add_argument("--json", dest="fichier_json",
+                            help="Écrit aussi les résultats dans ce fichier JSON.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        try:
+            self.url = reverse(options["route"])
+        except NoReverseMatch:
+            raise CommandError(f"Route inconnue ou à paramètres : {options['route']}")
+
+        anciens = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            vendor = connection.vendor
+            self.stdout.write(f"Base de test : {vendor} {connection.settings_dict['NAME']}")
+            if vendor == "sqlite":
+                self.stdout.write(self.style.WARNING(
+                    "SQLite en mémoire : Django ne ferme jamais ces connexions, "
+                    "les modes ne diffèrent que sous PostgreSQL."
+                ))
+            # Base de test créée pour la seule principale
+            with override_settings(ALLOWED_HOSTS=["testserver"], BASE_LECTURE=None):
+                self.jeton = self.utilisateur_jwt()
+                resultats = {}
+                for nom, reglages in self.modes(vendor):
+                    resultats[nom] = self.charger(reglages)
+                    self.afficher(nom, resultats[nom])
+        finally:
+            if "pool" in connections.settings["default"].get("OPTIONS", {}):
+                connection.close_pool()
+            teardown_databases(anciens, verbosity=0)
+
+        if options["fichier_json"]:
+            with open(options["fichier_json"], "w", encoding="utf-8") as sortie:
+                json.dump({"base": vendor, "route": self.url, **resultats}, sortie, indent=2, ensure_ascii=False)
+
+    def modes(self, vendor):
+        yield "une connexion par requête", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+        yield "connexions persistantes", {"CONN_MAX_AGE": self.options["conn_max_age"], "CONN_HEALTH_CHECKS": True}
+        if vendor == "postgresql" and importlib.util.find_spec("psycopg") and importlib.util.find_spec("psycopg_pool"):
+            yield "pool psycopg", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False,
+                                   "pool": {"min_size": 2, "max_size": self.options["fils"]}}
+
+    def utilisateur_jwt(self):
+        utilisateur = Utilisateur.objects.create_user(
+            email="charge@banc.local", nom="Charge", prenom="Test", password="banc-essai"
+        )
+        utilisateur.roles.add(Role.objects.get_or_create(nom="personnel")[0])
+        return str(AccessToken.for_user(utilisateur))
+
+    def charger(self, reglages):
+        # Les fils créent leurs connexions à partir de connections.settings
+        base = connections.settings["default"]
+        base["CONN_MAX_AGE"] = reglages["CONN_MAX_AGE"]
+        base["CONN_HEALTH_CHECKS"] = reglages["CONN_HEALTH_CHECKS"]
+        if "pool" in reglages:
+            base.setdefault("OPTIONS", {})["pool"] = reglages["pool"]
+
+        ouvertes = []
+        verrou = threading.Lock()
+
+        def compter(sender, connection, **kwargs):
+            with verrou:
+                ouvertes.append(connection.alias)
+
+        durees, erreurs = [], []
+        connection_created.connect(compter, weak=False)
+        debut = time.perf_counter()
+        try:
+            fils = [threading.Thread(target=self.fil, args=(durees, erreurs, verrou))
+                    for _ in range(self.options["fils"])]
+            for fil in fils:
+                fil.start()
+            for fil in fils:
+                fil.join()
+        finally:
+            connection_created.disconnect(compter)
+        total = time.perf_counter() - debut
+
+        if erreurs:
+            raise CommandError(f"{len(erreurs)} requête(s) en échec, ex. : {erreurs[0]}")
+        durees.sort()
+        return {
+            "requetes": len(durees),
+            "p50_ms": round(statistics.median(durees), 3),
+            "p95_ms": round(durees[min(len(durees) - 1, int(len(durees) * 0.95))], 3),
+            "debit_rps": round(len(durees) / total, 1),
+            "connexions_ouvertes": len(ouvertes),
+        }
+
+    def fil(self, durees, erreurs, verrou):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.jeton}")
+        locales = []
+        try:
+            for _ in range(self.options["requetes"]):
+                debut = time.perf_counter()
+                reponse = client.get(self.url)
+                locales.append((time.perf_counter() - debut) * 1000)
+                if reponse.status_code != 200:
+                    with verrou:
+                        erreurs.append(reponse.status_code)
+                    return
+                # Le client de test ne déclenche pas la fermeture de fin de requête
+                # d'un serveur WSGI (request_finished) : on la fait ici
+                close_old_connections()
+        finally:
+            connections.close_all()
+            with verrou:
+                durees.extend(locales)
+
+    def afficher(self, nom, mesure):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {nom} ==="))
+        self.stdout.write(
+            f"{mesure['requetes']} requêtes : médiane {mesure['p50_ms']:.3f} ms, p95 {mesure['p95_ms']:.3f} ms, "
+            f"{mesure['debit_rps']} req/s, {mesure['connexions_ouvertes']} connexion(s) ouverte(s)"
+        )
@@ -0,0 +1,162 @@
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import setup_databases, teardown_databases
+
+from support.models import (
+    Client, Logiciel, PersonnelClient, Role, Ticket, TypeLogiciel, Utilisateur,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée une base de test jetable, y insère un jeu de données volumineux, puis affiche "
+        "le plan EXPLAIN et la durée des requêtes chaudes sur les tickets, sans puis avec "
+        "les index déclarés dans Meta.indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tickets", type=int, default=100_000)
+        parser.add_argument("--personnels", type=int, default=500)
+        parser.add_argument("--techniciens", type=int, default=30)
+        parser.add_argument("--repetitions", type=int, default=20)
+        parser.add_argument("--analyze", action="store_true",
+                            help="EXPLAIN ANALYZE (PostgreSQL).")
+        parser.add_argument("--json", dest="fichier_json",
+                            help="Écrit aussi les résultats dans ce fichier JSON.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        anciens = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            self.stdout.write(f"Base de test : {connection.settings_dict['NAME']}")
+            contexte = self.peupler()
+            requetes = self.requetes_chaudes(contexte)
+
+            with connection.schema_editor() as editor:
+                for model, index in self.index_declares():
+                    editor.remove_index(model, index)
+            self.analyser()
+            avant = {nom: self.mesurer(qs) for nom, qs in requetes.items()}
+
+            with connection.schema_editor() as editor:
+                for model, index in self.index_declares():
+                    editor.add_index(model, index)
+            self.analyser()
+            apres = {nom: self.mesurer(qs) for nom, qs in requetes.items()}
+        finally:
+            teardown_databases(anciens, verbosity=0)
+
+        resultats = {}
+        for nom in requetes:
+            resultats[nom] = {"sans_index": avant[nom], "avec_index": apres[nom]}
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== {nom} ==="))
+            for etape, mesure in (("Sans index", avant[nom]), ("Avec index", apres[nom])):
+                self.stdout.write(f"{etape} : médiane {mesure['mediane_ms']:.3f} ms, p95 {mesure['p95_ms']:.3f} ms")
+                self.stdout.write(mesure["plan"])
+
+        if options["fichier_json"]:
+            with open(options["fichier_json"], "w", encoding="utf-8") as sortie:
+                json.dump(resultats, sortie, indent=2, ensure_ascii=False)
+
+    def index_declares(self):
+        for model in (Ticket, PersonnelClient, Role):
+            for index in model._meta.indexes:
+                yield model, index
+
+    def analyser(self):
+        # Statistiques à jour pour que le planificateur voie les index
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def peupler(self):
+        rng = random.Random(42)
+        opts = self.options
+        with transaction.atomic():
+            roles = {nom: Role.objects.create(nom=nom) for nom in
+                     ("personnel", "technicien", "administrateur", "superviseur")}
+            type_logiciel = TypeLogiciel.objects.create(nom="Gestion")
+            logiciels = Logiciel.objects.bulk_create(
+                [Logiciel(nom=f"Logiciel {i}", type_logiciel=type_logiciel) for i in range(20)]
+            )
+            clients = Client.objects.bulk_create([Client(nom=f"Client {i}") for i in range(200)])
+
+            utilisateurs = Utilisateur.objects.bulk_create(
+                [Utilisateur(email=f"personnel{i}@bench.local", nom="P", prenom=str(i))
+                 for i in range(opts["personnels"])]
+                + [Utilisateur(email=f"tech{i}@bench.local", nom="T", prenom=str(i))
+                   for i in range(opts["techniciens"])]
+                + [Utilisateur(email=f"admin{i}@bench.local", nom="A", prenom=str(i)) for i in range(5)]
+            )
+            personnels = utilisateurs[:opts["personnels"]]
+            techniciens = utilisateurs[opts["personnels"]:opts["personnels"] + opts["techniciens"]]
+            admins = utilisateurs[opts["personnels"] + opts["techniciens"]:]
+            Through = Utilisateur.roles.through
+            Through.objects.bulk_create(
+                [Through(utilisateur_id=u.pk, role_id=roles["personnel"].pk) for u in personnels]
+                + [Through(utilisateur_id=u.pk, role_id=roles["technicien"].pk) for u in techniciens]
+                + [Through(utilisateur_id=u.pk, role_id=roles["administrateur"].pk) for u in admins]
+            )
+            liens = PersonnelClient.objects.bulk_create(
+                [PersonnelClient(personnel=p, client=rng.choice(clients)) for p in personnels]
+            )
+
+        # Environ 80 % de tickets clos, comme en production ; dates sur 3 ans
+        statuts = ["clos"] * 8 + ["en_cours", "en_attente"]
+        lot, jours = 5000, 3 * 365
+        for debut in range(0, opts["tickets"], lot):
+            with transaction.atomic():
+                crees = Ticket.objects.bulk_create([
+                    Ticket(
+                        lien=rng.choice(liens), logiciel=rng.choice(logiciels),
+                        technicien=rng.choice(techniciens), statut=rng.choice(statuts),
+                        description="Ticket de benchmark",
+                    )
+                    for _ in range(min(lot, opts["tickets"] - debut))
+                ])
+                # auto_now_add impose la date du jour : on étale les dates par tranche d'ids
+                ids = sorted(t.pk for t in crees)
+                tranche = max(1, len(ids) // 50)
+                for i in range(0, len(ids), tranche):
+                    jour = date.today() - timedelta(days=rng.randrange(jours))
+                    Ticket.objects.filter(pk__gte=ids[i], pk__lte=ids[min(i + tranche, len(ids)) - 1]) \
+                        .update(date_creation=jour)
+            self.stdout.write(f"  {min(debut + lot, opts['tickets'])} tickets insérés", ending="\r")
+        self.stdout.write("")
+        return {"personnel": personnels[0], "technicien": techniciens[0], "personnel_user": personnels[1]}
+
+    def requetes_chaudes(self, contexte):
+        depuis = date.today() - timedelta(days=30)
+        return {
+            "mes_tickets (lien__personnel)": lambda: Ticket.objects
+                .filter(lien__personnel=contexte["personnel"]).order_by("-date_creation", "-id")[:50],
+            "statut + date_creation": lambda: Ticket.objects
+                .filter(statut="en_attente", date_creation__gte=depuis).order_by("date_creation")[:50],
+            "technicien + statut": lambda: Ticket.objects
+                .filter(technicien=contexte["technicien"], statut="en_cours"),
+            "tickets ouverts (statut != clos)": lambda: Ticket.objects
+                .exclude(statut="clos").order_by("-date_creation", "-id")[:50],
+            "destinataires (roles__nom__in)": lambda: Utilisateur.objects
+                .filter(roles__nom__in=["administrateur", "superviseur"]).values_list("email", flat=True).distinct(),
+            "has_role (roles__nom)": lambda: contexte["personnel_user"].roles.filter(nom="personnel"),
+        }
+
+    def mesurer(self, fabrique):
+        explain = {"analyze": True} if self.options["analyze"] else {}
+        plan = fabrique().explain(**explain)
+        durees = []
+        for _ in range(self.options["repetitions"]):
+            debut = time.perf_counter()
+            list(fabrique())
+            durees.append((time.perf_counter() - debut) * 1000)
+        durees.sort()
+        return {
+            "mediane_ms": statistics.median(durees),
+            "p95_ms": durees[min(len(durees) - 1, int(len(durees) * 0.95))],
+            "plan": plan,
+        }
@@ -0,0 +1,81 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+
+from support import banc_essai
+
+
+class Command(BaseCommand):
+    help = (
+        "Crée une base de test jetable (SQLite ou PostgreSQL local), y insère un jeu de données "
+        "synthétique, appelle chaque route de l'API support avec un jeton JWT et relève nombre "
+        "de requêtes SQL, latence p50/p95 et taille des réponses. Échoue si un budget est dépassé."
+    )
+
+    def add_arguments(self, parser):
+        for nom, valeur in banc_essai.TAILLES.items():
+            parser.add_argument(f"--{nom.replace('_', '-')}", dest=nom, type=type(valeur),
+                                help=f"Défaut : {valeur}.")
+        parser.add_argument("--repetitions", type=int, default=20)
+        parser.add_argument("--scenario", action="append", dest="scenarios",
+                            help="Limite le banc à ce scénario (répétable).")
+        parser.add_argument("--budgets", dest="fichier_budgets",
+                            help='Fichier JSON {"scenario": {"requetes": n, "p95_ms": x, "octets": n}} '
+                                 "fusionné avec les budgets par défaut.")
+        parser.add_argument("--json", dest="fichier_json",
+                            help="Écrit aussi les résultats dans ce fichier JSON.")
+
+    def handle(self, *args, **options):
+        budgets = {}
+        if options["fichier_budgets"]:
+            with open(options["fichier_budgets"], encoding="utf-8") as entree:
+                budgets = json.load(entree)
+        scenarios = banc_essai.SCENARIOS
+        if options["scenarios"]:
+            inconnus = set(options["scenarios"]) - {s.nom for s in scenarios}
+            if inconnus:
+                raise CommandError(f"Scénario(s) inconnu(s) : {', '.join(sorted(inconnus))}")
+            scenarios = [s for s in scenarios if s.nom in options["scenarios"]]
+
+        # Pièces jointes et téléversements dans un dossier jetable
+        dossier = tempfile.mkdtemp(prefix="banc-")
+        anciens = setup_databases(verbosity=0, interactive=False, aliases={"default"})
+        try:
+            with override_settings(
+                MEDIA_ROOT=os.path.join(dossier, "media"),
+                TELEVERSEMENT_DIR=os.path.join(dossier, "parts"),
+                ALLOWED_HOSTS=["testserver"],
+                # Base de test créée pour la seule principale
+                BASE_LECTURE=None,
+            ):
+                self.stdout.write(f"Base de test : {connection.vendor} {connection.settings_dict['NAME']}")
+                contexte = banc_essai.peupler(**{nom: options[nom] for nom in banc_essai.TAILLES})
+                rapport = banc_essai.executer(contexte, options["repetitions"], budgets, scenarios)
+        finally:
+            teardown_databases(anciens, verbosity=0)
+            shutil.rmtree(dossier, ignore_errors=True)
+
+        self.stdout.write(f"{'Scénario':<26} {'Statut':>8} {'Requêtes':>9} {'p50 ms':>9} {'p95 ms':>9} {'Octets':>9}")
+        for nom, mesure in rapport["resultats"].items():
+            statuts = ",".join(map(str, mesure["statuts"]))
+            self.stdout.write(
+                f"{nom:<26} {statuts:>8} {mesure['requetes']:>9} {mesure['p50_ms']:>9.2f} "
+                f"{mesure['p95_ms']:>9.2f} {mesure['octets']:>9}"
+            )
+        for route, raison in rapport["ignorees"].items():
+            self.stdout.write(f"{route} ignorée : {raison}")
+
+        if options["fichier_json"]:
+            with open(options["fichier_json"], "w", encoding="utf-8") as sortie:
+                json.dump({"base": connection.vendor, **rapport}, sortie, indent=2, ensure_ascii=False)
+
+        if rapport["depassements"]:
+            for depassement in rapport["depassements"]:
+                self.stderr.write(depassement)
+            raise CommandError(f"{len(rapport['depassements'])} budget(s) dépassé(s).")
+        self.stdout.write(self.style.SUCCESS("Tous les budgets sont respectés."))
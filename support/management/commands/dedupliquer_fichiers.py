@@ -0,0 +1,84 @@
+import os
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from support.models import Contenu, Fichier, Televersement
+from support.stockage import est_adresse, stockage_fichiers, supprimer_si_orphelin
+
+
+class Command(BaseCommand):
+    help = (
+        "Déplace les pièces jointes existantes vers le stockage adressé par contenu "
+        "(un seul exemplaire par contenu identique) et recalcule les compteurs de références."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Affiche ce qui serait fait sans rien modifier.")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        convertis = manquants = 0
+        anciens_noms = set()
+        octets_avant = octets_apres = 0
+        vus = set()
+
+        fichiers = Fichier.objects.exclude(fichier="").only("id", "fichier", "nom")
+        for fichier in fichiers.iterator(chunk_size=500):
+            nom = fichier.fichier.name
+            if est_adresse(nom):
+                continue
+            if not stockage_fichiers.exists(nom):
+                manquants += 1
+                self.stderr.write(f"Fichier absent du stockage : {nom}")
+                continue
+
+            taille = stockage_fichiers.size(nom)
+            octets_avant += taille
+            convertis += 1
+            if dry_run:
+                continue
+
+            with stockage_fichiers.open(nom, "rb") as contenu:
+                nouveau = stockage_fichiers.save(nom, File(contenu))
+            if nouveau not in vus:
+                vus.add(nouveau)
+                octets_apres += taille
+            Fichier.objects.filter(pk=fichier.pk).update(
+                fichier=nouveau, nom=fichier.nom or os.path.basename(nom)
+            )
+            anciens_noms.add(nom)
+
+        if not dry_run:
+            for nom in anciens_noms:
+                if not Fichier.objects.filter(fichier=nom).exists() \
+                        and not Televersement.objects.filter(fichier=nom).exists():
+                    stockage_fichiers.delete(nom)
+            orphelins = self.recalculer_references()
+            self.stdout.write(f"{orphelins} blob(s) orphelin(s) supprimé(s).")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{convertis} fichier(s) {'à convertir' if dry_run else 'convertis'}, {manquants} absent(s). "
+            + ("" if dry_run else f"Espace : {octets_avant} -> {octets_apres} octets.")
+        ))
+
+    def recalculer_references(self):
+        comptes = {
+            ligne["fichier"]: ligne["n"]
+            for ligne in Fichier.objects.values("fichier").annotate(n=Count("id"))
+            if est_adresse(ligne["fichier"])
+        }
+        with transaction.atomic():
+            existants = {c.nom: c for c in Contenu.objects.select_for_update()}
+            for nom, contenu in existants.items():
+                contenu.references = comptes.get(nom, 0)
+            Contenu.objects.bulk_update(existants.values(), ["references"])
+            Contenu.objects.bulk_create(
+                [Contenu(nom=nom, references=n) for nom, n in comptes.items() if nom not in existants]
+            )
+        return sum(
+            supprimer_si_orphelin(nom) for nom, contenu in existants.items() if not contenu.references
+        )
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from support.outbox import envoyer_lot, mails_en_attente, statistiques
+
+
+class Command(BaseCommand):
+    help = "Envoie les mails en attente dans la file MailSortant, par lots."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--taille-lot", type=int, default=None,
+                            help="Nombre de mails par lot (défaut : MAIL_OUTBOX_TAILLE_LOT).")
+        parser.add_argument("--boucle", action="store_true",
+                            help="Tourne en continu au lieu de s'arrêter quand la file est vide.")
+        parser.add_argument("--intervalle", type=float, default=5.0,
+                            help="Pause en secondes quand la file est vide (avec --boucle).")
+        parser.add_argument("--fenetre", type=float, default=None,
+                            help="Attente en secondes au début d'une rafale pour regrouper "
+                                 "les mails dans un même lot (défaut : MAIL_OUTBOX_FENETRE).")
+
+    def handle(self, *args, **options):
+        fenetre = options["fenetre"]
+        if fenetre is None:
+            fenetre = settings.MAIL_OUTBOX_FENETRE
+        statistiques.reinitialiser()
+
+        en_rafale = False
+        while True:
+            if options["boucle"] and not en_rafale and fenetre and mails_en_attente().exists():
+                # Les mails produits pendant la fenêtre partent dans le même lot
+                time.sleep(fenetre)
+            envoyes, echecs = envoyer_lot(options["taille_lot"])
+            en_rafale = bool(envoyes)
+            # On enchaîne tant qu'un lot a été pris. Lot vide : file vide, mails
+            # verrouillés par un autre worker ou replanifiés plus tard -> pause ou fin
+            if envoyes or echecs:
+                continue
+            if not options["boucle"]:
+                break
+            time.sleep(options["intervalle"])
+
+        stats = statistiques.instantane()
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['messages_envoyes']} mail(s) envoyé(s) en {stats['lots']} lot(s), "
+            f"{stats['messages_en_echec']} échec(s), {stats['duree_totale']:.3f}s."
+        ))
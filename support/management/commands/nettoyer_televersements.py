@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from support.televersement import nettoyer
+
+
+class Command(BaseCommand):
+    help = (
+        "Supprime les téléversements sans activité depuis TELEVERSEMENT_EXPIRATION "
+        "(en cours ou jamais rattachés) et les fichiers partiels abandonnés."
+    )
+
+    def handle(self, *args, **options):
+        sessions, fichiers = nettoyer()
+        self.stdout.write(self.style.SUCCESS(
+            f"{sessions} session(s) expirée(s) supprimée(s), {fichiers} fichier(s) partiel(s) supprimé(s)."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from support.statistiques import reconstruire
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table StatistiqueTicket à partir de tous les tickets."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000,
+                            help="Nombre de tickets lus par requête.")
+
+    def handle(self, *args, **options):
+        compteurs = reconstruire(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"{compteurs} compteur(s) recalculé(s)."))
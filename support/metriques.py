@@ -0,0 +1,354 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import MailSortant, StatistiqueTicket
+
+
+# === Métriques au format d'exposition Prometheus (/metrics) ===
+#
+# Chaque processus tient ses compteurs, jauges et histogrammes en mémoire.
+# Avec plusieurs workers (gunicorn, commande envoyer_mails...), METRIQUES_DIR
+# désigne un dossier local partagé : chaque processus y réécrit son état
+# (<pid>-<id aléatoire>.json, remplacement atomique : un pid réutilisé par un
+# nouveau worker n'écrase pas les totaux de l'ancien) au plus toutes les
+# METRIQUES_INTERVALLE_ECRITURE secondes et à sa sortie, et /metrics additionne
+# tous les fichiers :
+#   - compteurs et histogrammes de tous les processus, même terminés : les
+#     totaux ne reculent pas quand un worker est recyclé ;
+#   - jauges des seuls processus vivants (pour un pid, le plus récent).
+# Le dossier est à vider au démarrage du serveur (sinon les totaux reprennent
+# ceux de l'exécution précédente). Sans METRIQUES_DIR, /metrics ne voit que
+# son propre processus.
+# Après un fork, le processus enfant repart de zéro (pas de double compte des
+# valeurs héritées du parent).
+
+SEAUX_DUREE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Registre:
+    def __init__(self):
+        self.metriques = {}
+        self._verrou = threading.Lock()
+        self._ecriture = threading.Lock()
+        self._pid = None
+        self._instance = None
+        self._debut = None
+        self._modifie = False
+
+    def ajouter(self, metrique):
+        self.metriques[metrique.nom] = metrique
+        return metrique
+
+    @contextmanager
+    def modification(self):
+        with self._verrou:
+            if self._pid != os.getpid():
+                self._nouveau_processus()
+            yield
+            self._modifie = True
+
+    def _nouveau_processus(self):
+        self._pid = os.getpid()
+        self._instance = f"{self._pid}-{uuid.uuid4().hex[:12]}"
+        self._debut = time.time()
+        for metrique in self.metriques.values():
+            metrique.valeurs.clear()
+        if dossier():
+            threading.Thread(target=self._ecrire_periodiquement, name="support-metriques", daemon=True).start()
+
+    def _ecrire_periodiquement(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(settings.METRIQUES_INTERVALLE_ECRITURE)
+            if self._modifie:
+                self.ecrire()
+
+    def instantane(self):
+        with self._verrou:
+            if self._pid != os.getpid():
+                self._nouveau_processus()
+            self._modifie = False
+            return {nom: metrique.exporter() for nom, metrique in self.metriques.items()}
+
+    def ecrire(self):
+        if not dossier() or self._pid != os.getpid():
+            return
+        os.makedirs(dossier(), exist_ok=True)
+        chemin = os.path.join(dossier(), f"{self._instance}.json")
+        # Fil d'écriture périodique et collecte /metrics peuvent écrire en même temps
+        with self._ecriture:
+            with open(chemin + ".tmp", "w", encoding="utf-8") as sortie:
+                json.dump({"pid": self._pid, "debut": self._debut, "metriques": self.instantane()}, sortie)
+            os.replace(chemin + ".tmp", chemin)
+
+
+registre = Registre()
+atexit.register(registre.ecrire)
+
+
+def dossier():
+    return getattr(settings, "METRIQUES_DIR", None)
+
+
+class Metrique:
+    type = None
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.valeurs = {}
+        registre.ajouter(self)
+
+    def _cle(self, etiquettes):
+        if len(etiquettes) != len(self.etiquettes):
+            raise ValueError(f"{self.nom} attend les étiquettes {self.etiquettes}.")
+        return tuple(str(valeur) for valeur in etiquettes)
+
+    def valeurs_exportees(self):
+        return [[list(cle), valeur] for cle, valeur in self.valeurs.items()]
+
+    def exporter(self):
+        return {"type": self.type, "aide": self.aide, "etiquettes": self.etiquettes,
+                "valeurs": self.valeurs_exportees()}
+
+
+class Compteur(Metrique):
+    type = "counter"
+
+    def inc(self, *etiquettes, valeur=1):
+        cle = self._cle(etiquettes)
+        with registre.modification():
+            self.valeurs[cle] = self.valeurs.get(cle, 0) + valeur
+
+
+class Jauge(Metrique):
+    """Jauge lue à la demande : fonction() -> {tuple d'étiquettes: valeur}."""
+    type = "gauge"
+
+    def __init__(self, nom, aide, etiquettes, fonction):
+        super().__init__(nom, aide, etiquettes)
+        self.fonction = fonction
+
+    def valeurs_exportees(self):
+        return [[list(map(str, cle)), valeur] for cle, valeur in self.fonction().items()]
+
+
+class Histogramme(Metrique):
+    type = "histogram"
+
+    def __init__(self, nom, aide, etiquettes=(), seaux=SEAUX_DUREE):
+        super().__init__(nom, aide, etiquettes)
+        self.seaux = tuple(seaux)
+
+    def observer(self, valeur, *etiquettes):
+        cle = self._cle(etiquettes)
+        # Comptes par seau (non cumulés), le dernier pour +Inf ; puis somme
+        index = bisect_left(self.seaux, valeur)
+        with registre.modification():
+            comptes = self.valeurs.get(cle)
+            if comptes is None:
+                comptes = self.valeurs[cle] = [0] * (len(self.seaux) + 1) + [0.0]
+            comptes[index] += 1
+            comptes[-1] += valeur
+
+    @contextmanager
+    def chronometrer(self, *etiquettes):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observer(time.perf_counter() - debut, *etiquettes)
+
+    def exporter(self):
+        return {**super().exporter(), "seaux": self.seaux}
+
+
+# === Métriques de l'API support ===
+
+HTTP_REQUETES = Histogramme(
+    "support_http_requete_duree_secondes",
+    "Durée des requêtes HTTP par route nommée (jusqu'à la création de la réponse).",
+    ["route", "methode", "statut"],
+)
+TICKETS_CREES = Compteur("support_tickets_crees_total", "Tickets créés.", ["origine"])
+TICKETS_CLOS = Compteur("support_tickets_clos_total", "Tickets clôturés.", ["origine"])
+MAILS_MISE_EN_FILE = Histogramme(
+    "support_mails_mise_en_file_secondes",
+    "Préparation et mise en file d'un mail de notification (support.utils).",
+    ["type"],
+)
+MAILS_ENVOI = Histogramme(
+    "support_mails_envoi_secondes", "Envoi SMTP d'un mail de la file.", ["resultat"],
+)
+DB_CONNEXIONS = Compteur(
+    "support_db_connexions_total", "Connexions ouvertes vers la base (signal connection_created).", ["alias"],
+)
+
+_connexions = weakref.WeakSet()
+
+
+def connexion_ouverte(connection):
+    _connexions.add(connection)
+    DB_CONNEXIONS.inc(connection.alias)
+
+
+def _connexions_ouvertes():
+    # Une enveloppe de connexion par fil : on compte celles dont la connexion est ouverte
+    return Counter((connexion.alias,) for connexion in list(_connexions) if connexion.connection is not None)
+
+
+Jauge("support_db_connexions_ouvertes", "Connexions à la base ouvertes, par processus vivant.",
+      ["alias"], _connexions_ouvertes)
+
+
+def compter_evenements(evenements, origine):
+    """Compteurs de tickets créés / clos, après le commit (format evenements.evenements_ticket)."""
+    types = Counter(evenement["type"] for evenement in evenements)
+    if types["ticket_cree"] or types["ticket_clos"]:
+        transaction.on_commit(lambda: _compter(types, origine))
+
+
+def _compter(types, origine):
+    if types["ticket_cree"]:
+        TICKETS_CREES.inc(origine, valeur=types["ticket_cree"])
+    if types["ticket_clos"]:
+        TICKETS_CLOS.inc(origine, valeur=types["ticket_clos"])
+
+
+# === Agrégation et exposition ===
+
+def metriques_base():
+    """Jauges lues en base à chaque collecte : déjà globales, rien à agréger."""
+    file_mails = MailSortant.objects.values_list("statut").annotate(nombre=Count("id"))
+    tickets = StatistiqueTicket.objects.filter(dimension="global", indicateur__startswith="statut:") \
+        .values_list("indicateur", "valeur")
+    return {
+        "support_mails_file": {
+            "type": "gauge", "aide": "Mails de la file d'envoi, par statut.", "etiquettes": ["statut"],
+            "valeurs": [[[statut], nombre] for statut, nombre in file_mails],
+        },
+        "support_tickets": {
+            "type": "gauge", "aide": "Tickets par statut (statistiques incrémentales).", "etiquettes": ["statut"],
+            "valeurs": [[[indicateur.split(":", 1)[1]], valeur] for indicateur, valeur in tickets],
+        },
+    }
+
+
+def _vivant(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def collecter():
+    """{nom: famille} agrégé sur tous les processus (ou ce seul processus sans METRIQUES_DIR)."""
+    if not dossier():
+        return registre.instantane()
+
+    registre.ecrire()
+    contenus = []
+    for nom_fichier in os.listdir(dossier()):
+        if not nom_fichier.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(dossier(), nom_fichier), encoding="utf-8") as entree:
+                contenus.append(json.load(entree))
+        except (OSError, ValueError):
+            continue
+
+    # Pid réutilisé : seul le dernier processus démarré avec ce pid peut être vivant
+    derniers = {}
+    for contenu in contenus:
+        derniers[contenu["pid"]] = max(derniers.get(contenu["pid"], 0), contenu.get("debut", 0))
+    familles = {}
+    for contenu in contenus:
+        vivant = contenu.get("debut", 0) == derniers[contenu["pid"]] and (
+            contenu["pid"] == os.getpid() or _vivant(contenu["pid"])
+        )
+        for nom, famille in contenu["metriques"].items():
+            if famille["type"] == "gauge" and not vivant:
+                continue
+            _fusionner(familles.setdefault(nom, {**famille, "valeurs": []}), famille["valeurs"])
+    return familles
+
+
+def _fusionner(famille, valeurs):
+    cumul = {tuple(cle): valeur for cle, valeur in famille["valeurs"]}
+    for cle, valeur in valeurs:
+        cle = tuple(cle)
+        if cle not in cumul:
+            cumul[cle] = valeur
+        elif isinstance(valeur, list):
+            cumul[cle] = [a + b for a, b in zip(cumul[cle], valeur)]
+        else:
+            cumul[cle] += valeur
+    famille["valeurs"] = [[list(cle), valeur] for cle, valeur in cumul.items()]
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquettes(noms, valeurs, supplement=()):
+    paires = [*zip(noms, valeurs), *supplement]
+    if not paires:
+        return ""
+    return "{" + ",".join(f'{nom}="{_echapper(valeur)}"' for nom, valeur in paires) + "}"
+
+
+def _nombre(valeur):
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+def exposition(familles):
+    """Format texte 0.0.4 de Prometheus."""
+    lignes = []
+    for nom, famille in sorted(familles.items()):
+        lignes.append(f"# HELP {nom} {famille['aide']}")
+        lignes.append(f"# TYPE {nom} {famille['type']}")
+        for cle, valeur in sorted(famille["valeurs"]):
+            if famille["type"] != "histogram":
+                lignes.append(f"{nom}{_etiquettes(famille['etiquettes'], cle)} {_nombre(valeur)}")
+                continue
+            cumul = 0
+            for borne, compte in zip([*famille["seaux"], "+Inf"], valeur[:-1]):
+                cumul += compte
+                le = borne if borne == "+Inf" else _nombre(float(borne))
+                lignes.append(f"{nom}_bucket{_etiquettes(famille['etiquettes'], cle, [('le', le)])} {cumul}")
+            lignes.append(f"{nom}_sum{_etiquettes(famille['etiquettes'], cle)} {_nombre(valeur[-1])}")
+            lignes.append(f"{nom}_count{_etiquettes(famille['etiquettes'], cle)} {cumul}")
+    return "\n".join(lignes) + "\n"
+
+
+# === Middleware ===
+
+class MetriquesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        debut = time.perf_counter()
+        response = self.get_response(request)
+        resolution = getattr(request, "resolver_match", None)
+        HTTP_REQUETES.observer(
+            time.perf_counter() - debut,
+            resolution.view_name if resolution else "non_resolue", request.method, response.status_code,
+        )
+        return response
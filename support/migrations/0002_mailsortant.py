@@ -0,0 +1,32 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MailSortant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sujet', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('destinataires', models.JSONField(default=list)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('envoye', 'Envoyé'), ('echec', 'Échec définitif')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='support_mai_statut_e455dd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:03
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0002_mailsortant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Televersement',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nom', models.CharField(max_length=255)),
+                ('taille', models.PositiveBigIntegerField()),
+                ('recu', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, max_length=64)),
+                ('fichier', models.FileField(blank=True, upload_to='tickets/fichiers/')),
+                ('statut', models.CharField(choices=[('en_cours', 'En cours'), ('termine', 'Terminé'), ('attache', 'Rattaché à un ticket')], default='en_cours', max_length=20)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_modification', models.DateTimeField(auto_now=True, db_index=True)),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='televersements', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:07
+
+import support.stockage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0003_televersement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Contenu',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=255, unique=True)),
+                ('references', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fichier',
+            name='nom',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='fichier',
+            name='fichier',
+            field=models.FileField(storage=support.stockage.StockageDedupliquant(), upload_to='tickets/fichiers/'),
+        ),
+        migrations.AlterField(
+            model_name='televersement',
+            name='fichier',
+            field=models.FileField(blank=True, storage=support.stockage.StockageDedupliquant(), upload_to='tickets/fichiers/'),
+        ),
+    ]
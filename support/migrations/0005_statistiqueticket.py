@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0004_stockage_dedupliquant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatistiqueTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=20)),
+                ('cle', models.BigIntegerField(default=0)),
+                ('indicateur', models.CharField(max_length=30)),
+                ('valeur', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'cle', 'indicateur'), name='statistique_ticket_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0005_statistiqueticket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['-date_creation', '-id'], name='ticket_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['lien', '-date_creation', '-id'], name='ticket_lien_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['statut', 'date_creation'], name='ticket_statut_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['technicien', 'statut'], name='ticket_tech_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('statut', 'clos'), _negated=True), fields=['-date_creation', '-id'], name='ticket_ouverts_idx'),
+        ),
+    ]
@@ -0,0 +1,137 @@
+from django.db import migrations
+
+
+# Index plein texte sur Ticket.description (poids A) et Rapport.contenu (poids B).
+# PostgreSQL : colonne tsvector + index GIN ; SQLite (tests) : table virtuelle FTS5.
+# Dans les deux cas, des triggers tiennent l'index à jour, y compris pour
+# bulk_create et queryset.update(). La configuration "french" doit rester
+# alignée avec support/recherche.py.
+
+VECTEUR_PG = """
+    setweight(to_tsvector('french', coalesce(%(description)s, '')), 'A')
+    || setweight(to_tsvector('french', coalesce(
+        (SELECT contenu FROM support_rapport WHERE ticket_id = %(id)s), '')), 'B')
+"""
+
+POSTGRESQL = [
+    "ALTER TABLE support_ticket ADD COLUMN recherche tsvector",
+    "UPDATE support_ticket SET recherche = " + VECTEUR_PG % {"description": "description", "id": "support_ticket.id"},
+    "CREATE INDEX ticket_recherche_gin ON support_ticket USING gin (recherche)",
+    """
+    CREATE FUNCTION support_ticket_recherche() RETURNS trigger AS $$
+    BEGIN
+        NEW.recherche := """ + VECTEUR_PG % {"description": "NEW.description", "id": "NEW.id"} + """;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER support_ticket_recherche
+    BEFORE INSERT OR UPDATE OF description ON support_ticket
+    FOR EACH ROW EXECUTE FUNCTION support_ticket_recherche()
+    """,
+    """
+    CREATE FUNCTION support_rapport_recherche() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            UPDATE support_ticket SET recherche = """ + VECTEUR_PG % {"description": "description", "id": "support_ticket.id"} + """
+            WHERE id = OLD.ticket_id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            UPDATE support_ticket SET recherche = """ + VECTEUR_PG % {"description": "description", "id": "support_ticket.id"} + """
+            WHERE id = NEW.ticket_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER support_rapport_recherche
+    AFTER INSERT OR DELETE OR UPDATE OF contenu, ticket_id ON support_rapport
+    FOR EACH ROW EXECUTE FUNCTION support_rapport_recherche()
+    """,
+]
+
+POSTGRESQL_INVERSE = [
+    "DROP TRIGGER IF EXISTS support_rapport_recherche ON support_rapport",
+    "DROP FUNCTION IF EXISTS support_rapport_recherche()",
+    "DROP TRIGGER IF EXISTS support_ticket_recherche ON support_ticket",
+    "DROP FUNCTION IF EXISTS support_ticket_recherche()",
+    "DROP INDEX IF EXISTS ticket_recherche_gin",
+    "ALTER TABLE support_ticket DROP COLUMN IF EXISTS recherche",
+]
+
+SQLITE = [
+    """
+    CREATE VIRTUAL TABLE support_ticket_fts USING fts5(
+        description, rapport, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO support_ticket_fts (rowid, description, rapport)
+    SELECT t.id, t.description, r.contenu
+    FROM support_ticket t LEFT JOIN support_rapport r ON r.ticket_id = t.id
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_ai AFTER INSERT ON support_ticket BEGIN
+        INSERT INTO support_ticket_fts (rowid, description, rapport) VALUES (new.id, new.description, NULL);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_au AFTER UPDATE OF description ON support_ticket BEGIN
+        UPDATE support_ticket_fts SET description = new.description WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_ad AFTER DELETE ON support_ticket BEGIN
+        DELETE FROM support_ticket_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_ai AFTER INSERT ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = new.contenu WHERE rowid = new.ticket_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_au AFTER UPDATE OF contenu, ticket_id ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = NULL WHERE rowid = old.ticket_id;
+        UPDATE support_ticket_fts SET rapport = new.contenu WHERE rowid = new.ticket_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_ad AFTER DELETE ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = NULL WHERE rowid = old.ticket_id;
+    END
+    """,
+]
+
+SQLITE_INVERSE = [
+    "DROP TRIGGER IF EXISTS support_rapport_fts_ad",
+    "DROP TRIGGER IF EXISTS support_rapport_fts_au",
+    "DROP TRIGGER IF EXISTS support_rapport_fts_ai",
+    "DROP TRIGGER IF EXISTS support_ticket_fts_ad",
+    "DROP TRIGGER IF EXISTS support_ticket_fts_au",
+    "DROP TRIGGER IF EXISTS support_ticket_fts_ai",
+    "DROP TABLE IF EXISTS support_ticket_fts",
+]
+
+
+def executer(instructions):
+    def operation(apps, schema_editor):
+        for sql in instructions.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0006_index_acces_tickets'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            executer({"postgresql": POSTGRESQL, "sqlite": SQLITE}),
+            executer({"postgresql": POSTGRESQL_INVERSE, "sqlite": SQLITE_INVERSE}),
+        ),
+    ]
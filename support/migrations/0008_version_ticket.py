@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0007_recherche_plein_texte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
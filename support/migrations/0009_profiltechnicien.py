@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('support', '0008_version_ticket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilTechnicien',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actif', models.BooleanField(default=True)),
+                ('capacite', models.PositiveIntegerField(blank=True, help_text='Tickets ouverts au maximum', null=True)),
+                ('derniere_assignation', models.DateTimeField(blank=True, null=True)),
+                ('logiciels', models.ManyToManyField(blank=True, related_name='techniciens_competents', to='support.logiciel')),
+                ('technicien', models.OneToOneField(limit_choices_to={'roles__nom': 'technicien'}, on_delete=django.db.models.deletion.CASCADE, related_name='profil_technicien', to=settings.AUTH_USER_MODEL)),
+                ('types_problemes', models.ManyToManyField(blank=True, related_name='techniciens_competents', to='support.typeprobleme')),
+            ],
+        ),
+    ]
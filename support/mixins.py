@@ -0,0 +1,163 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.duration import duration_string
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from . import cache_references
+from .prefetch import optimiser_queryset
+from .renderers import OrjsonRenderer
+from .routeurs import designer_alias_lecture, ecriture_recente, lectures_sur
+
+
+# === Lectures sur la réplique ===
+class LectureReplicaMixin:
+    """GET et HEAD lisent sur settings.BASE_LECTURE (réplique) si elle est configurée.
+
+    À réserver aux vues qui tolèrent le retard de la réplique. L'alias est
+    choisi après l'authentification (lue sur la principale) : un client qui
+    vient d'écrire relit sur la principale (cf. support/routeurs.py).
+    """
+    methodes_replica = ("GET", "HEAD")
+
+    def dispatch(self, request, *args, **kwargs):
+        # Portée de l'alias posé par initial()
+        with lectures_sur(None):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.BASE_LECTURE and request.method in self.methodes_replica and not ecriture_recente(request):
+            designer_alias_lecture(settings.BASE_LECTURE)
+
+
+# === Chargement anticipé des relations ===
+class EagerLoadingMixin:
+    """Applique le plan de chargement du serializer au queryset de la vue.
+
+    Le plan est ajouté après les filtres : les jointures et préchargements ne
+    portent que sur les lignes retenues (et, avec la pagination, sur la page).
+    """
+
+    def filter_queryset(self, queryset):
+        return optimiser_queryset(super().filter_queryset(queryset), self.get_serializer_class())
+
+
+# === Cache des listes de référence ===
+class CacheReferenceMixin:
+    """Sert la liste depuis le cache "references", partitionné par rôles.
+
+    La réponse porte un ETag calculé sur son contenu : un client qui revalide
+    avec If-None-Match reçoit un 304 sans corps.
+    """
+    groupe_cache = None
+
+    def list(self, request, *args, **kwargs):
+        roles = [role.nom for role in request.user.roles.all()]
+        cle = cache_references.cle_entree(self.groupe_cache, roles, request.get_full_path())
+        entree = cache_references.lire(cle)
+        if entree is None:
+            entree = cache_references.ecrire(cle, super().list(request, *args, **kwargs).data)
+
+        reponse = get_conditional_response(request, etag=entree["etag"])
+        if reponse is None:
+            reponse = Response(entree["donnees"])
+        reponse["ETag"] = entree["etag"]
+        patch_cache_control(reponse, private=True, no_cache=True)
+        patch_vary_headers(reponse, ["Authorization"])
+        return reponse
+
+
+# === GET conditionnel sur les tickets ===
+class EtagTicketMixin:
+    """Répond 304 à If-None-Match d'après Ticket.version, avant toute sérialisation.
+
+    L'empreinte est calculée avant le corps : si le ticket change entre les
+    deux, le client reçoit une empreinte plus ancienne que le contenu et
+    rechargera au prochain appel, jamais l'inverse. Les changements des
+    données liées (noms de client, de logiciel, d'utilisateur) n'en font pas
+    partie.
+    """
+
+    def etag_tickets(self, request, *args, **kwargs):
+        """Empreinte entre guillemets, ou None : réponse sans ETag."""
+        return None
+
+    def get(self, request, *args, **kwargs):
+        etag = self.etag_tickets(request, *args, **kwargs)
+        if etag is None:
+            return super().get(request, *args, **kwargs)
+        reponse = get_conditional_response(request, etag=etag)
+        if reponse is None:
+            reponse = super().get(request, *args, **kwargs)
+        reponse["ETag"] = etag
+        patch_cache_control(reponse, private=True, no_cache=True)
+        patch_vary_headers(reponse, ["Authorization"])
+        return reponse
+
+
+# === Projection plate des listes ===
+class ProjectionMixin:
+    """?view=summary (tous les champs de `projection`) ou ?fields=a,b.
+
+    Les lignes sont lues par .values() sur les seules colonnes demandées :
+    ni instance de modèle, ni serializer, ni préchargement. Le rendu passe par
+    orjson.
+    """
+    # Nom public -> chemin ORM
+    projection = {}
+
+    def projection_demandee(self):
+        params = getattr(self.request, "query_params", None) or {}
+        return bool(params.get("fields")) or params.get("view") == "summary"
+
+    def champs_projection(self):
+        params = self.request.query_params
+        if params.get("fields"):
+            noms = list(dict.fromkeys(nom.strip() for nom in params["fields"].split(",") if nom.strip()))
+            inconnus = sorted(set(noms) - set(self.projection))
+            if inconnus:
+                raise ValidationError({"fields": f"Champs inconnus : {', '.join(inconnus)}. "
+                                                 f"Disponibles : {', '.join(self.projection)}."})
+            return noms
+        if params.get("view") == "summary":
+            return list(self.projection)
+        return None
+
+    def get_renderers(self):
+        renderers = super().get_renderers()
+        if self.projection_demandee():
+            return [OrjsonRenderer()] + renderers
+        return renderers
+
+    def list(self, request, *args, **kwargs):
+        noms = self.champs_projection() if request.method == "GET" else None
+        if noms is None:
+            return super().list(request, *args, **kwargs)
+
+        chemins = {self.projection[nom]: nom for nom in noms}
+        colonnes = set(chemins)
+        get_ordering = getattr(self.paginator, "get_ordering", None)
+        if get_ordering is not None:
+            # Colonnes du curseur, retirées de la sortie si non demandées
+            colonnes |= {champ.lstrip("-") for champ in get_ordering(request)}
+        lignes = (
+            self.filter_queryset(self.get_queryset())
+            .select_related(None).prefetch_related(None)
+            .values(*colonnes)
+        )
+        page = self.paginate_queryset(lignes)
+        donnees = [
+            {nom: _valeur_json(ligne[chemin]) for chemin, nom in chemins.items()}
+            for ligne in (page if page is not None else lignes)
+        ]
+        if page is not None:
+            return self.get_paginated_response(donnees)
+        return Response(donnees)
+
+
+def _valeur_json(valeur):
+    # Même format que serializers.DurationField
+    return duration_string(valeur) if isinstance(valeur, timedelta) else valeur
@@ -1,4 +1,10 @@
-from django.db import models
+import os
+import uuid
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from .stockage import stockage_fichiers
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
 
@@ -58,9 +64,21 @@ class Utilisateur(AbstractBaseUser, PermissionsMixin):
     def get_full_name(self):
         return f"{self.prenom} {self.nom}"
 
+    def _est_precharge(self, relation):
+        return relation in getattr(self, "_prefetched_objects_cache", {})
+
     def has_role(self, nom):
+        # Utilise les rôles préchargés (prefetch_related) s'ils sont disponibles
+        if self._est_precharge("roles"):
+            return any(role.nom == nom for role in self.roles.all())
         return self.roles.filter(nom=nom).exists()
 
+    def liens_clients(self):
+        # Liens PersonnelClient avec leur client, depuis le cache de prefetch si présent
+        if self._est_precharge("clients_rattaches"):
+            return self.clients_rattaches.all()
+        return self.clients_rattaches.select_related("client")
+
 
 # === Client ===
 
@@ -164,11 +182,89 @@ class Ticket(models.Model):
     date_creation = models.DateField(auto_now_add=True)
     date_cloture = models.DateField(null=True, blank=True)
     temps_traitement = models.DurationField(null=True, blank=True)
+    # Incrémentée à chaque modification du ticket, de ses fichiers ou de son
+    # rapport : sert d'ETag (les mises à jour par queryset.update() doivent
+    # l'incrémenter aussi, cf. incrementer_versions)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            # Pagination par curseur (date_creation, id) et tickets d'un lien
+            models.Index(fields=["-date_creation", "-id"], name="ticket_date_id_idx"),
+            models.Index(fields=["lien", "-date_creation", "-id"], name="ticket_lien_date_idx"),
+            models.Index(fields=["statut", "date_creation"], name="ticket_statut_date_idx"),
+            models.Index(fields=["technicien", "statut"], name="ticket_tech_statut_idx"),
+            # Tickets ouverts uniquement : la grande majorité des lignes (clos) n'y figure pas
+            models.Index(
+                fields=["-date_creation", "-id"],
+                condition=~models.Q(statut="clos"),
+                name="ticket_ouverts_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding or kwargs.get("update_fields") == []:
+            return super().save(*args, **kwargs)
+        from .statistiques import etat_en_base
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "version"}
+        with transaction.atomic():
+            # Ligne verrouillée jusqu'au commit : deux enregistrements concurrents
+            # donnent deux versions, et les statistiques partent de cet état
+            # (signals.ticket_avant_enregistrement)
+            etat = etat_en_base(self.pk, verrouiller=True, champs=["version"])
+            if etat is not None:
+                self.version = etat.pop("version") + 1
+            self._etat_en_base = etat
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def incrementer_versions(cls, ids):
+        return cls.objects.filter(pk__in=ids).update(version=models.F("version") + 1)
 
     def __str__(self):
         return f"Ticket #{self.id} - {self.lien.client.nom}"
 
 
+# === Profil de routage d'un technicien (voir support/routage.py) ===
+
+class ProfilTechnicien(models.Model):
+    technicien = models.OneToOneField(
+        Utilisateur,
+        on_delete=models.CASCADE,
+        limit_choices_to={"roles__nom": "technicien"},
+        related_name="profil_technicien"
+    )
+    # Compétences ; aucune déclarée = polyvalent
+    logiciels = models.ManyToManyField(Logiciel, blank=True, related_name="techniciens_competents")
+    types_problemes = models.ManyToManyField(TypeProbleme, blank=True, related_name="techniciens_competents")
+    actif = models.BooleanField(default=True)
+    capacite = models.PositiveIntegerField(null=True, blank=True, help_text="Tickets ouverts au maximum")
+    derniere_assignation = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Profil de {self.technicien}"
+
+
+# === Statistiques agrégées des tickets (voir support/statistiques.py) ===
+
+class StatistiqueTicket(models.Model):
+    dimension = models.CharField(max_length=20)
+    cle = models.BigIntegerField(default=0)
+    indicateur = models.CharField(max_length=30)
+    valeur = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "cle", "indicateur"], name="statistique_ticket_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension}:{self.cle} {self.indicateur} = {self.valeur}"
+
+
 # === Rapport ===
 
 class Rapport(models.Model):
@@ -188,8 +284,81 @@ class Fichier(models.Model):
         on_delete=models.CASCADE,
         related_name="fichiers"
     )
-    fichier = models.FileField(upload_to="tickets/fichiers/")
+    fichier = models.FileField(upload_to="tickets/fichiers/", storage=stockage_fichiers)
+    # Nom d'origine : le nom stocké est l'empreinte SHA-256 du contenu
+    nom = models.CharField(max_length=255, blank=True)
     date_ajout = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.fichier.name
+        return self.nom or self.fichier.name
+
+    def save(self, *args, **kwargs):
+        if not self.nom and self.fichier:
+            self.nom = os.path.basename(self.fichier.name)
+        super().save(*args, **kwargs)
+
+
+# === Blob stocké (adressé par contenu) et son compteur de références ===
+
+class Contenu(models.Model):
+    nom = models.CharField(max_length=255, unique=True)
+    references = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nom} ({self.references})"
+
+
+# === Téléversement par morceaux (avant rattachement à un ticket) ===
+
+class Televersement(models.Model):
+    STATUTS = [
+        ("en_cours", "En cours"),
+        ("termine", "Terminé"),
+        ("attache", "Rattaché à un ticket"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    utilisateur = models.ForeignKey(
+        Utilisateur,
+        on_delete=models.CASCADE,
+        related_name="televersements"
+    )
+    nom = models.CharField(max_length=255)
+    taille = models.PositiveBigIntegerField()
+    recu = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True)
+    fichier = models.FileField(upload_to="tickets/fichiers/", storage=stockage_fichiers, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default="en_cours")
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.nom} ({self.recu}/{self.taille})"
+
+
+# === File d'envoi des mails (outbox) ===
+
+class MailSortant(models.Model):
+    STATUTS = [
+        ("en_attente", "En attente"),
+        ("envoye", "Envoyé"),
+        ("echec", "Échec définitif"),
+    ]
+
+    sujet = models.CharField(max_length=255)
+    message = models.TextField()
+    destinataires = models.JSONField(default=list)
+    statut = models.CharField(max_length=20, choices=STATUTS, default="en_attente")
+    tentatives = models.PositiveIntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["statut", "prochaine_tentative"]),
+        ]
+
+    def __str__(self):
+        return f"{self.sujet} ({self.statut})"
@@ -0,0 +1,53 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Utilisateur
+
+
+# === Destinataires des notifications, mis en cache par rôle ===
+#
+# Les listes sont rangées sous un numéro de version (cache par défaut, partagé
+# par les workers : cf. settings.CACHES). Les signaux de support/signals.py
+# changent la version dès que les rôles d'un utilisateur, son email ou les
+# rôles eux-mêmes changent : tous les processus lisent alors la nouvelle
+# version, les anciennes entrées expirent d'elles-mêmes.
+
+CLE_VERSION = "support:destinataires:version"
+DUREE_CACHE = 300
+
+
+def version():
+    valeur = cache.get(CLE_VERSION)
+    if valeur is None:
+        valeur = uuid.uuid4().hex
+        # add : deux processus qui initialisent en même temps gardent la même version
+        if not cache.add(CLE_VERSION, valeur, None):
+            valeur = cache.get(CLE_VERSION, valeur)
+    return valeur
+
+
+def destinataires_par_role(*roles):
+    cle = f"support:destinataires:{version()}:{','.join(sorted(roles))}"
+    destinataires = cache.get(cle)
+    if destinataires is None:
+        destinataires = list(
+            Utilisateur.objects.filter(roles__nom__in=roles)
+            .values_list("email", flat=True)
+            .distinct()
+            .order_by("email")
+        )
+        cache.set(cle, destinataires, DUREE_CACHE)
+    return destinataires
+
+
+def _nouvelle_version():
+    cache.set(CLE_VERSION, uuid.uuid4().hex, None)
+
+
+def invalider_destinataires():
+    _nouvelle_version()
+    # Une seconde fois après le commit : une lecture concurrente a pu remettre
+    # en cache l'état d'avant la transaction sous la nouvelle version
+    transaction.on_commit(_nouvelle_version)
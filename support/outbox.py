@@ -0,0 +1,155 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .metriques import MAILS_ENVOI
+from .models import MailSortant
+
+logger = logging.getLogger(__name__)
+
+
+# === File d'envoi des mails (outbox) ===
+#
+# Les vues n'envoient plus de mail directement : elles écrivent un MailSortant
+# dans la même transaction que le ticket, et la commande `envoyer_mails`
+# vide la file par lots, avec une seule connexion SMTP par lot.
+#
+# Un lot est réservé dans une transaction courte : ses mails sont repoussés de
+# MAIL_OUTBOX_BAIL secondes, ce qui les cache aux autres workers. L'envoi SMTP
+# a lieu hors transaction, sans verrou ; les résultats sont enregistrés
+# ensuite. Un worker arrêté en plein lot rend ses mails à l'expiration du bail.
+
+
+def mettre_en_file(sujet, message, destinataires):
+    if not destinataires:
+        return None
+    return MailSortant.objects.create(sujet=sujet, message=message, destinataires=list(destinataires))
+
+
+def delai_avant_tentative(tentatives):
+    # Backoff exponentiel : base, 2 x base, 4 x base, ...
+    return timedelta(seconds=settings.MAIL_OUTBOX_BACKOFF * 2 ** (tentatives - 1))
+
+
+class StatistiquesEnvoi:
+    """Compteurs cumulés des lots envoyés par ce processus."""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.reinitialiser()
+
+    def reinitialiser(self):
+        with self._verrou:
+            self.lots = 0
+            self.messages_envoyes = 0
+            self.messages_en_echec = 0
+            self.duree_totale = 0.0
+            self.dernier_lot = {"messages": 0, "echecs": 0, "duree": 0.0}
+
+    def enregistrer_lot(self, envoyes, echecs, duree):
+        with self._verrou:
+            self.lots += 1
+            self.messages_envoyes += envoyes
+            self.messages_en_echec += echecs
+            self.duree_totale += duree
+            self.dernier_lot = {"messages": envoyes, "echecs": echecs, "duree": duree}
+
+    def instantane(self):
+        with self._verrou:
+            return {
+                "lots": self.lots,
+                "messages_envoyes": self.messages_envoyes,
+                "messages_en_echec": self.messages_en_echec,
+                "duree_totale": self.duree_totale,
+                "dernier_lot": dict(self.dernier_lot),
+            }
+
+
+statistiques = StatistiquesEnvoi()
+
+
+def mails_en_attente():
+    return MailSortant.objects.filter(statut="en_attente", prochaine_tentative__lte=timezone.now())
+
+
+def reserver_lot(taille, maintenant):
+    """Prend jusqu'à `taille` mails en attente et les cache aux autres workers le temps du bail."""
+    with transaction.atomic():
+        # skip_locked : plusieurs workers peuvent réserver en parallèle
+        lot = list(
+            mails_en_attente().select_for_update(skip_locked=True)
+            .order_by("prochaine_tentative", "id")[:taille]
+        )
+        if lot:
+            MailSortant.objects.filter(pk__in=[mail.pk for mail in lot]).update(
+                prochaine_tentative=maintenant + timedelta(seconds=settings.MAIL_OUTBOX_BAIL)
+            )
+    return lot
+
+
+def envoyer_lot(taille=None, connection=None):
+    """Envoie un lot de mails en attente ; retourne (envoyés, échecs), (0, 0) si aucun mail n'a pu être pris."""
+    taille = taille or settings.MAIL_OUTBOX_TAILLE_LOT
+    maintenant = timezone.now()
+    lot = reserver_lot(taille, maintenant)
+    if not lot:
+        return 0, 0
+
+    debut = time.perf_counter()
+    connection = connection or get_connection(fail_silently=False)
+    envoyes = echecs = 0
+    try:
+        # Une seule ouverture : send_messages réutilise la connexion déjà ouverte
+        connection.open()
+        for mail in lot:
+            message = EmailMessage(
+                mail.sujet, mail.message, settings.DEFAULT_FROM_EMAIL, mail.destinataires,
+            )
+            envoi = time.perf_counter()
+            try:
+                connection.send_messages([message])
+            except Exception as exc:
+                MAILS_ENVOI.observer(time.perf_counter() - envoi, "echec")
+                _echec(mail, exc, maintenant)
+                echecs += 1
+            else:
+                MAILS_ENVOI.observer(time.perf_counter() - envoi, "envoye")
+                mail.statut = "envoye"
+                mail.date_envoi = timezone.now()
+                mail.derniere_erreur = ""
+                envoyes += 1
+    except Exception as exc:
+        # Connexion impossible : tout le lot est replanifié
+        for mail in lot:
+            if mail.statut == "en_attente":
+                _echec(mail, exc, maintenant)
+                echecs += 1
+    finally:
+        connection.close()
+
+    # Résultats : le bail des mails envoyés ou replanifiés prend fin
+    MailSortant.objects.bulk_update(
+        lot, ["statut", "tentatives", "prochaine_tentative", "derniere_erreur", "date_envoi"]
+    )
+
+    duree = time.perf_counter() - debut
+    statistiques.enregistrer_lot(envoyes, echecs, duree)
+    logger.info("Lot de mails : %s envoyé(s), %s échec(s) en %.3fs", envoyes, echecs, duree)
+    return envoyes, echecs
+
+
+def _echec(mail, exc, maintenant):
+    mail.tentatives += 1
+    mail.derniere_erreur = repr(exc)
+    if mail.tentatives >= settings.MAIL_OUTBOX_MAX_TENTATIVES:
+        mail.statut = "echec"
+        logger.error("Mail %s abandonné après %s tentatives : %r", mail.pk, mail.tentatives, exc)
+    else:
+        mail.prochaine_tentative = maintenant + delai_avant_tentative(mail.tentatives)
+        logger.warning("Échec d'envoi du mail %s (tentative %s) : %r", mail.pk, mail.tentatives, exc)
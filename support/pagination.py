@@ -0,0 +1,173 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+# === Pagination par curseur (keyset) ===
+#
+# Contrairement à CursorPagination de DRF, qui complète la position par un
+# OFFSET quand plusieurs lignes partagent la même valeur de tri, le curseur
+# contient ici toutes les colonnes de l'ordre (la dernière étant unique).
+# Chaque page est donc un simple WHERE (...) < (...) ORDER BY ... LIMIT n,
+# et une page profonde coûte autant que la première.
+
+class KeysetCursorPagination(BasePagination):
+    ordering = ("-id",)
+    # Tris proposés via ?ordering= : nom public -> colonnes du curseur (la dernière unique)
+    ordres = {}
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    ordering_query_param = "ordering"
+    invalid_cursor_message = "Curseur invalide."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request)
+        self.cursor = self.decode_cursor(request, queryset.model)
+
+        if self.cursor is None:
+            valeurs, inverse = None, False
+        else:
+            valeurs, inverse = self.cursor
+
+        ordering = _inverser(self.ordering) if inverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if valeurs is not None:
+            queryset = queryset.filter(_apres(ordering, valeurs))
+
+        resultats = list(queryset[:self.page_size + 1])
+        self.has_more = len(resultats) > self.page_size
+        self.page = resultats[:self.page_size]
+        if inverse:
+            self.page.reverse()
+
+        # En avançant, il y a une page précédente dès qu'un curseur est fourni ;
+        # en reculant, une page suivante existe toujours (celle d'où l'on vient).
+        if inverse:
+            self.has_next, self.has_previous = valeurs is not None, self.has_more
+        else:
+            self.has_next, self.has_previous = self.has_more, valeurs is not None
+        return self.page
+
+    def get_ordering(self, request):
+        # Un tri absent de la liste blanche est ignoré, comme avec OrderingFilter
+        return self.ordres.get(request.query_params.get(self.ordering_query_param), self.ordering)
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 50
+        demande = request.query_params.get(self.page_size_query_param)
+        if demande:
+            try:
+                page_size = int(demande)
+            except ValueError:
+                pass
+        return max(1, min(page_size, settings.PAGINATION_MAX_PAGE_SIZE))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), inverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), inverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def decode_cursor(self, request, model):
+        encode = request.query_params.get(self.cursor_query_param)
+        if not encode:
+            return None
+        try:
+            contenu = json.loads(base64.urlsafe_b64decode(encode.encode("ascii")))
+            valeurs, inverse = contenu["v"], bool(contenu.get("r"))
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valeurs, list) or len(valeurs) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Curseur modifiable par le client : chaque valeur est convertie par le
+        # champ de sa colonne de tri avant d'atteindre l'ORM
+        try:
+            valeurs = [
+                model._meta.get_field(champ.lstrip("-")).to_python(valeur)
+                for champ, valeur in zip(self.ordering, valeurs)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in valeurs:
+            raise NotFound(self.invalid_cursor_message)
+        return valeurs, inverse
+
+    def encode_cursor(self, valeurs, inverse):
+        contenu = {"v": valeurs}
+        if inverse:
+            contenu["r"] = 1
+        encode = base64.urlsafe_b64encode(
+            json.dumps(contenu, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+        ).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, encode)
+
+    def _position(self, instance):
+        # Instance de modèle, ou ligne de .values() (projections plates)
+        if isinstance(instance, dict):
+            return [instance[champ.lstrip("-")] for champ in self.ordering]
+        return [getattr(instance, champ.lstrip("-")) for champ in self.ordering]
+
+
+def _inverser(ordering):
+    return tuple(champ[1:] if champ.startswith("-") else "-" + champ for champ in ordering)
+
+
+def _apres(ordering, valeurs):
+    # (a, b) après (va, vb)  <=>  a > va OR (a = va AND b > vb), selon le sens de tri
+    condition, egalites = Q(), {}
+    for champ, valeur in zip(ordering, valeurs):
+        nom = champ.lstrip("-")
+        operateur = "lt" if champ.startswith("-") else "gt"
+        condition |= Q(**egalites, **{f"{nom}__{operateur}": valeur})
+        egalites[nom] = valeur
+    return condition
+
+
+class IdCursorPagination(KeysetCursorPagination):
+    ordering = ("-id",)
+
+
+class TicketCursorPagination(KeysetCursorPagination):
+    ordering = ("-date_creation", "-id")
+    ordres = {
+        "-date_creation": ("-date_creation", "-id"),
+        "date_creation": ("date_creation", "id"),
+        "statut": ("statut", "-date_creation", "-id"),
+        "-statut": ("-statut", "-date_creation", "-id"),
+        "-id": ("-id",),
+        "id": ("id",),
+    }
@@ -0,0 +1,130 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+# === Planificateur de chargement anticipé ===
+#
+# Parcourt l'arbre des champs déclarés d'un serializer et en déduit les
+# select_related / prefetch_related à appliquer au queryset, afin que le
+# nombre de requêtes reste fixe quelle que soit la taille de la page.
+#
+# Un serializer peut compléter le plan pour ses SerializerMethodField via
+# des indications dans sa Meta, relatives à son propre modèle :
+#
+#     class Meta:
+#         select_related = ["client"]
+#         prefetch_related = ["clients_rattaches__client"]
+
+
+def optimiser_queryset(queryset, serializer_class):
+    """Applique au queryset le plan de chargement du serializer."""
+    return _appliquer(queryset, _plan_pour(serializer_class, queryset.model))
+
+
+@lru_cache(maxsize=None)
+def _plan_pour(serializer_class, model):
+    return _plan(serializer_class(), model)
+
+
+def _plan(serializer, model, prefixe="", plan=None):
+    # plan = (liste des select_related, {chemin: (modèle, sous-plan)})
+    if plan is None:
+        plan = ([], {})
+    select, prefetch = plan
+
+    meta = getattr(serializer, "Meta", None)
+    for chemin in getattr(meta, "select_related", ()):
+        _ajouter(select, prefixe + chemin)
+    for chemin in getattr(meta, "prefetch_related", ()):
+        prefetch.setdefault(prefixe + chemin, (None, None))
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*":
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            enfant, multiple = field.child, True
+        elif isinstance(field, serializers.BaseSerializer):
+            enfant, multiple = field, False
+        elif isinstance(field, ManyRelatedField):
+            enfant, multiple = None, True
+        elif isinstance(field, RelatedField):
+            # Les clés primaires sont lues sur la colonne *_id, sans requête.
+            if field.use_pk_only_optimization():
+                continue
+            enfant, multiple = None, False
+        elif len(field.source_attrs) > 1:
+            # Champ simple lu au travers de relations (source="lien.client.nom")
+            relation = _resoudre(model, field.source_attrs[:-1])
+            if relation is not None:
+                chemin, _, vers_plusieurs = relation
+                if vers_plusieurs:
+                    prefetch.setdefault(prefixe + chemin, (None, None))
+                else:
+                    _ajouter(select, prefixe + chemin)
+            continue
+        else:
+            continue
+
+        relation = _resoudre(model, field.source_attrs)
+        if relation is None:
+            continue
+        chemin, modele_lie, vers_plusieurs = relation
+
+        if not (multiple or vers_plusieurs):
+            _ajouter(select, prefixe + chemin)
+            if enfant is not None:
+                _plan(enfant, modele_lie, prefixe + chemin + "__", plan)
+        elif enfant is not None:
+            prefetch[prefixe + chemin] = (modele_lie, _plan(enfant, modele_lie))
+        else:
+            prefetch.setdefault(prefixe + chemin, (None, None))
+
+    return plan
+
+
+def _resoudre(model, attrs):
+    # Retourne (chemin ORM, modèle lié, relation multiple) ou None si la
+    # source n'est pas une chaîne de relations du modèle.
+    if not attrs:
+        return None
+    chemin = []
+    for index, attr in enumerate(attrs):
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not field.is_relation or field.related_model is None:
+            return None
+        vers_plusieurs = field.one_to_many or field.many_to_many
+        if vers_plusieurs and index < len(attrs) - 1:
+            return None
+        chemin.append(attr)
+        model = field.related_model
+    return "__".join(chemin), model, vers_plusieurs
+
+
+def _ajouter(liste, valeur):
+    if valeur not in liste:
+        liste.append(valeur)
+
+
+def _appliquer(queryset, plan):
+    select, prefetch = plan
+    if select:
+        queryset = queryset.select_related(*select)
+    lookups = []
+    for chemin, (modele, sous_plan) in prefetch.items():
+        if sous_plan is None or not any(sous_plan):
+            lookups.append(chemin)
+        else:
+            lookups.append(
+                Prefetch(chemin, queryset=_appliquer(modele._default_manager.all(), sous_plan))
+            )
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    return queryset
@@ -0,0 +1,239 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+
+# === Profilage des requêtes (optionnel) ===
+#
+# Activé par PROFILAGE_ACTIF. Désactivé, le middleware lève MiddlewareNotUsed
+# au chargement : Django le retire de la chaîne et il ne coûte rien.
+# Activé, pour une part PROFILAGE_ECHANTILLON des requêtes, il relève :
+#   - nombre et durée des requêtes SQL (connection.execute_wrapper, toutes les
+#     bases), et les empreintes répétées (même SQL aux paramètres près : N+1) ;
+#   - le temps passé dans serializer.data, dont la part SQL (chargements
+#     paresseux pendant la sérialisation) : la propriété n'est remplacée que
+#     tant qu'au moins une requête mesurée est en cours, puis restaurée ;
+#   - le pic d'allocation (tracemalloc), pour PROFILAGE_MEMOIRE_ECHANTILLON des
+#     requêtes mesurées ;
+#   - un profil cProfile, pour PROFILAGE_CPROFILE_ECHANTILLON des requêtes
+#     mesurées, écrit dans PROFILAGE_CPROFILE_DIR si la requête a dépassé
+#     PROFILAGE_CPROFILE_SEUIL_MS.
+# Les mesures partent dans l'en-tête Server-Timing et dans une ligne de journal
+# JSON (logger support.profilage, aussi en extra={"profilage": ...}).
+# Les réponses en flux (export, téléchargement) ne sont mesurées que jusqu'à
+# la création de la réponse.
+
+_mesure_courante = ContextVar("profilage", default=None)
+
+# tracemalloc et cProfile sont globaux au processus : une requête à la fois
+_verrou_memoire = threading.Lock()
+_verrou_cprofile = threading.Lock()
+
+# serializer.data instrumenté pendant les requêtes mesurées (compteur partagé)
+_verrou_serializers = threading.Lock()
+_instrumentations = 0
+_proprietes_originales = {}
+
+LITTERAUX = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+LISTES = re.compile(r"\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)")
+ESPACES = re.compile(r"\s+")
+
+
+def empreinte(sql):
+    """SQL sans ses valeurs : deux requêtes de même empreinte ne diffèrent que par leurs paramètres."""
+    sql = LITTERAUX.sub("?", sql)
+    sql = LISTES.sub("(...)", sql)
+    return ESPACES.sub(" ", sql).strip()
+
+
+class Mesure:
+    def __init__(self):
+        self.requetes = 0
+        self.duree_sql = 0.0
+        self.empreintes = Counter()
+        self.serialisation = 0.0
+        self.sql_serialisation = 0.0
+        self._profondeur = 0
+
+    def executer(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.requetes += 1
+            self.duree_sql += time.perf_counter() - debut
+            self.empreintes[empreinte(sql)] += 1
+
+    def repetees(self):
+        # Requêtes en trop : toutes sauf la première de chaque empreinte
+        return sum(compte - 1 for compte in self.empreintes.values())
+
+    def doublons(self, nombre):
+        return [
+            {"nombre": compte, "sql": sql[:300]}
+            for sql, compte in self.empreintes.most_common(nombre) if compte > 1
+        ]
+
+
+def _chronometrer(data):
+    def mesuree(serializer):
+        mesure = _mesure_courante.get()
+        if mesure is None or mesure._profondeur:
+            return data(serializer)
+        # Seul le serializer le plus externe est compté
+        mesure._profondeur += 1
+        debut, sql = time.perf_counter(), mesure.duree_sql
+        try:
+            return data(serializer)
+        finally:
+            mesure._profondeur -= 1
+            mesure.serialisation += time.perf_counter() - debut
+            mesure.sql_serialisation += mesure.duree_sql - sql
+
+    return mesuree
+
+
+@contextmanager
+def serializers_instrumentes():
+    """Chronomètre serializer.data le temps du bloc ; restaure la propriété à la sortie du dernier bloc."""
+    global _instrumentations
+    with _verrou_serializers:
+        if not _instrumentations:
+            for classe in (serializers.Serializer, serializers.ListSerializer):
+                propriete = classe.__dict__["data"]
+                _proprietes_originales[classe] = propriete
+                classe.data = property(_chronometrer(propriete.fget))
+        _instrumentations += 1
+    try:
+        yield
+    finally:
+        with _verrou_serializers:
+            _instrumentations -= 1
+            if not _instrumentations:
+                for classe, propriete in _proprietes_originales.items():
+                    classe.data = propriete
+                _proprietes_originales.clear()
+
+
+class ProfilageMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILAGE_ACTIF", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.echantillon = settings.PROFILAGE_ECHANTILLON
+        self.echantillon_memoire = settings.PROFILAGE_MEMOIRE_ECHANTILLON
+        self.echantillon_cprofile = settings.PROFILAGE_CPROFILE_ECHANTILLON
+        self.seuil_cprofile = settings.PROFILAGE_CPROFILE_SEUIL_MS
+        self.dossier_cprofile = settings.PROFILAGE_CPROFILE_DIR
+        self.doublons_max = settings.PROFILAGE_DOUBLONS_MAX
+
+    def __call__(self, request):
+        if random.random() >= self.echantillon:
+            return self.get_response(request)
+
+        mesure = Mesure()
+        jeton = _mesure_courante.set(mesure)
+        with ExitStack() as pile:
+            for alias in connections:
+                pile.enter_context(connections[alias].execute_wrapper(mesure.executer))
+            pile.enter_context(serializers_instrumentes())
+            memoire = self._tracer_memoire(pile)
+            profil = self._profiler(pile)
+            debut = time.perf_counter()
+            try:
+                response = self.get_response(request)
+            finally:
+                _mesure_courante.reset(jeton)
+            duree = time.perf_counter() - debut
+            pic = memoire() if memoire else None
+        # Sorti de la pile : profileur arrêté
+        fichier_profil = self._ecrire_profil(profil, request, duree) if profil else None
+
+        self._publier(request, response, mesure, duree, pic, fichier_profil)
+        return response
+
+    def _tracer_memoire(self, pile):
+        if random.random() >= self.echantillon_memoire or not _verrou_memoire.acquire(blocking=False):
+            return None
+        pile.callback(_verrou_memoire.release)
+        # Traçage déjà actif (PYTHONTRACEMALLOC) : on ne fait que remettre le pic à zéro
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            pile.callback(tracemalloc.stop)
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        return lambda: tracemalloc.get_traced_memory()[1] - base
+
+    def _profiler(self, pile):
+        if random.random() >= self.echantillon_cprofile or not _verrou_cprofile.acquire(blocking=False):
+            return None
+        pile.callback(_verrou_cprofile.release)
+        profil = cProfile.Profile()
+        profil.enable()
+        pile.callback(profil.disable)
+        return profil
+
+    def _ecrire_profil(self, profil, request, duree):
+        if duree * 1000 < self.seuil_cprofile:
+            return None
+        os.makedirs(self.dossier_cprofile, exist_ok=True)
+        route = re.sub(r"[^\w.-]+", "_", request.path.strip("/")) or "racine"
+        nom = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{route}-{duree * 1000:.0f}ms.prof"
+        chemin = os.path.join(self.dossier_cprofile, nom)
+        profil.dump_stats(chemin)
+        return chemin
+
+    def _publier(self, request, response, mesure, duree, pic, fichier_profil):
+        doublons = mesure.doublons(self.doublons_max)
+        resolution = getattr(request, "resolver_match", None)
+        donnees = {
+            "methode": request.method,
+            "chemin": request.path,
+            "route": resolution.view_name if resolution else None,
+            "statut": response.status_code,
+            "duree_ms": round(duree * 1000, 3),
+            "sql": {
+                "requetes": mesure.requetes,
+                "repetees": mesure.repetees(),
+                "duree_ms": round(mesure.duree_sql * 1000, 3),
+                "doublons": doublons,
+            },
+            "serialisation_ms": round(mesure.serialisation * 1000, 3),
+            "serialisation_sql_ms": round(mesure.sql_serialisation * 1000, 3),
+            "flux": response.streaming,
+        }
+        if pic is not None:
+            donnees["memoire_pic_octets"] = pic
+        if fichier_profil:
+            donnees["profil"] = fichier_profil
+
+        # En-tête ASCII (latin-1 au mieux) : descriptions sans accents
+        metriques = [
+            f'sql;dur={mesure.duree_sql * 1000:.3f};desc="{mesure.requetes} req, '
+            f'{mesure.repetees()} repetees"',
+            f"serialisation;dur={(mesure.serialisation - mesure.sql_serialisation) * 1000:.3f}",
+            f"app;dur={(duree - mesure.duree_sql - mesure.serialisation + mesure.sql_serialisation) * 1000:.3f}",
+            f"total;dur={duree * 1000:.3f}",
+        ]
+        if pic is not None:
+            metriques.append(f'memoire;desc="pic {pic} o"')
+        response["Server-Timing"] = ", ".join(metriques)
+
+        logger.info("profilage %s", json.dumps(donnees, ensure_ascii=False), extra={"profilage": donnees})
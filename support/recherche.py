@@ -0,0 +1,202 @@
+import html
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+
+# === Recherche plein texte dans les tickets ===
+#
+# L'index est tenu à jour par des triggers (migration 0007) :
+#   - PostgreSQL : colonne support_ticket.recherche (tsvector, index GIN),
+#     description pondérée A, contenu du rapport pondéré B ;
+#   - SQLite : table virtuelle FTS5 support_ticket_fts (tests, développement).
+# La recherche se fait en deux temps : les identifiants classés par
+# pertinence (LIMIT appliqué en base), puis les extraits surlignés pour ces
+# seuls tickets, le calcul d'un extrait étant coûteux.
+# Les autres bases n'ont pas d'index plein texte : repli sur icontains (tous
+# les mots requis, sans racinisation), l'extrait étant calculé en Python.
+
+CONFIG = "french"
+DEBUT, FIN = "\x02", "\x03"
+MOTS = re.compile(r"\w+")
+
+
+def rechercher(queryset, texte, limite):
+    """Retourne [(ticket_id, rang, extrait)] par pertinence décroissante."""
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _rechercher_postgresql(queryset, texte, limite)
+    if vendor == "sqlite":
+        return _rechercher_sqlite(queryset, texte, limite)
+    return _rechercher_contient(queryset, texte, limite)
+
+
+def surligner(extrait):
+    # Le texte des tickets est échappé : seules les balises <mark> sont du HTML
+    return html.escape(extrait or "").replace(DEBUT, "<mark>").replace(FIN, "</mark>")
+
+
+def _classer(queryset, correspond, rang, limite):
+    return list(
+        queryset.filter(correspond)
+        .annotate(rang=rang)
+        .order_by("-rang", "-id")
+        .values_list("id", "rang")[:limite]
+    )
+
+
+# --- PostgreSQL ---
+
+TSQUERY = "websearch_to_tsquery(%s::regconfig, %s)"
+
+
+def _rechercher_postgresql(queryset, texte, limite):
+    table = queryset.model._meta.db_table
+    classement = _classer(
+        queryset,
+        RawSQL(f"{table}.recherche @@ {TSQUERY}", [CONFIG, texte], output_field=BooleanField()),
+        RawSQL(f"ts_rank_cd({table}.recherche, {TSQUERY}, 32)", [CONFIG, texte], output_field=FloatField()),
+        limite,
+    )
+    if not classement:
+        return []
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT t.id, ts_headline(
+                %s::regconfig, t.description || coalesce(E'\\n' || r.contenu, ''), {TSQUERY},
+                %s
+            )
+            FROM {table} t LEFT JOIN support_rapport r ON r.ticket_id = t.id
+            WHERE t.id = ANY(%s)
+            """,
+            [CONFIG, CONFIG, texte,
+             f"StartSel={DEBUT}, StopSel={FIN}, MaxFragments=2, MaxWords=20, MinWords=8",
+             [pk for pk, _ in classement]],
+        )
+        extraits = dict(cursor.fetchall())
+    return [(pk, rang, extraits.get(pk, "")) for pk, rang in classement]
+
+
+# --- SQLite (FTS5) ---
+
+# SQLite reconstruit une table pour la plupart des ALTER TABLE d'une migration,
+# ce qui supprime ses triggers : ils sont recréés après chaque migrate
+# (signal post_migrate, cf. support/signals.py). La migration 0007 en garde sa
+# propre copie, telle qu'appliquée à l'époque.
+DECLENCHEURS_SQLITE = [
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_ai AFTER INSERT ON support_ticket BEGIN
+        INSERT INTO support_ticket_fts (rowid, description, rapport) VALUES (new.id, new.description, NULL);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_au AFTER UPDATE OF description ON support_ticket BEGIN
+        UPDATE support_ticket_fts SET description = new.description WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_ticket_fts_ad AFTER DELETE ON support_ticket BEGIN
+        DELETE FROM support_ticket_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_ai AFTER INSERT ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = new.contenu WHERE rowid = new.ticket_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_au AFTER UPDATE OF contenu, ticket_id ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = NULL WHERE rowid = old.ticket_id;
+        UPDATE support_ticket_fts SET rapport = new.contenu WHERE rowid = new.ticket_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS support_rapport_fts_ad AFTER DELETE ON support_rapport BEGIN
+        UPDATE support_ticket_fts SET rapport = NULL WHERE rowid = old.ticket_id;
+    END
+    """,
+]
+
+
+def installer_declencheurs_sqlite(connection):
+    if connection.vendor != "sqlite" or "support_ticket_fts" not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in DECLENCHEURS_SQLITE:
+            cursor.execute(sql)
+
+
+def requete_fts5(texte):
+    # Chaque mot entre guillemets : la syntaxe FTS5 (NEAR, *, :...) est neutralisée,
+    # les mots sont combinés en ET
+    return " ".join(f'"{mot}"' for mot in MOTS.findall(texte))
+
+
+def _rechercher_sqlite(queryset, texte, limite):
+    table = queryset.model._meta.db_table
+    requete = requete_fts5(texte)
+    if not requete:
+        return []
+    classement = _classer(
+        queryset,
+        RawSQL(
+            f"{table}.id IN (SELECT rowid FROM support_ticket_fts WHERE support_ticket_fts MATCH %s)",
+            [requete], output_field=BooleanField(),
+        ),
+        # bm25 est négatif, plus petit = plus pertinent ; description pondérée x2
+        RawSQL(
+            "SELECT -bm25(support_ticket_fts, 2.0, 1.0) FROM support_ticket_fts "
+            f"WHERE support_ticket_fts MATCH %s AND rowid = {table}.id",
+            [requete], output_field=FloatField(),
+        ),
+        limite,
+    )
+    if not classement:
+        return []
+    ids = [pk for pk, _ in classement]
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT rowid, snippet(support_ticket_fts, -1, %s, %s, '…', 16) FROM support_ticket_fts "
+            f"WHERE support_ticket_fts MATCH %s AND rowid IN ({', '.join(['%s'] * len(ids))})",
+            [DEBUT, FIN, requete, *ids],
+        )
+        extraits = dict(cursor.fetchall())
+    return [(pk, rang, extraits.get(pk, "")) for pk, rang in classement]
+
+
+# --- Autres bases (icontains) ---
+
+TAILLE_EXTRAIT = 160
+
+
+def _rechercher_contient(queryset, texte, limite):
+    mots = list(dict.fromkeys(mot.lower() for mot in MOTS.findall(texte)))
+    if not mots:
+        return []
+    correspond, rang = Q(), Value(0.0)
+    for mot in mots:
+        correspond &= Q(description__icontains=mot) | Q(rapport__contenu__icontains=mot)
+        # Même pondération que les index plein texte : description x2
+        rang = rang + Case(When(description__icontains=mot, then=Value(2.0)), default=Value(0.0)) \
+            + Case(When(rapport__contenu__icontains=mot, then=Value(1.0)), default=Value(0.0))
+    classement = _classer(queryset, correspond, rang, limite)
+    if not classement:
+        return []
+    textes = queryset.model._default_manager.using(queryset.db).filter(
+        pk__in=[pk for pk, _ in classement]
+    ).values_list("id", "description", "rapport__contenu")
+    extraits = {pk: _extrait(description, contenu, mots) for pk, description, contenu in textes}
+    return [(pk, rang, extraits.get(pk, "")) for pk, rang in classement]
+
+
+def _extrait(description, contenu, mots):
+    texte = description + ("\n" + contenu if contenu else "")
+    motif = re.compile("|".join(map(re.escape, mots)), re.IGNORECASE)
+    premier = motif.search(texte)
+    debut = max(0, (premier.start() if premier else 0) - TAILLE_EXTRAIT // 4)
+    fin = debut + TAILLE_EXTRAIT
+    extrait = motif.sub(lambda m: f"{DEBUT}{m.group()}{FIN}", texte[debut:fin])
+    return ("…" if debut else "") + extrait + ("…" if fin < len(texte) else "")
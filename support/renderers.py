@@ -0,0 +1,18 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# === Rendu JSON rapide (orjson) ===
+#
+# Utilisé pour les projections plates des listes (?view=summary, ?fields=) :
+# orjson sérialise nativement dates, UUID et sous-classes de dict/list ; les
+# autres types passent par l'encodeur de DRF.
+
+class OrjsonRenderer(JSONRenderer):
+    _encodeur = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=self._encodeur.default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,100 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProfilTechnicien, StatistiqueTicket
+
+# === Routage automatique des nouveaux tickets ===
+#
+# Parmi les profils de techniciens actifs, on retient :
+#   1. le meilleur niveau de compétence pour le logiciel du ticket
+#      (2 : logiciel déclaré ; 1 : type de problème commun, ou polyvalent ;
+#       0 : incompétent, exclu) ;
+#   2. puis la charge la plus faible (tickets en attente ou en cours),
+#      les techniciens ayant atteint leur capacité étant écartés ;
+#   3. puis l'assignation la plus ancienne (tourniquet), puis l'id.
+#
+# La charge n'est jamais recomptée : c'est l'index incrémental des
+# statistiques (dimension "technicien"), tenu à jour à chaque changement de
+# statut ou d'assignation, quel que soit le processus qui l'a fait.
+# Les candidats sont classés sans verrou ; seul le profil retenu est verrouillé
+# (SELECT ... FOR UPDATE) jusqu'au commit de la transaction qui crée le ticket,
+# et sa charge et sa capacité sont relues sous ce verrou. Un profil déjà
+# verrouillé par une création concurrente est d'abord sauté (SKIP LOCKED) :
+# les créations simultanées vont à des techniciens différents au lieu de
+# s'attendre. Si tous les candidats sont pris, on attend le premier.
+
+STATUTS_OUVERTS = ("en_attente", "en_cours")
+
+
+def charges(techniciens_ids):
+    charge = dict.fromkeys(techniciens_ids, 0)
+    for cle, valeur in StatistiqueTicket.objects.filter(
+        dimension="technicien", cle__in=techniciens_ids,
+        indicateur__in=[f"statut:{statut}" for statut in STATUTS_OUVERTS],
+    ).values_list("cle", "valeur"):
+        charge[cle] += valeur
+    return charge
+
+
+def niveau(profil, logiciel_id, types_du_logiciel):
+    logiciels = {l.pk for l in profil.logiciels.all()}
+    types = {t.pk for t in profil.types_problemes.all()}
+    if logiciel_id in logiciels:
+        return 2
+    if types & types_du_logiciel or not (logiciels or types):
+        return 1
+    return 0
+
+
+def choisir_technicien(logiciel):
+    """Technicien à assigner, ou None ; à appeler dans la transaction qui crée le ticket."""
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError("choisir_technicien doit être appelé dans une transaction.")
+
+    profils = list(
+        ProfilTechnicien.objects.filter(actif=True)
+        .prefetch_related("logiciels", "types_problemes")
+        .order_by("pk")
+    )
+    if not profils:
+        return None
+    types_du_logiciel = set(logiciel.type_problemes.values_list("pk", flat=True))
+    charge = charges([p.technicien_id for p in profils])
+
+    candidats = []
+    for profil in profils:
+        competence = niveau(profil, logiciel.pk, types_du_logiciel)
+        if not competence or (profil.capacite is not None and charge[profil.technicien_id] >= profil.capacite):
+            continue
+        derniere = profil.derniere_assignation.timestamp() if profil.derniere_assignation else 0
+        candidats.append(((-competence, charge[profil.technicien_id], derniere, profil.pk), profil))
+    candidats.sort(key=lambda candidat: candidat[0])
+
+    ecartes = set()
+    for attendre in (False, True):
+        for _, profil in candidats:
+            if profil.pk in ecartes:
+                continue
+            elu = _verrouiller(profil.pk, attendre)
+            if elu is None:
+                if attendre:
+                    ecartes.add(profil.pk)
+                continue
+            if elu.capacite is not None and charges([elu.technicien_id])[elu.technicien_id] >= elu.capacite:
+                # Capacité atteinte entre le classement et le verrou
+                ecartes.add(profil.pk)
+                continue
+            elu.derniere_assignation = timezone.now()
+            elu.save(update_fields=["derniere_assignation"])
+            return elu.technicien
+    return None
+
+
+def _verrouiller(pk, attendre):
+    """Profil verrouillé jusqu'au commit ; None s'il est pris (sans attente) ou désactivé."""
+    return (
+        ProfilTechnicien.objects.select_for_update(skip_locked=not attendre, of=("self",))
+        .select_related("technicien")
+        .filter(pk=pk, actif=True)
+        .first()
+    )
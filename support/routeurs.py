@@ -0,0 +1,111 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+
+from .checks import erreur_cache_coherence
+
+
+# === Routage des lectures vers la réplique ===
+#
+# Le routeur ne connaît pas la requête : LectureReplicaMixin (support/mixins.py)
+# désigne l'alias de lecture pour la durée d'une requête GET/HEAD, via une
+# variable de contexte (propre à chaque fil et à chaque tâche asyncio).
+# Hors de ces requêtes, et pour toute écriture, c'est la base principale.
+# Les réplicas ayant du retard, seules les listes qui le tolèrent sont marquées.
+#
+# Lire ses propres écritures : après une requête d'écriture réussie (POST,
+# PUT, PATCH, DELETE), les lectures du même client restent sur la principale
+# pendant LECTURE_REPLICA_COHERENCE secondes. Le client est reconnu :
+#   - par un cookie signé posé sur la réponse (navigateurs) ;
+#   - par son identifiant d'utilisateur, noté dans le cache par défaut
+#     (clients JWT sans cookies). Ce cache doit être partagé par les workers :
+#     sinon, le middleware refuse de démarrer (et manage.py check échoue,
+#     support.E003).
+
+_alias_lecture = ContextVar("alias_lecture", default=None)
+
+
+COOKIE_ECRITURE = "support_ecriture"
+SEL_COOKIE = "support.routeurs"
+METHODES_ECRITURE = ("POST", "PUT", "PATCH", "DELETE")
+
+
+def alias_lecture():
+    return _alias_lecture.get()
+
+
+def designer_alias_lecture(alias):
+    # À appeler dans la portée d'un lectures_sur(), qui rétablit l'alias en sortie
+    _alias_lecture.set(alias)
+
+
+@contextmanager
+def lectures_sur(alias):
+    jeton = _alias_lecture.set(alias)
+    try:
+        yield
+    finally:
+        _alias_lecture.reset(jeton)
+
+
+class RouteurLectures:
+    def db_for_read(self, model, **hints):
+        return alias_lecture()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Réplique et principale portent les mêmes données
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # La réplique reçoit le schéma par réplication, jamais par migrate
+        return db == "default"
+
+
+# === Cohérence après écriture ===
+
+def cle_ecriture(utilisateur_id):
+    return f"support:ecriture:{utilisateur_id}"
+
+
+def ecriture_recente(request):
+    delai = settings.LECTURE_REPLICA_COHERENCE
+    if request.get_signed_cookie(COOKIE_ECRITURE, default=None, salt=SEL_COOKIE, max_age=delai):
+        return True
+    utilisateur = getattr(request, "user", None)
+    return bool(utilisateur and utilisateur.is_authenticated and cache.get(cle_ecriture(utilisateur.pk)))
+
+
+def marquer_ecriture(request, response):
+    delai = settings.LECTURE_REPLICA_COHERENCE
+    response.set_signed_cookie(
+        COOKIE_ECRITURE, str(int(time.time())), salt=SEL_COOKIE, max_age=delai, httponly=True, samesite="Lax",
+    )
+    # request.user : utilisateur authentifié par DRF (JWT) pendant la vue
+    utilisateur = getattr(request, "user", None)
+    if utilisateur and utilisateur.is_authenticated:
+        cache.set(cle_ecriture(utilisateur.pk), True, timeout=delai)
+
+
+class CoherenceLecturesMiddleware:
+    """Note les écritures réussies ; inutile (retiré de la chaîne) sans réplique."""
+
+    def __init__(self, get_response):
+        if not settings.BASE_LECTURE:
+            raise MiddlewareNotUsed
+        erreur = erreur_cache_coherence()
+        if erreur:
+            raise ImproperlyConfigured(f"{erreur.msg} {erreur.hint}")
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method in METHODES_ECRITURE and response.status_code < 400:
+            marquer_ecriture(request, response)
+        return response
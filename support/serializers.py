@@ -1,9 +1,13 @@
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from .models import (
     Role, Utilisateur, Client, Personnel, PersonnelClient,
     TypeLogiciel, TypeProbleme, Logiciel,
-    Ticket, Rapport, Fichier
+    Ticket, Rapport, Fichier, Televersement
 )
+from .routage import choisir_technicien
+from .stockage import abandonner, ajuster_references
 
 # === Role ===
 class RoleSerializer(serializers.ModelSerializer):
@@ -20,17 +24,27 @@ class UtilisateurSerializer(serializers.ModelSerializer):
     class Meta:
         model = Utilisateur
         fields = ['id', 'email', 'nom', 'prenom', 'tel', 'roles', 'clients']
+        # Indication pour le planificateur de chargement (voir support/prefetch.py)
+        prefetch_related = ['clients_rattaches__client']
+
+    def to_representation(self, instance):
+        # Carte d'identité par requête : un utilisateur présent sur plusieurs
+        # tickets (technicien, personnel) n'est sérialisé qu'une seule fois.
+        deja_vus = self.context.setdefault("utilisateurs_serialises", {})
+        cle = (type(self), instance.pk)
+        if cle not in deja_vus:
+            deja_vus[cle] = super().to_representation(instance)
+        return deja_vus[cle]
 
     def get_clients(self, obj):
         if obj.has_role("personnel"):
-            links = PersonnelClient.objects.filter(personnel=obj).select_related("client")
             return [
                 {
                     "id": link.client.id,
                     "nom": link.client.nom,
                     "type": link.client.type,
                 }
-                for link in links
+                for link in obj.liens_clients()
             ]
         return []
 
@@ -130,9 +144,10 @@ class LogicielCreateSerializer(serializers.ModelSerializer):
 
 # === Fichier ===
 class FichierSerializer(serializers.ModelSerializer):
+    """Fichier intégré à un ticket (TicketReadSerializer.fichiers)."""
     class Meta:
         model = Fichier
-        fields = ['id', 'fichier', 'date_ajout']
+        fields = ['id', 'fichier', 'nom', 'date_ajout']
 
 
 # === Rapport ===
@@ -160,13 +175,57 @@ class TicketReadSerializer(serializers.ModelSerializer):
         ]
 
 
-#####################
-class FichierSerializer(serializers.ModelSerializer):
-    ticket = TicketReadSerializer()
+# Projection plate des listes de tickets (?view=summary, ?fields=) : nom -> chemin ORM
+TICKET_RESUME = {
+    "id": "id",
+    "statut": "statut",
+    "description": "description",
+    "date_creation": "date_creation",
+    "date_cloture": "date_cloture",
+    "temps_traitement": "temps_traitement",
+    "version": "version",
+    "client_id": "lien__client_id",
+    "client": "lien__client__nom",
+    "personnel_id": "lien__personnel_id",
+    "personnel": "lien__personnel__email",
+    "technicien_id": "technicien_id",
+    "technicien": "technicien__email",
+    "logiciel_id": "logiciel_id",
+    "logiciel": "logiciel__nom",
+}
+
+
+class TicketRechercheSerializer(serializers.ModelSerializer):
+    """Résultat de recherche : rang et extrait surligné sont posés par la vue."""
+    client = serializers.CharField(source='lien.client.nom', read_only=True)
+    logiciel = serializers.CharField(source='logiciel.nom', read_only=True)
+    rang = serializers.FloatField(read_only=True)
+    extrait = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Ticket
+        fields = ['id', 'statut', 'date_creation', 'client', 'logiciel', 'rang', 'extrait']
+
 
+# === Liste des fichiers (/api/fichiers/) ===
+class FichierListeSerializer(serializers.ModelSerializer):
+    """Le ticket n'est qu'une référence (id) ; ?expand=ticket le développe."""
     class Meta:
         model = Fichier
-        fields = ['id', 'fichier', 'date_ajout', 'ticket']
+        fields = ['id', 'fichier', 'nom', 'date_ajout', 'ticket']
+
+
+class TicketEmbarqueSerializer(TicketReadSerializer):
+    def to_representation(self, instance):
+        # Plusieurs fichiers d'un même ticket : le ticket n'est sérialisé qu'une fois
+        deja_vus = self.context.setdefault("tickets_serialises", {})
+        if instance.pk not in deja_vus:
+            deja_vus[instance.pk] = super().to_representation(instance)
+        return deja_vus[instance.pk]
+
+
+class FichierTicketSerializer(FichierListeSerializer):
+    ticket = TicketEmbarqueSerializer(read_only=True)
 
 
 class TicketWriteSerializer(serializers.ModelSerializer):
@@ -175,24 +234,98 @@ class TicketWriteSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
+    # Fichiers déjà envoyés par morceaux via /api/televersements/
+    televersements = serializers.PrimaryKeyRelatedField(
+        many=True,
+        write_only=True,
+        required=False,
+        queryset=Televersement.objects.filter(statut="termine")
+    )
 
     class Meta:
         model = Ticket
         fields = [
             'id', 'lien', 'technicien', 'logiciel',
-            'description', 'statut', 'fichiers'
+            'description', 'statut', 'fichiers', 'televersements'
         ]
 
+    def validate_televersements(self, televersements):
+        request = self.context.get('request')
+        if request and any(t.utilisateur_id != request.user.pk for t in televersements):
+            raise serializers.ValidationError("Téléversement inconnu.")
+        return televersements
+
     def create(self, validated_data):
         fichiers_data = validated_data.pop('fichiers', [])
+        televersements = validated_data.pop('televersements', [])
+        # Pièces jointes hachées et écrites avant le routage : le verrou du
+        # profil retenu (jusqu'au commit, cf. support/routage.py) n'attend pas le disque
+        champ = Fichier._meta.get_field('fichier')
+        stockes = [
+            (champ.storage.save(champ.generate_filename(None, f.name), f, max_length=champ.max_length), f.name)
+            for f in fichiers_data
+        ]
+        try:
+            with transaction.atomic():
+                return self._creer(validated_data, stockes, televersements)
+        except BaseException:
+            # Création annulée : les blobs écrits ci-dessus ne sont référencés par aucune ligne
+            abandonner([nom_stocke for nom_stocke, _ in stockes])
+            raise
+
+    def _creer(self, validated_data, stockes, televersements):
+        if validated_data.get('technicien') is None and settings.ROUTAGE_AUTOMATIQUE:
+            validated_data['technicien'] = choisir_technicien(validated_data['logiciel'])
         ticket = Ticket.objects.create(**validated_data)
 
-        for fichier in fichiers_data:
-            Fichier.objects.create(ticket=ticket, fichier=fichier)
+        fichiers = [Fichier(ticket=ticket, fichier=nom_stocke, nom=nom) for nom_stocke, nom in stockes]
+        fichiers += [Fichier(ticket=ticket, fichier=t.fichier.name, nom=t.nom) for t in televersements]
+        if fichiers:
+            Fichier.objects.bulk_create(fichiers)
+            ajuster_references([f.fichier.name for f in fichiers], +1)
+            Ticket.incrementer_versions([ticket.pk])
+
+        if televersements:
+            attaches = Televersement.objects.filter(
+                pk__in=[t.pk for t in televersements], statut="termine"
+            ).update(statut="attache")
+            if attaches != len(televersements):
+                raise serializers.ValidationError({'televersements': "Téléversement déjà rattaché."})
 
         return ticket
 
 
+# === Actions groupées (triage) ===
+class TicketActionSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1, max_length=500)
+    technicien = serializers.PrimaryKeyRelatedField(
+        queryset=Utilisateur.objects.filter(roles__nom="technicien"),
+        required=False, allow_null=True
+    )
+    statut = serializers.ChoiceField(choices=Ticket.STATUTS, required=False)
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
+
+    def validate(self, data):
+        if "technicien" not in data and "statut" not in data:
+            raise serializers.ValidationError("Indiquer un technicien et/ou un statut.")
+        return data
+
+
+# === Televersement ===
+class TeleversementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Televersement
+        fields = ['id', 'nom', 'taille', 'recu', 'sha256', 'statut', 'date_creation']
+        read_only_fields = ['recu', 'sha256', 'statut']
+
+    def validate_taille(self, taille):
+        if taille > settings.TELEVERSEMENT_TAILLE_MAX:
+            raise serializers.ValidationError("Fichier trop volumineux.")
+        return taille
+
+
 # === Profile ==
 
 class MeSerializer(serializers.ModelSerializer):
@@ -204,7 +337,7 @@ class MeSerializer(serializers.ModelSerializer):
         fields = ['id', 'email', 'nom', 'prenom', 'tel', 'roles', 'poste']
 
     def get_poste(self, obj):
-        if obj.roles.filter(nom="personnel").exists():
+        if obj.has_role("personnel"):
             try:
                 return obj.profil_personnel.poste
             except Personnel.DoesNotExist:
@@ -0,0 +1,134 @@
+from django.db import connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cache_references, evenements, metriques, statistiques
+from .models import Client, Fichier, Logiciel, Rapport, Role, Ticket, TypeLogiciel, TypeProbleme, Utilisateur
+from .notifications import invalider_destinataires
+from .recherche import installer_declencheurs_sqlite
+from .stockage import ajuster_references
+
+
+# === Invalidation des destinataires de notifications ===
+
+@receiver(m2m_changed, sender=Utilisateur.roles.through)
+def roles_utilisateur_modifies(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalider_destinataires()
+
+
+@receiver(post_save, sender=Utilisateur)
+def utilisateur_enregistre(sender, update_fields=None, **kwargs):
+    # Ex. : une mise à jour de last_login seul ne change pas les destinataires
+    if update_fields is None or "email" in update_fields:
+        invalider_destinataires()
+
+
+@receiver(post_delete, sender=Utilisateur)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def utilisateur_ou_role_modifie(sender, **kwargs):
+    invalider_destinataires()
+
+
+# === Invalidation du cache des données de référence ===
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Logiciel)
+@receiver(post_delete, sender=Logiciel)
+@receiver(post_save, sender=TypeLogiciel)
+@receiver(post_delete, sender=TypeLogiciel)
+@receiver(post_save, sender=TypeProbleme)
+@receiver(post_delete, sender=TypeProbleme)
+def reference_modifiee(sender, raw=False, **kwargs):
+    if not raw:
+        cache_references.invalider_modele(sender)
+
+
+@receiver(m2m_changed, sender=Logiciel.type_problemes.through)
+def types_problemes_logiciel_modifies(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        cache_references.invalider_modele(sender)
+
+
+# === Compteur de références des blobs de pièces jointes ===
+# (Fichier.objects.bulk_create n'émet pas post_save : l'appelant ajuste lui-même)
+
+@receiver(post_save, sender=Fichier)
+def fichier_cree(sender, instance, created, **kwargs):
+    if created:
+        ajuster_references([instance.fichier.name], +1)
+
+
+@receiver(post_delete, sender=Fichier)
+def fichier_supprime(sender, instance, **kwargs):
+    # Émis aussi pour chaque Fichier supprimé en cascade avec son ticket
+    ajuster_references([instance.fichier.name], -1)
+
+
+# === Statistiques incrémentales des tickets ===
+# (les mises à jour par update()/bulk_update() appellent statistiques.appliquer_lot, cf. triage.py)
+
+@receiver(pre_save, sender=Ticket)
+def ticket_avant_enregistrement(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._etat_statistiques = None
+    elif "_etat_en_base" in instance.__dict__:
+        # Lu et verrouillé par Ticket.save, dans la même transaction
+        instance._etat_statistiques = instance.__dict__.pop("_etat_en_base")
+    else:
+        instance._etat_statistiques = statistiques.etat_en_base(
+            instance.pk, verrouiller=transaction.get_connection().in_atomic_block
+        )
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_enregistre(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ancien = getattr(instance, "_etat_statistiques", None)
+        statistiques.appliquer(ancien, statistiques.etat_ticket(instance))
+        # Flux temps réel : création, assignation, clôture
+        liste = evenements.evenements_ticket(ancien, instance, instance.lien.personnel_id)
+        evenements.publier_apres_commit(liste)
+        metriques.compter_evenements(liste, "enregistrement")
+
+
+@receiver(pre_delete, sender=Ticket)
+def ticket_avant_suppression(sender, instance, **kwargs):
+    # Émis dans la transaction de la suppression
+    instance._etat_statistiques = statistiques.etat_en_base(instance.pk, verrouiller=True)
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_supprime(sender, instance, **kwargs):
+    statistiques.appliquer(getattr(instance, "_etat_statistiques", None), None)
+
+
+# === Version des tickets (ETag) ===
+
+@receiver(post_save, sender=Fichier)
+@receiver(post_delete, sender=Fichier)
+@receiver(post_save, sender=Rapport)
+@receiver(post_delete, sender=Rapport)
+def piece_du_ticket_modifiee(sender, instance, raw=False, **kwargs):
+    if not raw:
+        Ticket.incrementer_versions([instance.ticket_id])
+
+
+# === Recherche plein texte (SQLite) ===
+
+@receiver(post_migrate)
+def migrations_appliquees(sender, using="default", **kwargs):
+    if sender.name == "support":
+        installer_declencheurs_sqlite(connections[using])
+
+
+# === Métriques : connexions à la base ===
+
+@receiver(connection_created)
+def connexion_creee(sender, connection, **kwargs):
+    metriques.connexion_ouverte(connection)
@@ -0,0 +1,209 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+
+from .models import Client, Logiciel, StatistiqueTicket, Ticket, Utilisateur
+
+
+# === Statistiques des tickets, maintenues de façon incrémentale ===
+#
+# Chaque ticket contribue à des compteurs (dimension, clé, indicateur) :
+#   - "statut:<statut>"   nombre de tickets dans ce statut ;
+#   - "seau:<i>"          tickets clos dont la durée de résolution tombe dans le seau i ;
+#   - "duree_totale"      somme des durées de résolution (secondes).
+# Les dimensions sont "global" (clé 0), "client", "logiciel" et "technicien"
+# (clé 0 = non assigné). Lors d'une modification, on retire les contributions
+# de l'ancien état et on ajoute celles du nouveau : le tableau de bord ne lit
+# que ces compteurs, jamais la table des tickets.
+
+# Bornes supérieures des seaux de durée de résolution, en heures
+SEAUX_HEURES = [1, 4, 8, 24, 48, 72, 24 * 7, 24 * 14, 24 * 30, 24 * 90]
+CHAMPS_ETAT = ["statut", "lien__client_id", "logiciel_id", "technicien_id",
+               "temps_traitement", "date_creation", "date_cloture"]
+
+
+def duree_resolution(etat):
+    if etat["statut"] != "clos":
+        return None
+    if etat["temps_traitement"] is not None:
+        return etat["temps_traitement"]
+    if etat["date_cloture"] and etat["date_creation"]:
+        return timedelta(days=(etat["date_cloture"] - etat["date_creation"]).days)
+    return None
+
+
+def seau(duree):
+    heures = duree.total_seconds() / 3600
+    for index, borne in enumerate(SEAUX_HEURES):
+        if heures <= borne:
+            return index
+    return len(SEAUX_HEURES)
+
+
+def contributions(etat):
+    compteurs = Counter()
+    if etat is None:
+        return compteurs
+    cles = [
+        ("global", 0),
+        ("client", etat["lien__client_id"]),
+        ("logiciel", etat["logiciel_id"]),
+        ("technicien", etat["technicien_id"] or 0),
+    ]
+    duree = duree_resolution(etat)
+    for dimension, cle in cles:
+        compteurs[(dimension, cle, f"statut:{etat['statut']}")] += 1
+        if duree is not None:
+            compteurs[(dimension, cle, f"seau:{seau(duree)}")] += 1
+            compteurs[(dimension, cle, "duree_totale")] += int(duree.total_seconds())
+    return compteurs
+
+
+def etat_ticket(ticket, client_id=None):
+    """État d'un ticket en mémoire, au format de Ticket.objects.values(*CHAMPS_ETAT)."""
+    if client_id is None:
+        client_id = ticket.lien.client_id
+    return {
+        "statut": ticket.statut,
+        "lien__client_id": client_id,
+        "logiciel_id": ticket.logiciel_id,
+        "technicien_id": ticket.technicien_id,
+        "temps_traitement": ticket.temps_traitement,
+        "date_creation": ticket.date_creation,
+        "date_cloture": ticket.date_cloture,
+    }
+
+
+def etat_en_base(pk, verrouiller=False, champs=()):
+    tickets = Ticket.objects.filter(pk=pk)
+    if verrouiller:
+        # Ligne verrouillée jusqu'au commit : deux enregistrements concurrents ne
+        # retirent pas deux fois les contributions du même état
+        tickets = tickets.select_for_update(of=("self",))
+    return tickets.values(*CHAMPS_ETAT, *champs).first()
+
+
+def appliquer(ancien, nouveau):
+    delta = contributions(nouveau)
+    delta.subtract(contributions(ancien))
+    appliquer_delta(delta)
+
+
+def ajouter(etats):
+    """Contributions de tickets créés en masse (bulk_create n'émet pas de signaux)."""
+    appliquer_lot((None, etat) for etat in etats)
+
+
+def appliquer_lot(changements):
+    """Comme appliquer(), pour des paires (ancien, nouveau) modifiées par update()/bulk_update."""
+    delta = Counter()
+    for ancien, nouveau in changements:
+        delta.update(contributions(nouveau))
+        delta.subtract(contributions(ancien))
+    appliquer_delta(delta)
+
+
+def appliquer_delta(delta):
+    delta = {cle: valeur for cle, valeur in delta.items() if valeur}
+    if not delta:
+        return
+    # Deux requêtes quel que soit le nombre de compteurs touchés
+    conditions = {
+        (dimension, cle, indicateur): Q(dimension=dimension, cle=cle, indicateur=indicateur)
+        for dimension, cle, indicateur in delta
+    }
+    filtre = Q()
+    for condition in conditions.values():
+        filtre |= condition
+    with transaction.atomic():
+        StatistiqueTicket.objects.bulk_create(
+            [StatistiqueTicket(dimension=d, cle=c, indicateur=i) for d, c, i in delta],
+            ignore_conflicts=True,
+        )
+        StatistiqueTicket.objects.filter(filtre).update(
+            valeur=F("valeur") + Case(
+                *[When(conditions[cle], then=Value(valeur)) for cle, valeur in delta.items()],
+                default=Value(0),
+            )
+        )
+
+
+def reconstruire(chunk_size=2000):
+    """Recalcule toutes les statistiques depuis la table des tickets."""
+    totaux = Counter()
+    for etat in Ticket.objects.values(*CHAMPS_ETAT).iterator(chunk_size=chunk_size):
+        totaux.update(contributions(etat))
+    with transaction.atomic():
+        StatistiqueTicket.objects.all().delete()
+        StatistiqueTicket.objects.bulk_create(
+            [StatistiqueTicket(dimension=d, cle=c, indicateur=i, valeur=v)
+             for (d, c, i), v in totaux.items() if v],
+            batch_size=1000,
+        )
+    return len(totaux)
+
+
+# === Lecture pour le tableau de bord ===
+
+def percentile(seaux, nombre, p):
+    if not nombre:
+        return None
+    rang, cumul = p * nombre, 0
+    for index in range(len(SEAUX_HEURES) + 1):
+        cumul += seaux.get(index, 0)
+        if cumul >= rang:
+            # Borne supérieure du seau (la dernière borne pour le seau ouvert)
+            return SEAUX_HEURES[min(index, len(SEAUX_HEURES) - 1)]
+    return SEAUX_HEURES[-1]
+
+
+def _resume(indicateurs):
+    statuts = {nom: 0 for nom, _ in Ticket.STATUTS}
+    seaux = {}
+    for indicateur, valeur in indicateurs.items():
+        if indicateur.startswith("statut:"):
+            statuts[indicateur[len("statut:"):]] = valeur
+        elif indicateur.startswith("seau:"):
+            seaux[int(indicateur[len("seau:"):])] = valeur
+    resolus = sum(seaux.values())
+    duree_totale = indicateurs.get("duree_totale", 0)
+    return {
+        "total": sum(statuts.values()),
+        "statuts": statuts,
+        "resolution": {
+            "nombre": resolus,
+            "moyenne_heures": round(duree_totale / resolus / 3600, 2) if resolus else None,
+            "p50_heures": percentile(seaux, resolus, 0.5),
+            "p90_heures": percentile(seaux, resolus, 0.9),
+            "p95_heures": percentile(seaux, resolus, 0.95),
+        },
+    }
+
+
+def tableau_de_bord():
+    par_cle = {}
+    for dimension, cle, indicateur, valeur in StatistiqueTicket.objects.values_list(
+        "dimension", "cle", "indicateur", "valeur"
+    ):
+        par_cle.setdefault(dimension, {}).setdefault(cle, {})[indicateur] = valeur
+
+    libelles = {
+        "client": {c.pk: c.nom for c in Client.objects.filter(pk__in=par_cle.get("client", {}))},
+        "logiciel": {l.pk: l.nom for l in Logiciel.objects.filter(pk__in=par_cle.get("logiciel", {}))},
+        "technicien": {
+            u.pk: u.get_full_name()
+            for u in Utilisateur.objects.filter(pk__in=par_cle.get("technicien", {})).only("nom", "prenom")
+        },
+    }
+    libelles["technicien"][0] = "Non assigné"
+
+    donnees = {"global": _resume(par_cle.get("global", {}).get(0, {}))}
+    for dimension, cle_sortie in (("client", "clients"), ("logiciel", "logiciels"), ("technicien", "techniciens")):
+        donnees[cle_sortie] = [
+            {"id": cle or None, "nom": libelles[dimension].get(cle), **_resume(indicateurs)}
+            for cle, indicateurs in sorted(par_cle.get(dimension, {}).items())
+            if any(valeur for i, valeur in indicateurs.items() if i.startswith("statut:"))
+        ]
+    return donnees
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+# === Stockage adressé par contenu ===
+#
+# Le nom d'un fichier stocké est dérivé du SHA-256 de son contenu, calculé
+# pendant l'écriture : un même fichier joint à plusieurs tickets n'est écrit
+# qu'une fois sur disque. Le modèle Contenu compte les Fichier qui pointent
+# vers chaque blob ; le blob est supprimé quand ce compteur retombe à zéro.
+# _save verrouille la ligne Contenu du blob jusqu'au commit de l'appelant : un
+# supprimer_si_orphelin concurrent attend que le nouveau Fichier ait pris sa
+# référence, ou a fini de supprimer le blob, qui est alors réécrit.
+# Un blob écrit pour une opération annulée n'a pas de ligne Contenu : son
+# auteur le supprime par abandonner() une fois sa transaction annulée.
+
+TAILLE_BLOC = 64 * 1024
+NOM_ADRESSE = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{64}(\.[\w-]+)?$")
+
+
+def est_adresse(nom):
+    return bool(NOM_ADRESSE.search(nom or ""))
+
+
+@deconstructible
+class StockageDedupliquant(FileSystemStorage):
+
+    def _save(self, name, content):
+        dossier = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(dossier), exist_ok=True)
+        empreinte = hashlib.sha256()
+        # Empreinte déjà calculée par l'appelant (fichier sur disque uniquement)
+        sha256 = getattr(content, "sha256", None)
+
+        if hasattr(content, "temporary_file_path"):
+            # Fichier déjà sur disque : on le lit pour le hacher puis on le déplace
+            source = content.temporary_file_path()
+            if sha256 is None:
+                with open(source, "rb") as entree:
+                    for bloc in iter(lambda: entree.read(TAILLE_BLOC), b""):
+                        empreinte.update(bloc)
+            temporaire = None
+        else:
+            descripteur, temporaire = tempfile.mkstemp(dir=self.path(dossier), suffix=".part")
+            source = temporaire
+            try:
+                with os.fdopen(descripteur, "wb") as sortie:
+                    for bloc in content.chunks(TAILLE_BLOC):
+                        empreinte.update(bloc)
+                        sortie.write(bloc)
+            except BaseException:
+                os.remove(temporaire)
+                raise
+
+        if sha256 is None or temporaire:
+            sha256 = empreinte.hexdigest()
+        nom = "/".join(filter(None, [dossier, sha256[:2], sha256 + extension]))
+        chemin = self.path(nom)
+        verrouiller_contenu(nom)
+        if os.path.exists(chemin):
+            # Contenu déjà présent : rien à écrire
+            if temporaire:
+                os.remove(temporaire)
+        else:
+            os.makedirs(os.path.dirname(chemin), exist_ok=True)
+            if temporaire:
+                os.replace(temporaire, chemin)
+            else:
+                file_move_safe(source, chemin)
+            if self.file_permissions_mode is not None:
+                os.chmod(chemin, self.file_permissions_mode)
+        return nom
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom final est choisi par _save : un nom déjà pris n'est pas un conflit
+        return name
+
+
+stockage_fichiers = StockageDedupliquant()
+
+
+def verrouiller_contenu(nom):
+    """Verrou sur le compteur du blob jusqu'au commit, si l'appelant est dans une transaction."""
+    from .models import Contenu
+
+    if transaction.get_connection().in_atomic_block:
+        list(Contenu.objects.select_for_update().filter(nom=nom).values_list("pk", flat=True))
+
+
+def ajuster_references(noms, delta):
+    """Incrémente (delta > 0) ou décrémente le compteur de chaque blob."""
+    from .models import Contenu
+
+    for nom, nombre in Counter(noms).items():
+        if not nom or not est_adresse(nom):
+            continue
+        delta_nom = delta * nombre
+        if delta_nom > 0:
+            contenu, cree = Contenu.objects.get_or_create(nom=nom, defaults={"references": delta_nom})
+            if not cree:
+                Contenu.objects.filter(pk=contenu.pk).update(references=F("references") + delta_nom)
+        else:
+            Contenu.objects.filter(nom=nom).update(references=F("references") + delta_nom)
+            transaction.on_commit(lambda nom=nom: supprimer_si_orphelin(nom))
+
+
+def supprimer_si_orphelin(nom):
+    from .models import Contenu, Televersement
+
+    with transaction.atomic():
+        contenu = Contenu.objects.select_for_update().filter(nom=nom).first()
+        if contenu is None or contenu.references > 0:
+            return False
+        # Un téléversement terminé mais pas encore rattaché garde le blob
+        if Televersement.objects.filter(fichier=nom, statut="termine").exists():
+            return False
+        contenu.delete()
+        stockage_fichiers.delete(nom)
+    return True
+
+
+def abandonner(noms):
+    """Supprime les blobs écrits par une opération annulée, sauf s'ils servent ailleurs."""
+    from .models import Contenu, Fichier, Televersement
+
+    for nom in set(noms):
+        with transaction.atomic():
+            contenu = Contenu.objects.select_for_update().filter(nom=nom).first()
+            if contenu is not None and contenu.references > 0:
+                continue
+            if Fichier.objects.filter(fichier=nom).exists() or Televersement.objects.filter(fichier=nom).exists():
+                continue
+            if contenu is not None:
+                contenu.delete()
+            stockage_fichiers.delete(nom)
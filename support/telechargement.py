@@ -0,0 +1,133 @@
+import json
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.renderers import BaseRenderer
+
+
+# === Téléchargement des pièces jointes ===
+#
+# - ETag / Last-Modified : un client qui revalide reçoit un 304 sans corps ;
+# - Range (une seule plage) : réponse 206 partielle ;
+# - sinon FileResponse, que le serveur WSGI transmet via wsgi.file_wrapper
+#   (sendfile), sans passer le contenu par la mémoire Python ;
+# - si FICHIERS_X_ACCEL_REDIRECT est défini, le transfert est délégué au
+#   proxy frontal (nginx) qui gère lui-même les plages.
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class FichierRenderer(BaseRenderer):
+    """Accepte n'importe quel Accept : le corps est produit par FileResponse."""
+    media_type = "*/*"
+    format = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        return json.dumps(data).encode()
+
+
+class _Tranche:
+    """Lecture bornée à [debut, debut + longueur) d'un fichier ouvert."""
+
+    def __init__(self, fichier, debut, longueur):
+        self.fichier = fichier
+        self.restant = longueur
+        fichier.seek(debut)
+
+    def read(self, taille=-1):
+        if self.restant <= 0:
+            return b""
+        if taille < 0 or taille > self.restant:
+            taille = self.restant
+        bloc = self.fichier.read(taille)
+        self.restant -= len(bloc)
+        return bloc
+
+    def close(self):
+        self.fichier.close()
+
+
+def etag_fichier(champ, taille, modifie):
+    return f'"{champ.instance.pk:x}-{taille:x}-{int(modifie.timestamp()):x}"'
+
+
+def plage_demandee(entete, taille):
+    """Retourne (debut, fin) inclus, None pour tout le fichier, ou False si insatisfiable."""
+    correspondance = RANGE.match(entete.replace(" ", "")) if entete else None
+    if not correspondance:
+        return None
+    debut, fin = correspondance.groups()
+    if not debut and not fin:
+        return None
+    if not debut:
+        # bytes=-N : les N derniers octets
+        longueur = int(fin)
+        if longueur == 0:
+            return False
+        return max(0, taille - longueur), taille - 1
+    debut = int(debut)
+    fin = min(int(fin), taille - 1) if fin else taille - 1
+    if debut >= taille or fin < debut:
+        return False
+    return debut, fin
+
+
+def reponse_fichier(request, champ, nom=None, as_attachment=True):
+    stockage = champ.storage
+    try:
+        taille = champ.size
+        modifie = stockage.get_modified_time(champ.name)
+    except (OSError, NotImplementedError):
+        raise Http404("Fichier introuvable.")
+    etag = etag_fichier(champ, taille, modifie)
+    derniere_modif = int(modifie.timestamp())
+
+    reponse = get_conditional_response(request, etag=etag, last_modified=derniere_modif)
+    if reponse is not None:
+        reponse["ETag"] = etag
+        return reponse
+
+    nom = nom or os.path.basename(champ.name)
+    prefixe = settings.FICHIERS_X_ACCEL_REDIRECT
+    if prefixe:
+        reponse = HttpResponse()
+        reponse["X-Accel-Redirect"] = quote(prefixe.rstrip("/") + "/" + champ.name)
+        reponse["Content-Type"] = mimetypes.guess_type(nom)[0] or "application/octet-stream"
+        reponse["Content-Disposition"] = f"{'attachment' if as_attachment else 'inline'}; filename*=UTF-8''{quote(nom)}"
+    else:
+        plage = plage_demandee(request.headers.get("Range"), taille)
+        if_range = request.headers.get("If-Range")
+        if plage and if_range and if_range != etag and parse_http_date_safe(if_range) != derniere_modif:
+            # La version du client est périmée : on renvoie le fichier entier
+            plage = None
+
+        if plage is False:
+            reponse = HttpResponse(status=416)
+            reponse["Content-Range"] = f"bytes */{taille}"
+            return reponse
+
+        fichier = stockage.open(champ.name, "rb")
+        if plage:
+            debut, fin = plage
+            reponse = FileResponse(
+                _Tranche(fichier, debut, fin - debut + 1),
+                status=206, as_attachment=as_attachment, filename=nom,
+            )
+            reponse["Content-Length"] = str(fin - debut + 1)
+            reponse["Content-Range"] = f"bytes {debut}-{fin}/{taille}"
+        else:
+            reponse = FileResponse(fichier, as_attachment=as_attachment, filename=nom)
+
+    reponse["Accept-Ranges"] = "bytes"
+    reponse["ETag"] = etag
+    reponse["Last-Modified"] = http_date(derniere_modif)
+    reponse["Cache-Control"] = "private, no-cache"
+    return reponse
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Televersement
+from .stockage import supprimer_si_orphelin, verrouiller_contenu
+
+
+# === Téléversement par morceaux ===
+#
+# Chaque morceau (PUT avec Content-Range) est lu depuis le flux de la requête
+# par blocs de TAILLE_BLOC octets et ajouté au fichier partiel sur disque :
+# la mémoire utilisée ne dépend pas de la taille du fichier. Un morceau dont
+# le début ne correspond pas aux octets déjà reçus est refusé avec l'offset
+# courant, ce qui permet au client de reprendre après une coupure.
+#
+# Le corps du morceau est d'abord lu dans un fichier temporaire, hors de toute
+# transaction : un client lent ne garde ni transaction ni verrou ouverts. La
+# session n'est verrouillée que pour ajouter ce fichier au fichier partiel et
+# avancer l'offset.
+#
+# Les sessions sans activité depuis TELEVERSEMENT_EXPIRATION secondes (en
+# cours, ou terminées mais jamais rattachées) et les fichiers partiels
+# abandonnés sont supprimés par la commande nettoyer_televersements.
+
+TAILLE_BLOC = 64 * 1024
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class ErreurTeleversement(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def chemin_partiel(televersement):
+    return os.path.join(settings.TELEVERSEMENT_DIR, f"{televersement.pk}.part")
+
+
+def lire_content_range(entete, taille):
+    correspondance = CONTENT_RANGE.match(entete or "")
+    if not correspondance:
+        raise ErreurTeleversement("En-tête Content-Range invalide (attendu : bytes debut-fin/total).")
+    debut, fin, total = map(int, correspondance.groups())
+    if total != taille or fin < debut or fin >= total:
+        raise ErreurTeleversement("Content-Range incohérent avec la taille annoncée.")
+    return debut, fin
+
+
+def _verifier_offset(televersement, debut):
+    if televersement.statut != "en_cours":
+        raise ErreurTeleversement("Téléversement déjà terminé.", status=409)
+    if debut != televersement.recu:
+        raise ErreurTeleversement(f"Offset attendu : {televersement.recu}.", status=409)
+
+
+def ecrire_morceau(televersement, flux, content_range, sha256_attendu=None):
+    # Refus immédiat, avant de lire le corps (session lue sans verrou par l'appelant)
+    pk = televersement.pk
+    if televersement.statut != "en_cours":
+        raise ErreurTeleversement("Téléversement déjà terminé.", status=409)
+    debut, fin = lire_content_range(content_range, televersement.taille)
+    if flux is None:
+        raise ErreurTeleversement("Morceau vide.")
+    _verifier_offset(televersement, debut)
+
+    os.makedirs(settings.TELEVERSEMENT_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.TELEVERSEMENT_DIR, prefix=f"{pk}-", suffix=".morceau") as morceau:
+        empreinte = hashlib.sha256()
+        restant = fin - debut + 1
+        while restant:
+            bloc = flux.read(min(TAILLE_BLOC, restant))
+            if not bloc:
+                break
+            morceau.write(bloc)
+            empreinte.update(bloc)
+            restant -= len(bloc)
+        if restant:
+            raise ErreurTeleversement("Morceau incomplet.")
+        if sha256_attendu and empreinte.hexdigest() != sha256_attendu.lower():
+            raise ErreurTeleversement("Somme de contrôle du morceau invalide.")
+        morceau.flush()
+        morceau.seek(0)
+
+        with transaction.atomic():
+            # Verrou le temps de la copie locale : deux morceaux ne sont jamais ajoutés en même temps
+            televersement = Televersement.objects.select_for_update().get(pk=pk)
+            _verifier_offset(televersement, debut)
+            with open(chemin_partiel(televersement), "ab") as partiel:
+                # Un morceau interrompu a pu laisser des octets non comptabilisés
+                partiel.truncate(televersement.recu)
+                partiel.seek(televersement.recu)
+                shutil.copyfileobj(morceau, partiel, TAILLE_BLOC)
+            televersement.recu = fin + 1
+            televersement.save(update_fields=["recu", "date_modification"])
+    return televersement
+
+
+class _FichierPartiel(File):
+    # StockageDedupliquant déplace (rename) les fichiers qui exposent
+    # temporary_file_path() au lieu de les recopier, sans les hacher à nouveau
+    # quand sha256 est fourni.
+    def __init__(self, file, name, sha256):
+        super().__init__(file, name=name)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def terminer(televersement, sha256_attendu=None):
+    # Vérification, hachage et stockage hors verrou : une fois tous les octets
+    # reçus, aucun morceau n'est plus accepté et le fichier partiel ne change plus
+    pk = televersement.pk
+    if televersement.statut != "en_cours":
+        raise ErreurTeleversement("Téléversement déjà terminé.", status=409)
+    if televersement.recu != televersement.taille:
+        raise ErreurTeleversement(
+            f"Téléversement incomplet : {televersement.recu}/{televersement.taille} octets.",
+            status=409,
+        )
+
+    chemin = chemin_partiel(televersement)
+    champ = televersement.fichier.field
+    try:
+        empreinte = hashlib.sha256()
+        with open(chemin, "rb") as partiel:
+            for bloc in iter(lambda: partiel.read(TAILLE_BLOC), b""):
+                empreinte.update(bloc)
+            sha256 = empreinte.hexdigest()
+            if sha256_attendu and sha256 != sha256_attendu.lower():
+                raise ErreurTeleversement("Somme de contrôle du fichier invalide.")
+            nom = champ.storage.save(
+                champ.generate_filename(televersement, televersement.nom),
+                _FichierPartiel(partiel, name=televersement.nom, sha256=sha256),
+            )
+    except FileNotFoundError:
+        # Fichier partiel déjà déplacé par un appel concurrent
+        raise ErreurTeleversement("Téléversement déjà terminé.", status=409)
+
+    with transaction.atomic():
+        # Verrou le temps de changer le statut ; le blob reste verrouillé jusqu'au commit
+        televersement = Televersement.objects.select_for_update().get(pk=pk)
+        if televersement.statut != "en_cours":
+            raise ErreurTeleversement("Téléversement déjà terminé.", status=409)
+        verrouiller_contenu(nom)
+        if not champ.storage.exists(nom):
+            # Blob identique supprimé comme orphelin entre le stockage et le verrou
+            raise ErreurTeleversement("Fichier supprimé pendant l'enregistrement, réessayer.", status=409)
+        televersement.fichier.name = nom
+        televersement.sha256 = sha256
+        televersement.statut = "termine"
+        televersement.save(update_fields=["fichier", "sha256", "statut", "date_modification"])
+    # Contenu déjà stocké : le fichier partiel n'a pas été déplacé
+    if os.path.exists(chemin):
+        os.remove(chemin)
+    return televersement
+
+
+def nettoyer(maintenant=None):
+    """Supprime les sessions expirées et les fichiers partiels abandonnés ; retourne (sessions, fichiers)."""
+    maintenant = maintenant or timezone.now()
+    limite = maintenant - timedelta(seconds=settings.TELEVERSEMENT_EXPIRATION)
+    sessions = 0
+    for televersement in Televersement.objects.filter(
+        statut__in=("en_cours", "termine"), date_modification__lt=limite
+    ).iterator():
+        with transaction.atomic():
+            # Verrou : un morceau ou un rattachement en cours a pu raviver la session
+            verrouille = Televersement.objects.select_for_update().filter(
+                pk=televersement.pk, statut__in=("en_cours", "termine"), date_modification__lt=limite
+            ).first()
+            if verrouille is None:
+                continue
+            verrouille.delete()
+            if verrouille.fichier.name:
+                # Blob d'une session terminée, supprimé s'il ne sert à aucun ticket
+                transaction.on_commit(lambda nom=verrouille.fichier.name: supprimer_si_orphelin(nom))
+        sessions += 1
+
+    # Fichiers partiels et morceaux sans session en cours, ou plus vieux que l'expiration
+    fichiers = 0
+    dossier = settings.TELEVERSEMENT_DIR
+    if not os.path.isdir(dossier):
+        return sessions, fichiers
+    en_cours = {str(pk) for pk in Televersement.objects.filter(statut="en_cours").values_list("pk", flat=True)}
+    seuil = time.time() - settings.TELEVERSEMENT_EXPIRATION
+    for nom in os.listdir(dossier):
+        chemin = os.path.join(dossier, nom)
+        if not nom.endswith((".part", ".morceau")) or not os.path.isfile(chemin):
+            continue
+        session = nom.split(".", 1)[0] if nom.endswith(".part") else nom.rsplit("-", 1)[0]
+        if session in en_cours and os.path.getmtime(chemin) >= seuil:
+            continue
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            continue
+        fichiers += 1
+    return sessions, fichiers
@@ -1,3 +1,1770 @@
-from django.test import TestCase
+import asyncio
+import base64
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_save
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.serializers import Serializer
+from rest_framework.test import APITestCase, APITransactionTestCase
+from rest_framework_simplejwt.tokens import AccessToken
+from techexpert_api.base_donnees import bases_depuis_environnement
+
+from .models import (
+    Role, Utilisateur, Client, PersonnelClient,
+    TypeLogiciel, TypeProbleme, Logiciel,
+    Ticket, Rapport, Fichier, MailSortant, Televersement, Contenu, StatistiqueTicket, ProfilTechnicien
+)
+from . import banc_essai
+from .checks import verifier_cache_coherence, verifier_cache_defaut, verifier_cache_references
+from . import metriques
+from .evenements import BusPostgres, bus
+from .notifications import CLE_VERSION, destinataires_par_role
+from .outbox import envoyer_lot, mails_en_attente, reserver_lot, statistiques
+from .profilage import Mesure, empreinte, serializers_instrumentes
+from .prefetch import optimiser_queryset
+from .renderers import OrjsonRenderer
+from .routeurs import COOKIE_ECRITURE, CoherenceLecturesMiddleware, RouteurLectures, alias_lecture, lectures_sur
+from . import recherche
+from .statistiques import reconstruire
+from .televersement import chemin_partiel, ecrire_morceau
+from .stockage import est_adresse, stockage_fichiers, supprimer_si_orphelin
+from .serializers import TicketReadSerializer
+from .views import JetonFlux, _flux
+
+
+# Caches des tests : propres au processus, le cache du projet (sur disque)
+# n'est jamais touché
+CACHES_LOCMEM = {
+    alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": alias}
+    for alias in ("default", "references")
+}
+
+
+def activer_cache_partage(test):
+    """Caches sur disque (partagés entre processus) dans un dossier jetable, jusqu'à la fin du test."""
+    dossier = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, dossier)
+    reglages = test.settings(CACHES={
+        alias: {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": os.path.join(dossier, alias)}
+        for alias in ("default", "references")
+    })
+    reglages.enable()
+    test.addCleanup(reglages.disable)
+
+
+@override_settings(BASE_LECTURE=None, CACHES=CACHES_LOCMEM)
+class TestsAPI(APITestCase):
+    """Lectures sur la base principale, même si une réplique est configurée (cf. RepliqueTests)."""
+
+
+class DonneesMixin:
+    """Jeu de données minimal partagé par les tests de l'API support."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.role_personnel = Role.objects.create(nom="personnel")
+        cls.role_technicien = Role.objects.create(nom="technicien")
+
+        cls.type_logiciel = TypeLogiciel.objects.create(nom="Gestion")
+        cls.types_problemes = [
+            TypeProbleme.objects.create(nom="Installation"),
+            TypeProbleme.objects.create(nom="Licence"),
+        ]
+        cls.logiciel = Logiciel.objects.create(nom="Sage", type_logiciel=cls.type_logiciel)
+        cls.logiciel.type_problemes.set(cls.types_problemes)
+
+        cls.technicien = cls.creer_utilisateur("tech@example.com", cls.role_technicien)
+        cls.liens = []
+        for index in range(3):
+            personnel = cls.creer_utilisateur(f"personnel{index}@example.com", cls.role_personnel)
+            client = Client.objects.create(nom=f"Client {index}")
+            cls.liens.append(PersonnelClient.objects.create(personnel=personnel, client=client))
+
+    def setUp(self):
+        # Le cache survit au rollback de chaque test
+        cache.clear()
+        caches["references"].clear()
+
+    @classmethod
+    def creer_utilisateur(cls, email, *roles):
+        user = Utilisateur.objects.create_user(email=email, nom="Test", prenom="User", password="secret")
+        user.roles.set(roles)
+        return user
+
+    def creer_tickets(self, nombre, lien=None):
+        tickets = []
+        for index in range(nombre):
+            ticket = Ticket.objects.create(
+                lien=lien or self.liens[index % len(self.liens)],
+                technicien=self.technicien,
+                logiciel=self.logiciel,
+                description=f"Ticket {index}",
+            )
+            Fichier.objects.create(ticket=ticket, fichier=f"tickets/fichiers/log{index}.txt")
+            if index % 2:
+                Rapport.objects.create(ticket=ticket, contenu="Résolu")
+            tickets.append(ticket)
+        return tickets
+
+    def compter_requetes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+
+class EagerLoadingTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def test_plan_ticket_read_serializer(self):
+        queryset = optimiser_queryset(Ticket.objects.all(), TicketReadSerializer)
+        self.assertIn("lien", queryset.query.select_related)
+        self.assertIn("rapport", queryset.query.select_related)
+        lookups = [getattr(l, "prefetch_to", l) for l in queryset._prefetch_related_lookups]
+        self.assertIn("fichiers", lookups)
+        self.assertIn("lien__personnel__roles", lookups)
+        self.assertIn("logiciel__type_problemes", lookups)
+
+    def test_nombre_de_requetes_fixe_liste_tickets(self):
+        self.creer_tickets(3)
+        petite_page = self.compter_requetes(reverse("ticket-list-create"))
+        self.creer_tickets(9)
+        grande_page = self.compter_requetes(reverse("ticket-list-create"))
+        self.assertEqual(petite_page, grande_page)
+
+    def test_nombre_de_requetes_fixe_mes_tickets(self):
+        lien = self.liens[0]
+        self.client.force_authenticate(lien.personnel)
+        self.creer_tickets(2, lien=lien)
+        petite_page = self.compter_requetes(reverse("mes-tickets"))
+        self.creer_tickets(6, lien=lien)
+        grande_page = self.compter_requetes(reverse("mes-tickets"))
+        self.assertEqual(petite_page, grande_page)
+
+    def test_detail_ticket_contenu_identique(self):
+        ticket = self.creer_tickets(2)[1]
+        response = self.client.get(reverse("ticket-detail", args=[ticket.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["rapport"]["contenu"], "Résolu")
+        self.assertEqual(len(response.data["fichiers"]), 1)
+        self.assertEqual(response.data["lien"]["personnel"]["clients"][0]["id"], ticket.lien.client_id)
+        self.assertEqual(len(response.data["logiciel"]["type_problemes"]), 2)
+
+
+class ResolutionUtilisateurTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def test_nombre_de_requetes_fixe_liste_utilisateurs(self):
+        avant = self.compter_requetes(reverse("utilisateur-list"))
+        for index in range(5):
+            personnel = self.creer_utilisateur(f"autre{index}@example.com", self.role_personnel)
+            PersonnelClient.objects.create(personnel=personnel, client=self.liens[0].client)
+        apres = self.compter_requetes(reverse("utilisateur-list"))
+        self.assertEqual(avant, apres)
+
+    def test_clients_et_roles_depuis_le_prefetch(self):
+        personnel = (
+            Utilisateur.objects.prefetch_related("roles", "clients_rattaches__client")
+            .get(pk=self.liens[0].personnel_id)
+        )
+        with self.assertNumQueries(0):
+            self.assertTrue(personnel.has_role("personnel"))
+            self.assertFalse(personnel.has_role("technicien"))
+            clients = [lien.client.nom for lien in personnel.liens_clients()]
+        self.assertEqual(clients, ["Client 0"])
+
+    def test_utilisateur_serialise_une_fois_par_requete(self):
+        self.creer_tickets(4)
+        response = self.client.get(reverse("ticket-list-create"))
+        techniciens = [ticket["technicien"] for ticket in response.data["results"]]
+        self.assertTrue(all(t is techniciens[0] for t in techniciens))
+        self.assertEqual(techniciens[0]["email"], "tech@example.com")
+
+
+class PaginationCurseurTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def parcourir(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [element["id"] for element in response.data["results"]]
+            url = response.data["next"]
+            pages += 1
+        return ids, pages
+
+    def test_parcours_complet_des_tickets(self):
+        tickets = self.creer_tickets(7)
+        ids, pages = self.parcourir(reverse("ticket-list-create") + "?page_size=3")
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, sorted((t.pk for t in tickets), reverse=True))
+
+    def test_page_precedente(self):
+        self.creer_tickets(5)
+        url = reverse("ticket-list-create") + "?page_size=2"
+        premiere = self.client.get(url).data
+        seconde = self.client.get(premiere["next"]).data
+        retour = self.client.get(seconde["previous"]).data
+        self.assertEqual(retour["results"], premiere["results"])
+        self.assertIsNone(retour["previous"])
+
+    def test_pas_d_offset(self):
+        self.creer_tickets(4)
+        premiere = self.client.get(reverse("fichier-list") + "?page_size=2").data
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(premiere["next"])
+        self.assertFalse(any("OFFSET" in q["sql"].upper() for q in ctx.captured_queries))
+
+    def test_taille_de_page_bornee(self):
+        with self.settings(PAGINATION_MAX_PAGE_SIZE=2):
+            self.creer_tickets(4)
+            response = self.client.get(reverse("ticket-list-create") + "?page_size=100")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_curseur_invalide(self):
+        response = self.client.get(reverse("utilisateur-list") + "?cursor=pas-un-curseur")
+        self.assertEqual(response.status_code, 404)
+
+    def test_valeurs_de_curseur_invalides(self):
+        for valeurs in (["abc", 1], [None, None], [{"x": 1}, 1], ["2024-01-01", "x"]):
+            curseur = base64.urlsafe_b64encode(json.dumps({"v": valeurs}).encode()).decode()
+            response = self.client.get(reverse("ticket-list-create"), {"cursor": curseur})
+            self.assertEqual(response.status_code, 404, valeurs)
+
+
+class BackendEnPanne(EmailBackend):
+    def send_messages(self, messages):
+        raise SMTPException("serveur indisponible")
+
+
+class FileMailTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.creer_utilisateur("admin@example.com", Role.objects.create(nom="administrateur"))
+        self.client.force_authenticate(self.liens[0].personnel)
+
+    def creer_ticket_api(self):
+        response = self.client.post(reverse("ticket-list-create"), {
+            "lien": self.liens[0].pk,
+            "logiciel": self.logiciel.pk,
+            "description": "Impossible d'ouvrir Sage",
+        })
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def test_creation_ticket_met_les_mails_en_file(self):
+        self.creer_ticket_api()
+        self.assertEqual(len(mail.outbox), 0)
+        destinataires = sorted(m.destinataires[0] for m in MailSortant.objects.all())
+        self.assertEqual(destinataires, ["admin@example.com", "personnel0@example.com"])
+
+    def test_commande_vide_la_file(self):
+        self.creer_ticket_api()
+        call_command("envoyer_mails", stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(MailSortant.objects.exclude(statut="envoye").exists())
+
+    def test_nouvelle_tentative_puis_echec_definitif(self):
+        MailSortant.objects.create(sujet="Test", message="Corps", destinataires=["a@example.com"])
+        with self.settings(MAIL_OUTBOX_MAX_TENTATIVES=2), self.assertLogs("support.outbox", "WARNING"):
+            self.assertEqual(envoyer_lot(connection=BackendEnPanne()), (0, 1))
+            en_file = MailSortant.objects.get()
+            self.assertEqual((en_file.statut, en_file.tentatives), ("en_attente", 1))
+            self.assertGreater(en_file.prochaine_tentative, en_file.date_creation)
+
+            # Pas encore l'heure de la nouvelle tentative
+            self.assertEqual(envoyer_lot(connection=BackendEnPanne()), (0, 0))
+            self.assertEqual(MailSortant.objects.get().tentatives, 1)
+
+            MailSortant.objects.update(prochaine_tentative=en_file.date_creation)
+            envoyer_lot(connection=BackendEnPanne())
+        self.assertEqual(MailSortant.objects.get().statut, "echec")
+
+    def test_envoi_hors_transaction_sous_bail(self):
+        premier = MailSortant.objects.create(sujet="A", message="Corps", destinataires=["a@example.com"])
+        MailSortant.objects.create(sujet="B", message="Corps", destinataires=["b@example.com"])
+        profondeur = len(connection.atomic_blocks)
+        vus = []
+
+        class BackendEspion(EmailBackend):
+            def send_messages(self, messages):
+                # Transactions ouvertes et mails encore visibles des autres workers pendant l'envoi
+                vus.append((len(connection.atomic_blocks), list(mails_en_attente().values_list("sujet", flat=True))))
+                return super().send_messages(messages)
+
+        self.assertEqual(envoyer_lot(taille=1, connection=BackendEspion()), (1, 0))
+        self.assertEqual(vus, [(profondeur, ["B"])])
+        self.assertEqual(MailSortant.objects.get(pk=premier.pk).statut, "envoye")
+
+        # Bail expiré (worker arrêté en plein lot) : le mail redevient disponible
+        with self.settings(MAIL_OUTBOX_BAIL=0):
+            reserve = reserver_lot(1, timezone.now())
+        self.assertEqual([mail.sujet for mail in reserve], ["B"])
+        self.assertEqual(reserver_lot(1, timezone.now()), reserve)
+        self.assertEqual(reserver_lot(1, timezone.now()), [])
+
+    def test_commande_sans_delai_de_nouvelle_tentative(self):
+        # Échecs replanifiés immédiatement : un lot par tentative, puis arrêt
+        MailSortant.objects.create(sujet="Test", message="Corps", destinataires=["a@example.com"])
+        with self.settings(MAIL_OUTBOX_BACKOFF=0, MAIL_OUTBOX_MAX_TENTATIVES=3,
+                           EMAIL_BACKEND="support.tests.BackendEnPanne"), self.assertLogs("support.outbox", "WARNING"):
+            call_command("envoyer_mails", stdout=StringIO())
+        self.assertEqual(statistiques.instantane()["lots"], 3)
+        self.assertEqual(MailSortant.objects.get().statut, "echec")
+
+
+class DestinatairesNotificationTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.role_admin = Role.objects.create(nom="administrateur")
+        self.admin = self.creer_utilisateur("admin@example.com", self.role_admin)
+
+    def test_liste_mise_en_cache(self):
+        self.assertEqual(destinataires_par_role("administrateur", "superviseur"), ["admin@example.com"])
+        with self.assertNumQueries(0):
+            destinataires_par_role("superviseur", "administrateur")
+
+    def test_invalidation_sur_changement_de_roles(self):
+        destinataires_par_role("administrateur")
+        self.technicien.roles.add(self.role_admin)
+        self.assertEqual(destinataires_par_role("administrateur"), ["admin@example.com", "tech@example.com"])
+        self.admin.roles.remove(self.role_admin)
+        self.assertEqual(destinataires_par_role("administrateur"), ["tech@example.com"])
+
+    def test_invalidation_sur_changement_d_email(self):
+        destinataires_par_role("administrateur")
+        self.admin.email = "chef@example.com"
+        self.admin.save()
+        self.assertEqual(destinataires_par_role("administrateur"), ["chef@example.com"])
+
+    def test_invalidation_par_version_partagee(self):
+        destinataires_par_role("administrateur")
+        # La version est dans le cache partagé : les autres workers la lisent
+        version = cache.get(CLE_VERSION)
+        self.technicien.roles.add(self.role_admin)
+        self.assertNotEqual(cache.get(CLE_VERSION), version)
+        with self.settings(DEBUG=False):
+            self.assertEqual([e.id for e in verifier_cache_defaut(None)], ["support.E002"])
+        activer_cache_partage(self)
+        with self.settings(DEBUG=False):
+            self.assertEqual(verifier_cache_defaut(None), [])
+
+    def test_lot_envoye_sur_une_connexion_avec_compteurs(self):
+        for index in range(3):
+            MailSortant.objects.create(sujet=f"Mail {index}", message="Corps", destinataires=["a@example.com"])
+        statistiques.reinitialiser()
+        sortie = StringIO()
+        call_command("envoyer_mails", stdout=sortie)
+        self.assertEqual(len(mail.outbox), 3)
+        stats = statistiques.instantane()
+        self.assertEqual((stats["lots"], stats["messages_envoyes"]), (1, 3))
+        self.assertEqual(stats["dernier_lot"]["messages"], 3)
+        self.assertIn("3 mail(s) envoyé(s) en 1 lot(s)", sortie.getvalue())
+
+
+class TeleversementTests(DonneesMixin, TestsAPI):
+    contenu = b"0123456789" * 10
+
+    def setUp(self):
+        super().setUp()
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        reglages = self.settings(
+            MEDIA_ROOT=os.path.join(self.dossier, "media"),
+            TELEVERSEMENT_DIR=os.path.join(self.dossier, "parts"),
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.client.force_authenticate(self.liens[0].personnel)
+
+    def creer_session(self):
+        response = self.client.post(reverse("televersement-create"), {"nom": "log.txt", "taille": len(self.contenu)})
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def envoyer(self, pk, debut, fin, **extra):
+        return self.client.put(
+            reverse("televersement-detail", args=[pk]),
+            data=self.contenu[debut:fin + 1],
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {debut}-{fin}/{len(self.contenu)}",
+            **extra,
+        )
+
+    def test_televersement_par_morceaux_puis_rattachement(self):
+        pk = self.creer_session()
+        for debut in range(0, 100, 40):
+            morceau = self.contenu[debut:debut + 40]
+            response = self.envoyer(pk, debut, min(debut + 39, 99),
+                                    HTTP_X_CHUNK_SHA256=hashlib.sha256(morceau).hexdigest())
+            self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["recu"], 100)
+
+        response = self.client.post(reverse("televersement-terminer", args=[pk]),
+                                    {"sha256": hashlib.sha256(self.contenu).hexdigest()})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["statut"], "termine")
+
+        response = self.client.post(reverse("ticket-list-create"), {
+            "lien": self.liens[0].pk, "logiciel": self.logiciel.pk,
+            "description": "Logs joints", "televersements": [pk],
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        fichier = Fichier.objects.get(ticket_id=response.data["id"])
+        with fichier.fichier.open("rb") as f:
+            self.assertEqual(f.read(), self.contenu)
+        self.assertEqual(Televersement.objects.get(pk=pk).statut, "attache")
+
+    def test_reprise_apres_morceau_hors_sequence(self):
+        pk = self.creer_session()
+        self.envoyer(pk, 0, 49)
+        response = self.envoyer(pk, 60, 99)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["recu"], 50)
+        self.assertEqual(self.client.get(reverse("televersement-detail", args=[pk])).data["recu"], 50)
+
+    def test_somme_de_controle_invalide(self):
+        pk = self.creer_session()
+        response = self.envoyer(pk, 0, 49, HTTP_X_CHUNK_SHA256="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["recu"], 0)
+
+    def test_terminer_incomplet_refuse(self):
+        pk = self.creer_session()
+        self.envoyer(pk, 0, 49)
+        response = self.client.post(reverse("televersement-terminer", args=[pk]))
+        self.assertEqual(response.status_code, 409)
+
+    def test_session_d_un_autre_utilisateur(self):
+        pk = self.creer_session()
+        self.client.force_authenticate(self.technicien)
+        self.assertEqual(self.envoyer(pk, 0, 49).status_code, 404)
+
+    def test_corps_lu_hors_transaction(self):
+        pk = self.creer_session()
+        profondeur = len(connection.atomic_blocks)
+        test = self
+
+        class Flux:
+            def read(self, n):
+                # Aucune transaction (ni verrou) ouverte pendant la lecture réseau
+                test.assertEqual(len(connection.atomic_blocks), profondeur)
+                return test.contenu[:n]
+
+        televersement = ecrire_morceau(Televersement.objects.get(pk=pk), Flux(), f"bytes 0-49/{len(self.contenu)}")
+        self.assertEqual(televersement.recu, 50)
+        with open(chemin_partiel(televersement), "rb") as partiel:
+            self.assertEqual(partiel.read(), self.contenu[:50])
+        self.assertEqual(os.listdir(os.path.join(self.dossier, "parts")), [f"{pk}.part"])
+
+    def test_terminer_stocke_hors_transaction_sans_second_hachage(self):
+        pk = self.creer_session()
+        self.envoyer(pk, 0, 99)
+        profondeur = len(connection.atomic_blocks)
+        appels = []
+
+        def espion(name, content):
+            appels.append((len(connection.atomic_blocks), content.sha256))
+            return type(stockage_fichiers)._save(stockage_fichiers, name, content)
+
+        stockage_fichiers._save = espion
+        self.addCleanup(delattr, stockage_fichiers, "_save")
+        response = self.client.post(reverse("televersement-terminer", args=[pk]))
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(appels, [(profondeur, hashlib.sha256(self.contenu).hexdigest())])
+        self.assertEqual(response.data["sha256"], appels[0][1])
+        self.assertFalse(os.path.exists(os.path.join(self.dossier, "parts", f"{pk}.part")))
+        with Televersement.objects.get(pk=pk).fichier.open("rb") as f:
+            self.assertEqual(f.read(), self.contenu)
+
+    def test_nettoyage_des_sessions_expirees(self):
+        abandonnee, active = self.creer_session(), self.creer_session()
+        self.envoyer(abandonnee, 0, 49)
+        self.envoyer(active, 0, 49)
+        Televersement.objects.filter(pk=abandonnee).update(
+            date_modification=timezone.now() - timedelta(seconds=settings.TELEVERSEMENT_EXPIRATION + 1)
+        )
+        orphelin = os.path.join(self.dossier, "parts", "inconnu.part")
+        open(orphelin, "wb").close()
+
+        sortie = StringIO()
+        call_command("nettoyer_televersements", stdout=sortie)
+        self.assertIn("1 session(s)", sortie.getvalue())
+        self.assertFalse(Televersement.objects.filter(pk=abandonnee).exists())
+        self.assertEqual(os.listdir(os.path.join(self.dossier, "parts")), [f"{active}.part"])
+        self.assertEqual(self.envoyer(active, 50, 99).status_code, 200)
+
+
+class TelechargementTests(DonneesMixin, TestsAPI):
+    contenu = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        reglages = self.settings(MEDIA_ROOT=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        ticket = self.creer_tickets(1)[0]
+        self.fichier = ticket.fichiers.get()
+        self.fichier.fichier.save("dump.bin", ContentFile(self.contenu))
+        self.url = reverse("fichier-telecharger", args=[self.fichier.pk])
+        self.client.force_authenticate(self.technicien)
+
+    def lire(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_telechargement_complet(self):
+        response = self.client.get(self.url, HTTP_ACCEPT="application/octet-stream")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.lire(response), self.contenu)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("attachment", response["Content-Disposition"])
+
+    def test_plage(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.contenu)}")
+        self.assertEqual(self.lire(response), self.contenu[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(self.lire(response), self.contenu[-5:])
+
+    def test_plage_insatisfiable(self):
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.contenu)}-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_revalidation_304(self):
+        premiere = self.client.get(self.url)
+        self.lire(premiere)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=premiere["ETag"])
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=premiere["Last-Modified"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_if_range_perime(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"autre"')
+        self.assertEqual(response.status_code, 200)
+        self.lire(response)
+
+    def test_delegation_x_accel_redirect(self):
+        with self.settings(FICHIERS_X_ACCEL_REDIRECT="/protected/"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/" + self.fichier.fichier.name)
+        self.assertEqual(response.content, b"")
+
+    def test_authentification_requise(self):
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class StockageDedupliquantTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        reglages = self.settings(MEDIA_ROOT=self.dossier)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.client.force_authenticate(self.liens[0].personnel)
+
+    def creer_ticket_avec(self, *fichiers):
+        response = self.client.post(reverse("ticket-list-create"), {
+            "lien": self.liens[0].pk, "logiciel": self.logiciel.pk,
+            "description": "Capture jointe", "fichiers": list(fichiers),
+        }, format="multipart")
+        self.assertEqual(response.status_code, 201, response.data)
+        return Ticket.objects.get(pk=response.data["id"])
+
+    def blobs_sur_disque(self):
+        return sorted(
+            nom for _, _, noms in os.walk(self.dossier) for nom in noms if not nom.endswith(".part")
+        )
+
+    def test_meme_contenu_stocke_une_fois(self):
+        premier = self.creer_ticket_avec(SimpleUploadedFile("capture.png", b"PNG-DATA"))
+        second = self.creer_ticket_avec(SimpleUploadedFile("ecran.png", b"PNG-DATA"))
+
+        noms = {f.fichier.name for f in Fichier.objects.all()}
+        self.assertEqual(len(noms), 1)
+        nom = noms.pop()
+        self.assertTrue(est_adresse(nom))
+        self.assertEqual(len(self.blobs_sur_disque()), 1)
+        self.assertEqual(Contenu.objects.get(nom=nom).references, 2)
+        self.assertEqual(second.fichiers.get().nom, "ecran.png")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            premier.delete()
+        self.assertEqual(Contenu.objects.get(nom=nom).references, 1)
+        self.assertTrue(stockage_fichiers.exists(nom))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(Contenu.objects.filter(nom=nom).exists())
+        self.assertFalse(stockage_fichiers.exists(nom))
+
+    def test_blob_existant_verrouille_jusqu_au_commit(self):
+        nom = stockage_fichiers.save("tickets/fichiers/a.txt", ContentFile(b"partage"))
+        Contenu.objects.create(nom=nom, references=0)
+        with transaction.atomic(), CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(stockage_fichiers.save("tickets/fichiers/b.txt", ContentFile(b"partage")), nom)
+        verrous = [q["sql"] for q in ctx.captured_queries if "support_contenu" in q["sql"]]
+        self.assertEqual(len(verrous), 1)
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", verrous[0])
+
+        # Orphelin supprimé entre-temps : le blob est réécrit
+        self.assertTrue(supprimer_si_orphelin(nom))
+        self.assertEqual(stockage_fichiers.save("tickets/fichiers/c.txt", ContentFile(b"partage")), nom)
+        self.assertTrue(stockage_fichiers.exists(nom))
+
+    def test_blobs_supprimes_si_le_rattachement_echoue(self):
+        partage = self.creer_ticket_avec(SimpleUploadedFile("capture.png", b"PNG-DATA")).fichiers.get().fichier.name
+        televersement = Televersement.objects.create(
+            utilisateur=self.liens[0].personnel, nom="log.txt", taille=3, recu=3, statut="termine",
+            fichier=stockage_fichiers.save("tickets/fichiers/log.txt", ContentFile(b"log")),
+        )
+        avant = self.blobs_sur_disque()
+
+        def rattache_entre_temps(instance, created, **kwargs):
+            if created:
+                Televersement.objects.filter(pk=televersement.pk).update(statut="attache")
+
+        post_save.connect(rattache_entre_temps, sender=Ticket)
+        self.addCleanup(post_save.disconnect, rattache_entre_temps, sender=Ticket)
+        response = self.client.post(reverse("ticket-list-create"), {
+            "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Échec",
+            "fichiers": [SimpleUploadedFile("ecran.png", b"PNG-DATA"), SimpleUploadedFile("neuf.txt", b"NEUF")],
+            "televersements": [televersement.pk],
+        }, format="multipart")
+        self.assertEqual(response.status_code, 400, response.data)
+
+        # Le blob neuf est supprimé ; ceux du ticket existant et du téléversement restent
+        self.assertEqual(self.blobs_sur_disque(), avant)
+        self.assertTrue(stockage_fichiers.exists(partage))
+        self.assertEqual(Contenu.objects.get(nom=partage).references, 1)
+        self.assertEqual(Televersement.objects.get(pk=televersement.pk).statut, "termine")
+
+    def test_commande_de_deduplication(self):
+        tickets = self.creer_tickets(2)
+        for index, ticket in enumerate(tickets):
+            ancien = f"tickets/fichiers/log{index}.txt"
+            os.makedirs(os.path.join(self.dossier, "tickets", "fichiers"), exist_ok=True)
+            with open(os.path.join(self.dossier, ancien), "wb") as f:
+                f.write(b"meme journal")
+
+        call_command("dedupliquer_fichiers", stdout=StringIO())
+
+        noms = {f.fichier.name for f in Fichier.objects.all()}
+        self.assertEqual(len(noms), 1)
+        nom = noms.pop()
+        self.assertEqual(Contenu.objects.get(nom=nom).references, 2)
+        self.assertEqual(self.blobs_sur_disque(), [os.path.basename(nom)])
+        self.assertEqual(sorted(Fichier.objects.values_list("nom", flat=True)), ["log0.txt", "log1.txt"])
+
+
+class TableauDeBordTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def tableau(self):
+        response = self.client.get(reverse("tableau-de-bord"))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_compteurs_maintenus_a_l_enregistrement(self):
+        tickets = self.creer_tickets(3)
+        tickets[0].statut = "clos"
+        tickets[0].temps_traitement = timedelta(hours=3)
+        tickets[0].save()
+        tickets[1].statut = "en_cours"
+        tickets[1].technicien = None
+        tickets[1].save()
+
+        donnees = self.tableau()
+        self.assertEqual(donnees["global"]["total"], 3)
+        self.assertEqual(donnees["global"]["statuts"], {"en_attente": 1, "en_cours": 1, "clos": 1})
+        self.assertEqual(donnees["global"]["resolution"]["nombre"], 1)
+        self.assertEqual(donnees["global"]["resolution"]["moyenne_heures"], 3.0)
+        self.assertEqual(donnees["global"]["resolution"]["p50_heures"], 4)
+
+        techniciens = {t["nom"]: t["total"] for t in donnees["techniciens"]}
+        self.assertEqual(techniciens, {"User Test": 2, "Non assigné": 1})
+        clients = {c["nom"]: c["total"] for c in donnees["clients"]}
+        self.assertEqual(clients, {"Client 0": 1, "Client 1": 1, "Client 2": 1})
+
+    def test_suppression_et_reconstruction(self):
+        tickets = self.creer_tickets(2)
+        tickets[0].delete()
+        self.assertEqual(self.tableau()["global"]["total"], 1)
+
+        attendu = sorted(StatistiqueTicket.objects.values_list("dimension", "cle", "indicateur", "valeur"))
+        StatistiqueTicket.objects.update(valeur=42)
+        call_command("reconstruire_statistiques", stdout=StringIO())
+        obtenu = sorted(
+            StatistiqueTicket.objects.exclude(valeur=0).values_list("dimension", "cle", "indicateur", "valeur")
+        )
+        self.assertEqual(obtenu, [ligne for ligne in attendu if ligne[3]])
+
+    def test_etat_precedent_lu_sous_verrou(self):
+        ticket = self.creer_tickets(1)[0]
+        copie = Ticket.objects.get(pk=ticket.pk)
+        ticket.statut = "clos"
+        with CaptureQueriesContext(connection) as ctx:
+            ticket.save()
+        lectures = [q["sql"] for q in ctx.captured_queries
+                    if q["sql"].startswith("SELECT") and "support_statistiqueticket" not in q["sql"]]
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", lectures[0])
+        # Copie périmée : le delta part de l'état en base, pas de celui chargé
+        copie.statut = "en_cours"
+        copie.save()
+        self.assertEqual(self.tableau()["global"]["statuts"], {"en_attente": 0, "en_cours": 1, "clos": 0})
+
+    def test_lecture_sans_parcourir_les_tickets(self):
+        self.creer_tickets(5)
+        with CaptureQueriesContext(connection) as ctx:
+            self.tableau()
+        self.assertFalse(any("support_ticket" in q["sql"] for q in ctx.captured_queries))
+
+
+class FiltresTicketsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+        self.tickets = self.creer_tickets(6)
+        self.tickets[0].statut = "clos"
+        self.tickets[0].save()
+        self.tickets[1].technicien = None
+        self.tickets[1].save()
+        Ticket.objects.filter(pk=self.tickets[2].pk).update(date_creation=date(2024, 1, 15))
+
+    def ids(self, params):
+        response = self.client.get(reverse("ticket-list-create"), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {ticket["id"] for ticket in response.data["results"]}
+
+    def test_filtres(self):
+        self.assertEqual(self.ids({"statut": "clos"}), {self.tickets[0].pk})
+        self.assertEqual(self.ids({"client": self.liens[0].client_id}), {self.tickets[0].pk, self.tickets[3].pk})
+        self.assertEqual(self.ids({"technicien": "aucun"}), {self.tickets[1].pk})
+        self.assertEqual(self.ids({"date_fin": "2024-12-31"}), {self.tickets[2].pk})
+        self.assertEqual(
+            self.ids({"statut": "en_attente,en_cours", "date_debut": "2025-01-01", "logiciel": self.logiciel.pk}),
+            {t.pk for t in self.tickets[1:] if t is not self.tickets[2]},
+        )
+
+    def test_valeurs_invalides(self):
+        for params in ({"statut": "inconnu"}, {"client": "abc"}, {"date_debut": "2025-13-45"}):
+            self.assertEqual(self.client.get(reverse("ticket-list-create"), params).status_code, 400)
+
+    def test_tri_en_liste_blanche_avec_curseur(self):
+        url = reverse("ticket-list-create") + "?ordering=statut&page_size=2"
+        vus = []
+        while url:
+            donnees = self.client.get(url).data
+            vus += [(t["statut"], t["id"]) for t in donnees["results"]]
+            url = donnees["next"]
+        self.assertEqual([statut for statut, _ in vus], sorted(statut for statut, _ in vus))
+        self.assertEqual(len(vus), 6)
+
+        # Tri non autorisé : ordre par défaut
+        defaut = self.ids({"ordering": "description"})
+        self.assertEqual(defaut, {t.pk for t in self.tickets})
+
+    def test_requetes_independantes_du_filtre(self):
+        sans_filtre = self.compter_requetes(reverse("ticket-list-create"))
+        avec_filtre = self.compter_requetes(reverse("ticket-list-create") + "?statut=en_attente")
+        self.assertEqual(sans_filtre, avec_filtre)
+
+
+class RechercheTicketsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+        self.imprimante = Ticket.objects.create(
+            lien=self.liens[0], logiciel=self.logiciel,
+            description="L'imprimante du service paie <b>bloque</b> l'impression des bulletins",
+        )
+        self.rapport = Ticket.objects.create(
+            lien=self.liens[1], logiciel=self.logiciel, description="Écran figé au démarrage",
+        )
+        Rapport.objects.create(ticket=self.rapport, contenu="Pilote d'imprimante réinstallé")
+        self.creer_tickets(3)
+
+    def rechercher(self, **params):
+        response = self.client.get(reverse("ticket-recherche"), params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data["results"]
+
+    def test_classement_et_extrait(self):
+        resultats = self.rechercher(q="imprimante")
+        self.assertEqual([r["id"] for r in resultats], [self.imprimante.pk, self.rapport.pk])
+        self.assertGreater(resultats[0]["rang"], resultats[1]["rang"])
+        self.assertIn("<mark>imprimante</mark>", resultats[0]["extrait"])
+        # Le texte du ticket est échappé
+        self.assertIn("&lt;b&gt;", resultats[0]["extrait"])
+        self.assertEqual(resultats[0]["client"], "Client 0")
+
+    def test_filtre_client_et_index_a_jour(self):
+        self.assertEqual(
+            [r["id"] for r in self.rechercher(q="imprimante", client=self.liens[1].client_id)], [self.rapport.pk]
+        )
+        self.rapport.rapport.contenu = "Câble remplacé"
+        self.rapport.rapport.save()
+        self.imprimante.description = "Scanner hors service"
+        self.imprimante.save()
+        self.assertEqual(self.rechercher(q="imprimante"), [])
+        self.assertEqual([r["id"] for r in self.rechercher(q="scanner")], [self.imprimante.pk])
+
+        self.imprimante.delete()
+        self.assertEqual(self.rechercher(q="scanner"), [])
+
+    def test_texte_requis(self):
+        self.assertEqual(self.client.get(reverse("ticket-recherche")).status_code, 400)
+        # Syntaxe FTS5 neutralisée
+        self.assertEqual(self.rechercher(q='NEAR( "* :'), [])
+
+    def test_repli_contient(self):
+        # Bases sans index plein texte
+        resultats = recherche._rechercher_contient(Ticket.objects.all(), "Imprimante", 10)
+        self.assertEqual([pk for pk, _, _ in resultats], [self.imprimante.pk, self.rapport.pk])
+        self.assertGreater(resultats[0][1], resultats[1][1])
+        self.assertIn("<mark>imprimante</mark>", recherche.surligner(resultats[0][2]))
+        self.assertIn("&lt;b&gt;", recherche.surligner(resultats[0][2]))
+        self.assertEqual(recherche._rechercher_contient(Ticket.objects.all(), "imprimante paie", 10)[0][0],
+                         self.imprimante.pk)
+        self.assertEqual(recherche._rechercher_contient(Ticket.objects.all(), "imprimante inconnu", 10), [])
+
+    @skipUnless(connection.vendor == "postgresql", "tsvector : PostgreSQL requis.")
+    def test_postgresql(self):
+        # Racinisation française et syntaxe websearch
+        resultats = self.rechercher(q="imprimantes -paie")
+        self.assertEqual([r["id"] for r in resultats], [self.rapport.pk])
+        self.assertIn("<mark>", resultats[0]["extrait"])
+        resultats = self.rechercher(q='"service paie"')
+        self.assertEqual([r["id"] for r in resultats], [self.imprimante.pk])
+
+
+class CacheReferencesTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def test_lecture_depuis_le_cache(self):
+        url = reverse("logiciel-list-create")
+        premiere = self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            seconde = self.client.get(url)
+        self.assertEqual(seconde.data, premiere.data)
+        # Seuls les rôles de l'utilisateur sont lus
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(seconde["ETag"], premiere["ETag"])
+        self.assertIn("private", seconde["Cache-Control"])
+
+    def test_revalidation_304(self):
+        url = reverse("client-list-create")
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+        Client.objects.create(nom="Nouveau client")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertIn("Nouveau client", [c["nom"] for c in response.data])
+
+    def test_invalidation_par_signaux(self):
+        url = reverse("logiciel-list-create")
+        self.client.get(url)
+        probleme = self.types_problemes[0]
+        self.logiciel.type_problemes.remove(self.types_problemes[1])
+        self.assertEqual(
+            [t["id"] for t in self.client.get(url).data[0]["type_problemes"]], [probleme.pk]
+        )
+        probleme.nom = "Renommé"
+        probleme.save()
+        self.assertEqual(self.client.get(url).data[0]["type_problemes"][0]["nom"], "Renommé")
+
+        # Une création par l'API invalide aussi le groupe
+        self.client.post(reverse("role-list-create"), {"nom": "superviseur"})
+        self.assertIn("superviseur", [r["nom"] for r in self.client.get(reverse("role-list-create")).data])
+
+    def test_partition_par_roles(self):
+        url = reverse("type-logiciel-list-create")
+        self.client.get(url)
+        personnel = self.liens[0].personnel
+        self.client.force_authenticate(personnel)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        self.assertGreater(len(ctx.captured_queries), 1)
+
+    def test_cache_par_processus_refuse_hors_debug(self):
+        with self.settings(DEBUG=False):
+            self.assertEqual([e.id for e in verifier_cache_references(None)], ["support.E001"])
+        activer_cache_partage(self)
+        with self.settings(DEBUG=False):
+            self.assertEqual(verifier_cache_references(None), [])
+
+
+class EtagTicketsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.personnel = self.liens[0].personnel
+        self.client.force_authenticate(self.personnel)
+        self.tickets = self.creer_tickets(2, lien=self.liens[0])
+
+    def revalider(self, url, etag):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, len(ctx.captured_queries)
+
+    def test_detail(self):
+        ticket = self.tickets[0]
+        url = reverse("ticket-detail", args=[ticket.pk])
+        etag = self.client.get(url)["ETag"]
+
+        response, requetes = self.revalider(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(requetes, 1)
+
+        for modification in (
+            lambda: Fichier.objects.create(ticket=ticket, fichier="tickets/fichiers/autre.txt"),
+            lambda: Rapport.objects.create(ticket=ticket, contenu="Fait"),
+            lambda: Ticket.objects.get(pk=ticket.pk).save(update_fields=["statut"]),
+        ):
+            modification()
+            response, _ = self.revalider(url, etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            etag = response["ETag"]
+
+        self.assertEqual(self.client.get(reverse("ticket-detail", args=[0])).status_code, 404)
+
+    def test_version_incrementee_par_la_base(self):
+        ticket = Ticket.objects.get(pk=self.tickets[0].pk)
+        copie = Ticket.objects.get(pk=ticket.pk)
+        ticket.save()
+        copie.save()
+        self.assertEqual(copie.version, ticket.version + 1)
+
+    def test_version_entiere_des_signaux_et_sans_relecture(self):
+        ticket = Ticket.objects.get(pk=self.tickets[0].pk)
+        avant = ticket.version
+        vues = []
+
+        def enregistre(sender, instance, **kwargs):
+            vues.append(instance.version)
+
+        post_save.connect(enregistre, sender=Ticket)
+        self.addCleanup(post_save.disconnect, enregistre, sender=Ticket)
+        with CaptureQueriesContext(connection) as ctx:
+            ticket.save()
+        self.assertEqual(vues, [avant + 1])
+        self.assertEqual(Ticket.objects.get(pk=ticket.pk).version, ticket.version)
+        lectures = [q["sql"] for q in ctx.captured_queries if '"support_ticket"."version"' in q["sql"]
+                    and q["sql"].startswith("SELECT")]
+        self.assertEqual(len(lectures), 1)
+
+    def test_liste(self):
+        url = reverse("mes-tickets") + "?statut=en_attente"
+        etag = self.client.get(url)["ETag"]
+        response, requetes = self.revalider(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(requetes, 1)
+
+        # Une autre page ou d'autres filtres n'ont pas la même empreinte
+        self.assertEqual(self.revalider(reverse("mes-tickets"), etag)[0].status_code, 200)
+
+        for modification in (
+            lambda: self.tickets[1].save(),
+            lambda: self.creer_tickets(1, lien=self.liens[0]),
+            lambda: self.tickets[0].delete(),
+        ):
+            modification()
+            response, _ = self.revalider(url, etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response["ETag"]
+
+    def test_empreinte_limitee_a_la_page(self):
+        url = reverse("mes-tickets") + "?page_size=1"
+        etag = self.client.get(url)["ETag"]
+        # Ticket de la page suivante modifié : la première page reste valide
+        self.tickets[0].save()
+        self.assertEqual(self.revalider(url, etag)[0].status_code, 304)
+        self.tickets[1].save()
+        self.assertEqual(self.revalider(url, etag)[0].status_code, 200)
+
+
+@override_settings(EVENEMENTS_HEARTBEAT=0.2)
+class FluxEvenementsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.personnel = self.liens[0].personnel
+
+    def modifier_tickets(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket = Ticket.objects.create(lien=self.liens[0], logiciel=self.logiciel, description="A")
+            Ticket.objects.create(lien=self.liens[1], logiciel=self.logiciel, description="B")
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.technicien = self.technicien
+            ticket.statut = "clos"
+            ticket.save()
+        return ticket
+
+    async def lire(self, contenu):
+        return (await asyncio.wait_for(anext(contenu), 5)).decode()
+
+    async def test_flux_filtre_par_utilisateur(self):
+        await sync_to_async(self.client.force_authenticate)(self.personnel)
+        jeton = (await sync_to_async(self.client.post)(reverse("ticket-evenements-jeton"))).data["token"]
+        response = await self.async_client.get(reverse("ticket-evenements"), {"token": jeton})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        contenu = aiter(response.streaming_content)
+        self.assertEqual(await self.lire(contenu), "retry: 5000\n\n")
+
+        ticket = await sync_to_async(self.modifier_tickets)()
+        recus = [await self.lire(contenu) for _ in range(3)]
+        self.assertEqual(
+            [bloc.split("\n")[0] for bloc in recus],
+            ["event: ticket_cree", "event: ticket_assigne", "event: ticket_clos"],
+        )
+        self.assertIn(f'"ticket": {ticket.pk}', recus[0])
+        # Le ticket de l'autre client n'est pas transmis : seul le maintien suit
+        self.assertEqual(await self.lire(contenu), ": ping\n\n")
+
+        await contenu.aclose()
+
+    async def test_desabonnement_a_la_deconnexion(self):
+        avant = bus().nombre_abonnes
+        flux = _flux(self.personnel.pk, set(), False)
+        await anext(flux)
+        self.assertEqual(bus().nombre_abonnes, avant + 1)
+        # Le serveur ASGI ferme le générateur quand le client se déconnecte
+        await flux.aclose()
+        self.assertEqual(bus().nombre_abonnes, avant)
+
+    async def test_authentification_requise(self):
+        response = await self.async_client.get(reverse("ticket-evenements"), {"token": "invalide"})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_jeton_d_acces_refuse_dans_l_url(self):
+        # Le jeton d'accès ne passe jamais par l'URL ; le jeton d'ouverture ne vaut que pour le flux
+        acces = str(AccessToken.for_user(self.personnel))
+        response = await self.async_client.get(reverse("ticket-evenements"), {"token": acces})
+        self.assertEqual(response.status_code, 401)
+        jeton = str(JetonFlux.for_user(self.personnel))
+        response = await sync_to_async(self.client.get)(reverse("me"), HTTP_AUTHORIZATION=f"Bearer {jeton}")
+        self.assertEqual(response.status_code, 401)
+        expire = JetonFlux.for_user(self.personnel)
+        expire.set_exp(lifetime=-timedelta(seconds=1))
+        response = await self.async_client.get(reverse("ticket-evenements"), {"token": str(expire)})
+        self.assertEqual(response.status_code, 401)
+
+
+@skipUnless(connection.vendor == "postgresql", "LISTEN/NOTIFY : PostgreSQL requis.")
+class BusPostgresTests(TransactionTestCase):
+    async def test_notification_redistribuee(self):
+        bus_pg = BusPostgres()
+        bus_pg.DELAI_ECOUTE = 0.2
+        abonnement = bus_pg.abonner()
+        try:
+            self.assertTrue(await sync_to_async(bus_pg.pret.wait)(10))
+            # NOTIFY hors transaction : livré tout de suite au fil LISTEN (psycopg2 ou 3)
+            await sync_to_async(bus_pg.publier)({"type": "ticket_cree", "ticket": 1})
+            self.assertEqual(await abonnement.suivant(5), {"type": "ticket_cree", "ticket": 1})
+        finally:
+            abonnement.fermer()
+            await sync_to_async(bus_pg.arreter)()
+
+
+class ImportExportTicketsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.admin = self.creer_utilisateur("admin@example.com")
+        self.admin.is_staff = True
+        self.admin.save()
+        self.client.force_authenticate(self.admin)
+
+    def importer(self, corps, type_contenu="application/x-ndjson"):
+        return self.client.generic("POST", reverse("ticket-import"), corps.encode(), content_type=type_contenu)
+
+    def test_import_ndjson(self):
+        lignes = [
+            {"personnel": "personnel0@example.com", "client": "client 0", "logiciel": "Sage",
+             "technicien": "tech@example.com", "description": "Imprimante historique", "statut": "clos",
+             "date_creation": "2021-03-01", "date_cloture": "2021-03-02", "temps_traitement": "PT5H",
+             "rapport": "Toner changé"},
+            {"personnel": "personnel1@example.com", "client": "Client 1", "logiciel": str(self.logiciel.pk),
+             "description": "Sans technicien"},
+            {"personnel": "personnel1@example.com", "client": "Client 0", "logiciel": "Sage", "description": "X"},
+            {"personnel": "personnel2@example.com", "client": "Client 2", "logiciel": "Inconnu",
+             "description": "Y", "statut": "perdu"},
+        ]
+        corps = "\n".join(json.dumps(ligne) for ligne in lignes) + "\n{pas du json\n"
+
+        response = self.importer(corps)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["importes"], 2)
+        self.assertEqual(response.data["rejetes"], 3)
+        self.assertEqual([e["ligne"] for e in response.data["erreurs"]], [3, 4, 5])
+        self.assertEqual(set(response.data["erreurs"][1]["erreurs"]), {"statut"})
+
+        ticket = Ticket.objects.get(description="Imprimante historique")
+        self.assertEqual(ticket.date_creation, date(2021, 3, 1))
+        self.assertEqual(ticket.technicien, self.technicien)
+        self.assertEqual(ticket.temps_traitement, timedelta(hours=5))
+        self.assertEqual(ticket.rapport.contenu, "Toner changé")
+        self.assertIsNone(Ticket.objects.get(description="Sans technicien").technicien_id)
+
+        # Pas de notification ; statistiques et recherche à jour
+        self.assertEqual(MailSortant.objects.count(), 0)
+        attendu = sorted(StatistiqueTicket.objects.exclude(valeur=0).values_list("dimension", "cle", "indicateur", "valeur"))
+        reconstruire()
+        self.assertEqual(
+            sorted(StatistiqueTicket.objects.exclude(valeur=0).values_list("dimension", "cle", "indicateur", "valeur")),
+            attendu,
+        )
+        resultats = self.client.get(reverse("ticket-recherche"), {"q": "toner"}).data["results"]
+        self.assertEqual([r["id"] for r in resultats], [ticket.pk])
+
+    def test_requetes_independantes_du_nombre_de_lignes(self):
+        def compter(nombre):
+            ligne = json.dumps({"personnel": "personnel0@example.com", "client": "Client 0",
+                                "logiciel": "Sage", "description": "Lot"})
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.importer("\n".join([ligne] * nombre)).data["importes"], nombre)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(compter(2), compter(50))
+
+    def test_numero_de_ligne_csv(self):
+        corps = (
+            "personnel,client,logiciel,description,statut\n"
+            'personnel0@example.com,Client 0,Sage,"Sur\ndeux lignes",\n'
+            "personnel0@example.com,Client 0,Sage,Statut inconnu,perdu\n"
+        )
+        response = self.importer(corps, "text/csv")
+        self.assertEqual(response.data["importes"], 1)
+        # Ligne physique dans le fichier, en-tête compris
+        self.assertEqual([e["ligne"] for e in response.data["erreurs"]], [4])
+
+    @override_settings(IMPORT_TAILLE_LOT=2)
+    def test_export_csv_reimportable(self):
+        tickets = self.creer_tickets(3)
+        tickets[0].statut = "clos"
+        tickets[0].temps_traitement = timedelta(hours=2, minutes=30)
+        tickets[0].save()
+
+        response = self.client.get(reverse("ticket-export"), {"type": "csv"}, HTTP_ACCEPT="text/csv")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenu = b"".join(response.streaming_content).decode()
+        self.assertEqual(contenu.splitlines()[0].split(",")[:3], ["id", "personnel", "client"])
+
+        response = self.importer(contenu, "text/csv")
+        self.assertEqual(response.data, {"importes": 3, "rejetes": 0, "erreurs": []})
+        copie = Ticket.objects.exclude(pk__in=[t.pk for t in tickets]).get(description="Ticket 0")
+        self.assertEqual(copie.temps_traitement, timedelta(hours=2, minutes=30))
+        self.assertEqual((copie.lien_id, copie.statut), (tickets[0].lien_id, "clos"))
+
+    def test_export_ndjson_filtre(self):
+        self.creer_tickets(3)
+        response = self.client.get(reverse("ticket-export"), {"client": self.liens[1].client_id})
+        lignes = [json.loads(l) for l in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([l["client"] for l in lignes], ["Client 1"])
+        self.assertEqual(lignes[0]["rapport"], "Résolu")
+
+    def test_reserve_au_staff(self):
+        self.client.force_authenticate(self.technicien)
+        self.assertEqual(self.importer("").status_code, 403)
+        self.assertEqual(self.client.get(reverse("ticket-export")).status_code, 403)
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.importer("a,b", "text/plain").status_code, 415)
+
+
+class ActionsGroupeesTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def agir(self, **donnees):
+        return self.client.post(reverse("ticket-actions"), donnees, format="json")
+
+    def statistiques_coherentes(self):
+        obtenu = sorted(StatistiqueTicket.objects.exclude(valeur=0).values_list("dimension", "cle", "indicateur", "valeur"))
+        reconstruire()
+        attendu = sorted(StatistiqueTicket.objects.exclude(valeur=0).values_list("dimension", "cle", "indicateur", "valeur"))
+        self.assertEqual(obtenu, attendu)
+
+    def test_cloture_et_assignation(self):
+        tickets = self.creer_tickets(3)
+        tickets[2].technicien = None
+        tickets[2].save()
+        autre = self.creer_utilisateur("tech2@example.com", self.technicien.roles.first())
+        versions = {t.pk: Ticket.objects.get(pk=t.pk).version for t in tickets}
+
+        response = self.agir(ids=[tickets[0].pk, tickets[2].pk, 0], technicien=autre.pk, statut="clos")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["modifies"], 2)
+        self.assertEqual([r["resultat"] for r in response.data["resultats"]], ["modifie", "modifie", "introuvable"])
+
+        ticket = Ticket.objects.get(pk=tickets[2].pk)
+        self.assertEqual((ticket.statut, ticket.technicien_id), ("clos", autre.pk))
+        self.assertIsNotNone(ticket.date_cloture)
+        self.assertEqual(ticket.temps_traitement, timedelta(0))
+        self.assertEqual(ticket.version, versions[ticket.pk] + 1)
+        self.assertEqual(response.data["resultats"][1]["version"], ticket.version)
+        self.statistiques_coherentes()
+
+        # Même action rejouée : rien ne change ; réouverture : dates effacées
+        response = self.agir(ids=[tickets[0].pk], technicien=autre.pk, statut="clos")
+        self.assertEqual(response.data["resultats"][0]["resultat"], "inchange")
+        self.agir(ids=[tickets[0].pk], statut="en_cours")
+        ticket = Ticket.objects.get(pk=tickets[0].pk)
+        self.assertEqual((ticket.date_cloture, ticket.temps_traitement), (None, None))
+        self.statistiques_coherentes()
+
+    def test_nombre_de_requetes_fixe(self):
+        tickets = self.creer_tickets(30)
+
+        def compter(lot, statut):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.agir(ids=[t.pk for t in lot], statut=statut, technicien=None)
+            self.assertEqual(response.data["modifies"], len(lot))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(compter(tickets[:3], "en_cours"), compter(tickets[3:], "en_cours"))
+
+    def test_validation(self):
+        self.assertEqual(self.agir(ids=[1]).status_code, 400)
+        self.assertEqual(self.agir(ids=[], statut="clos").status_code, 400)
+        self.assertEqual(self.agir(ids=[1], statut="perdu").status_code, 400)
+        self.assertEqual(self.agir(ids=[1], technicien=self.liens[0].personnel_id).status_code, 400)
+
+    def test_reserve_au_triage(self):
+        ticket = self.creer_tickets(1)[0]
+        self.client.force_authenticate(self.liens[0].personnel)
+        self.assertEqual(self.agir(ids=[ticket.pk], statut="clos").status_code, 403)
+        self.assertNotEqual(Ticket.objects.get(pk=ticket.pk).statut, "clos")
+
+
+class RoutageTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.liens[0].personnel)
+        role = self.technicien.roles.first()
+        self.autre = self.creer_utilisateur("tech2@example.com", role)
+        self.profil = ProfilTechnicien.objects.create(technicien=self.technicien)
+        self.profil_autre = ProfilTechnicien.objects.create(technicien=self.autre)
+
+    def creer(self, **donnees):
+        response = self.client.post(reverse("ticket-list-create"), {
+            "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Routage", **donnees,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return Ticket.objects.get(pk=response.data["id"]).technicien_id
+
+    def test_tourniquet_et_charge(self):
+        # Charges égales : on alterne
+        premiers = [self.creer(), self.creer()]
+        self.assertEqual(sorted(premiers), sorted([self.technicien.pk, self.autre.pk]))
+
+        # Un ticket fermé libère de la charge
+        ticket = Ticket.objects.filter(technicien=self.technicien).first()
+        ticket.statut = "clos"
+        ticket.save()
+        self.assertEqual(self.creer(), self.technicien.pk)
+
+    def test_competence_et_capacite(self):
+        autre_logiciel = Logiciel.objects.create(nom="Autre", type_logiciel=self.logiciel.type_logiciel)
+        self.profil.logiciels.add(self.logiciel)
+        self.profil_autre.logiciels.add(autre_logiciel)
+        self.assertEqual([self.creer() for _ in range(3)], [self.technicien.pk] * 3)
+
+        # Capacité atteinte : personne d'autre n'est compétent
+        self.profil.capacite = 3
+        self.profil.save()
+        self.assertIsNone(self.creer())
+
+        # Un type de problème commun suffit
+        self.profil_autre.types_problemes.add(self.types_problemes[0])
+        self.assertEqual(self.creer(), self.autre.pk)
+
+    def test_technicien_explicite_et_inactifs(self):
+        self.assertEqual(self.creer(technicien=self.autre.pk), self.autre.pk)
+        ProfilTechnicien.objects.update(actif=False)
+        self.assertIsNone(self.creer())
+        with override_settings(ROUTAGE_AUTOMATIQUE=False):
+            ProfilTechnicien.objects.update(actif=True)
+            self.assertIsNone(self.creer())
+
+
+class ProjectionTicketsTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+        self.tickets = self.creer_tickets(5)
+        self.tickets[0].temps_traitement = timedelta(hours=2)
+        self.tickets[0].save()
+
+    def test_resume_plat(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("ticket-list-create"), {"view": "summary"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIsInstance(response.accepted_renderer, OrjsonRenderer)
+        ligne = json.loads(response.content)["results"][-1]
+        self.assertEqual(ligne["id"], self.tickets[0].pk)
+        self.assertEqual(ligne["client"], "Client 0")
+        self.assertEqual(ligne["technicien"], "tech@example.com")
+        self.assertEqual(ligne["temps_traitement"], "02:00:00")
+        self.assertEqual(ligne["date_creation"], self.tickets[0].date_creation.isoformat())
+
+        complet = self.client.get(reverse("ticket-list-create"))
+        self.assertLess(len(response.content) * 2, len(complet.content))
+
+    def test_champs_choisis_et_curseur(self):
+        url = reverse("mes-tickets")
+        self.client.force_authenticate(self.liens[0].personnel)
+        self.creer_tickets(3, lien=self.liens[0])
+        vus, suivant = [], url + "?fields=statut,logiciel&page_size=2"
+        while suivant:
+            donnees = self.client.get(suivant).data
+            vus += donnees["results"]
+            suivant = donnees["next"]
+        self.assertEqual(len(vus), 5)
+        self.assertEqual(vus[0], {"statut": "en_attente", "logiciel": "Sage"})
+
+    def test_champ_inconnu(self):
+        response = self.client.get(reverse("ticket-list-create"), {"fields": "id,mot_de_passe"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("mot_de_passe", str(response.data["fields"]))
+
+
+class ListeFichiersTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+        self.tickets = self.creer_tickets(4)
+        for ticket in self.tickets[:2]:
+            Fichier.objects.create(ticket=ticket, fichier=f"tickets/fichiers/capture{ticket.pk}.png")
+
+    def test_reference_au_ticket(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("fichier-list"))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        fichier = response.data["results"][0]
+        self.assertEqual(set(fichier), {"id", "fichier", "nom", "date_ajout", "ticket"})
+        self.assertIsInstance(fichier["ticket"], int)
+
+    def test_expansion_du_ticket(self):
+        url = reverse("fichier-list") + "?expand=ticket"
+        requetes = self.compter_requetes(url)
+        self.creer_tickets(6)
+        self.assertEqual(self.compter_requetes(url), requetes)
+
+        resultats = self.client.get(url).data["results"]
+        self.assertEqual(len(resultats), 12)
+        par_ticket = {}
+        for fichier in resultats:
+            par_ticket.setdefault(fichier["ticket"]["id"], []).append(fichier)
+        # Deux fichiers du même ticket partagent la même représentation
+        premier, second = par_ticket[self.tickets[0].pk]
+        self.assertIs(premier["ticket"], second["ticket"])
+        self.assertEqual(len(premier["ticket"]["fichiers"]), 2)
+
+    def test_expansion_inconnue(self):
+        self.assertEqual(self.client.get(reverse("fichier-list"), {"expand": "lien"}).status_code, 400)
+
+
+class BancEssaiTests(TestsAPI):
+    """Budgets de requêtes de toutes les routes, sur un petit jeu de données."""
+
+    def setUp(self):
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        reglages = self.settings(
+            MEDIA_ROOT=os.path.join(self.dossier, "media"),
+            TELEVERSEMENT_DIR=os.path.join(self.dossier, "parts"),
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.contexte = banc_essai.peupler(clients=3, tickets=30, logiciels=3, techniciens=2)
+
+    def test_toutes_les_routes_respectent_leur_budget(self):
+        self.assertEqual(banc_essai.routes_sans_scenario(), [])
+        rapport = banc_essai.executer(self.contexte, repetitions=2)
+        self.assertEqual(rapport["depassements"], [])
+        self.assertEqual(rapport["resultats"]["ticket-recherche"]["statuts"], [200])
+        self.assertGreater(rapport["resultats"]["tickets"]["octets"], 0)
+
+    def test_depassement_signale(self):
+        scenarios = [s for s in banc_essai.SCENARIOS if s.nom == "tickets"]
+        rapport = banc_essai.executer(
+            self.contexte, repetitions=1, scenarios=scenarios, budgets={"tickets": {"requetes": 1}}
+        )
+        self.assertEqual(len(rapport["depassements"]), 1)
+        self.assertIn("tickets : requetes", rapport["depassements"][0])
+
+
+class ProfilageTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dossier)
+        reglages = self.settings(
+            PROFILAGE_ACTIF=True, PROFILAGE_ECHANTILLON=1.0, PROFILAGE_MEMOIRE_ECHANTILLON=1.0,
+            PROFILAGE_CPROFILE_ECHANTILLON=1.0, PROFILAGE_CPROFILE_SEUIL_MS=0,
+            PROFILAGE_CPROFILE_DIR=self.dossier,
+        )
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.client.force_authenticate(self.technicien)
+        self.creer_tickets(3)
+
+    def test_server_timing_et_journal(self):
+        with self.assertLogs("support.profilage", "INFO") as journal:
+            response = self.client.get(reverse("ticket-list-create"))
+        self.assertEqual(response.status_code, 200)
+        entete = response["Server-Timing"]
+        for metrique in ("sql;dur=", "serialisation;dur=", "app;dur=", "total;dur=", 'memoire;desc="pic'):
+            self.assertIn(metrique, entete)
+
+        donnees = journal.records[0].profilage
+        self.assertEqual(donnees["route"], "ticket-list-create")
+        self.assertGreater(donnees["sql"]["requetes"], 0)
+        self.assertGreater(donnees["serialisation_ms"], 0)
+        self.assertGreater(donnees["memoire_pic_octets"], 0)
+        self.assertTrue(os.path.exists(donnees["profil"]))
+        self.assertEqual(json.loads(journal.records[0].getMessage().split(" ", 1)[1]), donnees)
+
+    def test_requetes_repetees(self):
+        # Sans préchargement, chaque ticket relit son lien : même empreinte répétée
+        mesure = Mesure()
+        with connection.execute_wrapper(mesure.executer):
+            for ticket in Ticket.objects.all():
+                ticket.lien
+        self.assertEqual(mesure.requetes, 4)
+        self.assertEqual(mesure.repetees(), 2)
+        self.assertEqual(mesure.doublons(5)[0]["nombre"], 3)
+
+    def test_empreinte(self):
+        self.assertEqual(
+            empreinte("SELECT *  FROM t WHERE id IN (%s, %s, %s) AND nom = 'a''b' LIMIT 21"),
+            "SELECT * FROM t WHERE id IN (...) AND nom = ? LIMIT ?",
+        )
+
+    def test_desactive(self):
+        with self.settings(PROFILAGE_ACTIF=False):
+            self.client = self.client_class()
+            self.client.force_authenticate(self.technicien)
+            response = self.client.get(reverse("ticket-list-create"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_serializers_instrumentes_pendant_la_requete_seulement(self):
+        originale = Serializer.__dict__["data"]
+        vues = []
+
+        class Espion(Serializer):
+            def to_representation(self, instance):
+                vues.append(Serializer.__dict__["data"] is originale)
+                return {}
+
+        with serializers_instrumentes():
+            with serializers_instrumentes():
+                Espion({}).data
+            Espion({}).data
+        self.assertEqual(vues, [False, False])
+        self.assertIs(Serializer.__dict__["data"], originale)
+
+        self.client.get(reverse("ticket-list-create"))
+        self.assertIs(Serializer.__dict__["data"], originale)
+
+
+@override_settings(METRIQUES_JETON="secret")
+class MetriquesTests(DonneesMixin, TestsAPI):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.technicien)
+
+    def valeur(self, texte, ligne):
+        for courante in texte.splitlines():
+            if courante.startswith(ligne + " "):
+                return float(courante.rsplit(" ", 1)[1])
+        return 0.0
+
+    def exposer(self):
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode()
+
+    def test_requetes_tickets_et_mails(self):
+        avant = self.exposer()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("ticket-list-create"), {
+                "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Écran noir",
+            })
+        self.assertEqual(response.status_code, 201)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("ticket-actions"), {"ids": [response.data["id"]], "statut": "clos"}, format="json")
+        apres = self.exposer()
+
+        for ligne, delta in (
+            ('support_tickets_crees_total{origine="enregistrement"}', 1),
+            ('support_tickets_clos_total{origine="triage"}', 1),
+            ('support_mails_mise_en_file_secondes_count{type="prise_en_charge"}', 1),
+            ('support_http_requete_duree_secondes_count{route="ticket-list-create",methode="POST",statut="201"}', 1),
+        ):
+            self.assertEqual(self.valeur(apres, ligne) - self.valeur(avant, ligne), delta, ligne)
+        self.assertIn("# TYPE support_http_requete_duree_secondes histogram", apres)
+        self.assertEqual(self.valeur(apres, 'support_tickets{statut="clos"}'), 1)
+        self.assertIn('support_mails_file{statut="en_attente"}', apres)
+
+    def test_agregation_multiprocessus(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier)
+        # Processus terminé (pid hors limites) : compteurs conservés, jauges ignorées
+        with open(os.path.join(dossier, "4194999.json"), "w") as sortie:
+            json.dump({"pid": 4194999, "metriques": {
+                "support_tickets_crees_total": {
+                    "type": "counter", "aide": "Tickets créés.", "etiquettes": ["origine"],
+                    "valeurs": [[["import"], 40]],
+                },
+                "support_db_connexions_ouvertes": {
+                    "type": "gauge", "aide": "", "etiquettes": ["alias"], "valeurs": [[["default"], 7]],
+                },
+            }}, sortie)
+        with self.settings(METRIQUES_DIR=dossier):
+            metriques.TICKETS_CREES.inc("import", valeur=2)
+            instantane = metriques.registre.instantane()["support_tickets_crees_total"]
+            local = {tuple(cle): valeur for cle, valeur in instantane["valeurs"]}
+            texte = metriques.exposition(metriques.collecter())
+            fichiers = [nom for nom in os.listdir(dossier) if nom.startswith(f"{os.getpid()}-")]
+            self.assertEqual(len(fichiers), 1)
+        self.assertEqual(
+            self.valeur(texte, 'support_tickets_crees_total{origine="import"}'), local[("import",)] + 40
+        )
+        self.assertNotIn('support_db_connexions_ouvertes{alias="default"} 7', texte)
+
+    def test_pid_reutilise(self):
+        dossier = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dossier)
+        # Ancien worker au même pid que ce processus : ses totaux restent, pas ses jauges
+        with open(os.path.join(dossier, f"{os.getpid()}-ancien.json"), "w") as sortie:
+            json.dump({"pid": os.getpid(), "debut": 1.0, "metriques": {
+                "support_tickets_crees_total": {
+                    "type": "counter", "aide": "Tickets créés.", "etiquettes": ["origine"],
+                    "valeurs": [[["import"], 40]],
+                },
+                "support_db_connexions_ouvertes": {
+                    "type": "gauge", "aide": "", "etiquettes": ["alias"], "valeurs": [[["ancien"], 7]],
+                },
+            }}, sortie)
+        with self.settings(METRIQUES_DIR=dossier):
+            metriques.TICKETS_CREES.inc("import")
+            local = dict((tuple(cle), valeur) for cle, valeur in
+                         metriques.registre.instantane()["support_tickets_crees_total"]["valeurs"])
+            texte = metriques.exposition(metriques.collecter())
+        self.assertEqual(len(os.listdir(dossier)), 2)
+        self.assertEqual(
+            self.valeur(texte, 'support_tickets_crees_total{origine="import"}'), local[("import",)] + 40
+        )
+        self.assertNotIn('alias="ancien"', texte)
+
+    def test_format_histogramme(self):
+        familles = {"h": {"type": "histogram", "aide": "Aide.", "etiquettes": ["route"], "seaux": [0.1, 1.0],
+                          "valeurs": [[['a"b'], [2, 1, 1, 3.5]]]}}
+        self.assertEqual(metriques.exposition(familles).splitlines(), [
+            "# HELP h Aide.",
+            "# TYPE h histogram",
+            'h_bucket{route="a\\"b",le="0.1"} 2',
+            'h_bucket{route="a\\"b",le="1.0"} 3',
+            'h_bucket{route="a\\"b",le="+Inf"} 4',
+            'h_sum{route="a\\"b"} 3.5',
+            'h_count{route="a\\"b"} 4',
+        ])
+
+    def test_acces(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secret").status_code, 200)
+        with self.settings(METRIQUES_RESEAUX_AUTORISES=["10.0.0.0/8"]):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.5").status_code, 401)
+        # Ni jeton ni réseau : fermé, même en local
+        with self.settings(METRIQUES_JETON=None):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+
+class ConfigurationBasesTests(DonneesMixin, TestsAPI):
+    def test_connexions_persistantes_par_defaut(self):
+        bases, lecture = bases_depuis_environnement({})
+        self.assertEqual(bases["default"]["CONN_MAX_AGE"], 60)
+        self.assertTrue(bases["default"]["CONN_HEALTH_CHECKS"])
+        self.assertEqual(set(bases), {"default"})
+        self.assertIsNone(lecture)
+
+    def test_replique(self):
+        bases, lecture = bases_depuis_environnement({
+            "DB_HOST": "primaire", "DB_USER": "app", "DB_CONN_MAX_AGE": "0", "DB_REPLICA_HOST": "replique",
+        })
+        self.assertEqual(lecture, "replica")
+        self.assertEqual(bases["replica"]["HOST"], "replique")
+        self.assertEqual(bases["replica"]["USER"], "app")
+        self.assertEqual(bases["replica"]["CONN_MAX_AGE"], 0)
+        self.assertEqual(bases["replica"]["TEST"], {"MIRROR": "default"})
+
+    def test_pool(self):
+        environ = {"DB_POOL": "1", "DB_POOL_MAX_SIZE": "20"}
+        if importlib.util.find_spec("psycopg") is None or importlib.util.find_spec("psycopg_pool") is None:
+            with self.assertRaises(ImproperlyConfigured):
+                bases_depuis_environnement(environ)
+            return
+        bases, _ = bases_depuis_environnement(environ)
+        self.assertEqual(bases["default"]["OPTIONS"]["pool"]["max_size"], 20)
+        self.assertEqual(bases["default"]["CONN_MAX_AGE"], 0)
+
+    def test_routeur(self):
+        routeur = RouteurLectures()
+        self.assertIsNone(routeur.db_for_read(Ticket))
+        with lectures_sur("replica"):
+            self.assertEqual(routeur.db_for_read(Ticket), "replica")
+            self.assertEqual(routeur.db_for_write(Ticket), "default")
+        self.assertFalse(routeur.allow_migrate("replica", "support"))
+
+    def alias_des_requetes(self, appel):
+        vus = set()
+
+        def espion(execute, sql, params, many, context):
+            vus.add(alias_lecture())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(espion):
+            appel()
+        return vus
+
+    def test_listes_lues_sur_la_replique(self):
+        activer_cache_partage(self)
+        self.client.force_authenticate(self.technicien)
+        # Alias existant en test : seul compte l'alias désigné pendant la requête
+        with self.settings(BASE_LECTURE="default"):
+            self.assertEqual(self.alias_des_requetes(lambda: self.client.get(reverse("ticket-list-create"))), {"default"})
+            self.assertEqual(self.alias_des_requetes(lambda: self.client.get(reverse("utilisateur-list"))), {"default"})
+            ecriture = self.alias_des_requetes(lambda: self.client.post(reverse("ticket-list-create"), {
+                "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Imprimante",
+            }))
+            self.assertEqual(ecriture, {None})
+            self.assertEqual(self.alias_des_requetes(lambda: self.client.get(reverse("mes-tickets"))), {None})
+        self.assertEqual(self.alias_des_requetes(lambda: self.client.get(reverse("ticket-list-create"))), {None})
+
+    def test_lecture_de_ses_ecritures(self):
+        activer_cache_partage(self)
+        self.client.force_authenticate(self.technicien)
+        liste = lambda: self.client.get(reverse("fichier-list"))  # noqa: E731
+        with self.settings(BASE_LECTURE="default"):
+            self.assertEqual(self.alias_des_requetes(liste), {"default"})
+            reponse = self.client.post(reverse("ticket-list-create"), {
+                "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Imprimante",
+            })
+            self.assertIn(COOKIE_ECRITURE, reponse.cookies)
+            self.assertEqual(self.alias_des_requetes(liste), {None})
+            # Client JWT sans cookies : reconnu par son utilisateur
+            self.client.cookies.clear()
+            self.assertEqual(self.alias_des_requetes(liste), {None})
+            cache.clear()
+            self.assertEqual(self.alias_des_requetes(liste), {"default"})
+            # Écriture refusée : rien à relire
+            self.client.post(reverse("ticket-list-create"), {"description": "incomplet"})
+            self.assertEqual(self.alias_des_requetes(liste), {"default"})
+
+    def test_cache_de_coherence_partage_exige(self):
+        with self.settings(BASE_LECTURE="default"):
+            self.assertEqual([e.id for e in verifier_cache_coherence(None)], ["support.E003"])
+            with self.assertRaises(ImproperlyConfigured):
+                CoherenceLecturesMiddleware(lambda request: None)
+        self.assertEqual(verifier_cache_coherence(None), [])
+        activer_cache_partage(self)
+        with self.settings(BASE_LECTURE="default"):
+            self.assertEqual(verifier_cache_coherence(None), [])
+
+
+@skipUnless("replica" in connections, "Pas d'alias replica (DB_REPLICA_NAME / DB_REPLICA_HOST).")
+class RepliqueTests(DonneesMixin, APITransactionTestCase):
+    """Seule classe qui lit sur la réplique ; lancée avec deux bases configurées, p. ex. :
+    DB_ENGINE=django.db.backends.sqlite3 DB_NAME=principale.sqlite3 DB_REPLICA_NAME=replique.sqlite3
+
+    Transactions validées : la réplique (miroir de test) lit par sa propre connexion.
+    """
+    # Évalué même quand la classe est ignorée : seulement les alias existants
+    databases = {"default", "replica"} & set(connections)
+
+    def setUp(self):
+        # Le middleware de cohérence exige un cache partagé
+        activer_cache_partage(self)
+        self.setUpTestData()
+        super().setUp()
+
+    def requetes_par_base(self, appel):
+        vues = {"default": 0, "replica": 0}
+
+        def espion(alias):
+            def compter(execute, sql, params, many, context):
+                if "support_ticket" in sql:
+                    vues[alias] += 1
+                return execute(sql, params, many, context)
+            return compter
+
+        with connections["default"].execute_wrapper(espion("default")), \
+                connections["replica"].execute_wrapper(espion("replica")):
+            appel()
+        return vues
+
+    def test_listes_sur_la_replique_sauf_apres_ecriture(self):
+        self.client.force_authenticate(self.technicien)
+        liste = lambda: self.client.get(reverse("ticket-list-create"))  # noqa: E731
+        with self.settings(BASE_LECTURE="replica"):
+            vues = self.requetes_par_base(liste)
+            self.assertEqual(vues["default"], 0)
+            self.assertGreater(vues["replica"], 0)
+
+            self.client.post(reverse("ticket-list-create"), {
+                "lien": self.liens[0].pk, "logiciel": self.logiciel.pk, "description": "Imprimante",
+            })
+            vues = self.requetes_par_base(liste)
+            self.assertGreater(vues["default"], 0)
+            self.assertEqual(vues["replica"], 0)
@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import evenements, metriques, statistiques
+from .models import Ticket
+
+
+# === Actions groupées sur les tickets (triage) ===
+#
+# Les tickets visés sont lus et verrouillés en une requête, modifiés en
+# mémoire puis écrits par un seul bulk_update. bulk_update n'émettant pas de
+# signaux, on fait ici ce que font les signaux d'un save() : version (ETag),
+# statistiques (une mise à jour pour tout le lot) et événements temps réel.
+
+CHAMPS = ["technicien", "statut", "date_cloture", "temps_traitement", "version"]
+
+
+def appliquer_actions(ids, changements):
+    """changements : sous-ensemble de {"technicien": Utilisateur | None, "statut": str}.
+
+    Retourne un résultat par id demandé, dans l'ordre de la demande.
+    """
+    aujourd_hui = timezone.localdate()
+    resultats, modifies, paires = {}, [], []
+
+    with transaction.atomic():
+        tickets = Ticket.objects.select_for_update(of=("self",)).select_related("lien").filter(pk__in=ids)
+        for ticket in tickets:
+            ancien = statistiques.etat_ticket(ticket)
+            if "technicien" in changements:
+                ticket.technicien = changements["technicien"]
+            if "statut" in changements and changements["statut"] != ticket.statut:
+                if changements["statut"] == "clos":
+                    ticket.date_cloture = aujourd_hui
+                    if ticket.temps_traitement is None:
+                        ticket.temps_traitement = aujourd_hui - ticket.date_creation
+                elif ticket.statut == "clos":
+                    # Réouverture
+                    ticket.date_cloture = ticket.temps_traitement = None
+                ticket.statut = changements["statut"]
+
+            nouveau = statistiques.etat_ticket(ticket)
+            if nouveau == ancien:
+                resultats[ticket.pk] = resultat(ticket, "inchange")
+                continue
+            # Lignes verrouillées : l'incrément en mémoire est sûr
+            ticket.version += 1
+            modifies.append(ticket)
+            paires.append((ancien, nouveau))
+            resultats[ticket.pk] = resultat(ticket, "modifie")
+            liste = evenements.evenements_ticket(ancien, ticket, ticket.lien.personnel_id)
+            evenements.publier_apres_commit(liste)
+            metriques.compter_evenements(liste, "triage")
+
+        if modifies:
+            Ticket.objects.bulk_update(modifies, CHAMPS)
+            statistiques.appliquer_lot(paires)
+
+    return [resultats.get(pk, {"id": pk, "resultat": "introuvable"}) for pk in ids]
+
+
+def resultat(ticket, etat):
+    return {
+        "id": ticket.pk,
+        "resultat": etat,
+        "statut": ticket.statut,
+        "technicien": ticket.technicien_id,
+        "version": ticket.version,
+    }
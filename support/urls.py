@@ -33,14 +33,27 @@ urlpatterns = [
     # === TICKETS ===
     path("tickets/", views.TicketListCreateAPIView.as_view(), name="ticket-list-create"),
     path("tickets/<int:pk>/", views.TicketDetailAPIView.as_view(), name="ticket-detail"),
+    path("tickets/recherche/", views.TicketRechercheAPIView.as_view(), name="ticket-recherche"),
+    path("tickets/evenements/", views.flux_evenements, name="ticket-evenements"),
+    path("tickets/evenements/jeton/", views.JetonEvenementsAPIView.as_view(), name="ticket-evenements-jeton"),
+    path("tickets/actions/", views.TicketActionsAPIView.as_view(), name="ticket-actions"),
+    path("tickets/import/", views.TicketImportAPIView.as_view(), name="ticket-import"),
+    path("tickets/export/", views.TicketExportAPIView.as_view(), name="ticket-export"),
     ###GPTS TICKETS
     path("mes-tickets/", views.MesTicketsAPIView.as_view(), name="mes-tickets"),
+    path("tableau-de-bord/", views.TableauDeBordAPIView.as_view(), name="tableau-de-bord"),
 
     # === RAPPORTS ===
     path("rapports/", views.RapportListCreateAPIView.as_view(), name="rapport-list-create"),
 
     # === FICHIERS ===
     path("fichiers/", views.FichierListAPIView.as_view(), name="fichier-list"),
+    path("fichiers/<int:pk>/telecharger/", views.FichierTelechargementAPIView.as_view(), name="fichier-telecharger"),
+
+    # === TELEVERSEMENTS (par morceaux) ===
+    path("televersements/", views.TeleversementCreateAPIView.as_view(), name="televersement-create"),
+    path("televersements/<uuid:pk>/", views.TeleversementDetailAPIView.as_view(), name="televersement-detail"),
+    path("televersements/<uuid:pk>/terminer/", views.TeleversementTerminerAPIView.as_view(), name="televersement-terminer"),
 
     # === Profile ===
     path('me/', views.MeAPIView.as_view(), name='me'),
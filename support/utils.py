@@ -1,7 +1,6 @@
-from django.core.mail import send_mail
-from django.conf import settings
-
-from support.models import Utilisateur
+from support.metriques import MAILS_MISE_EN_FILE
+from support.notifications import destinataires_par_role
+from support.outbox import mettre_en_file
 
 
 # 🔢 Formatage du numéro de ticket
@@ -9,6 +8,7 @@ def format_ticket_id(ticket_id: int) -> str:
     return f"TKK{ticket_id:05d}"
 
 
+@MAILS_MISE_EN_FILE.chronometrer("prise_en_charge")
 def envoyer_mail_prise_en_charge(ticket):
     destinataire = ticket.lien.personnel.email
     sujet = f"Votre ticket {format_ticket_id(ticket.id)} a été pris en charge"
@@ -20,10 +20,11 @@ def envoyer_mail_prise_en_charge(ticket):
         f"Nous reviendrons vers vous dès que possible.\n\n"
         f"Merci,\nL'équipe support TechExpert"
     )
-    send_mail(sujet, message, settings.DEFAULT_FROM_EMAIL, [destinataire], fail_silently=False)
+    mettre_en_file(sujet, message, [destinataire])
 
 
 
+@MAILS_MISE_EN_FILE.chronometrer("creation_ticket")
 def envoyer_mail_creation_ticket(ticket):
     sujet = f"[Nouveau Ticket] {format_ticket_id(ticket.id)} – {ticket.lien.client.nom}"
 
@@ -38,18 +39,7 @@ def envoyer_mail_creation_ticket(ticket):
         f"- Système de ticket TechExpert"
     )
 
-    # 🔍 Chercher tous les administrateurs et superviseurs
-    destinataires = list(
-        Utilisateur.objects.filter(roles__nom__in=["administrateur", "superviseur"])
-        .values_list("email", flat=True)
-        .distinct()
-    )
+    # 🔍 Tous les administrateurs et superviseurs (liste mise en cache)
+    destinataires = destinataires_par_role("administrateur", "superviseur")
 
-    if destinataires:
-        send_mail(
-            sujet,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            destinataires,
-            fail_silently=False
-        )
\ No newline at end of file
+    mettre_en_file(sujet, message, destinataires)
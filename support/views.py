@@ -1,19 +1,49 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from rest_framework import generics, permissions
+from rest_framework.exceptions import AuthenticationFailed, UnsupportedMediaType, ValidationError
 from rest_framework.generics import ListAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.tokens import Token
 from .models import (
     Role, Utilisateur, Client, Personnel, PersonnelClient,
     TypeLogiciel, TypeProbleme, Logiciel,
-    Ticket, Rapport, Fichier
+    Ticket, Rapport, Fichier, Televersement
 )
 from .serializers import (
     RoleSerializer, UtilisateurSerializer, ClientSerializer, PersonnelSerializer,
     PersonnelClientSerializer, TypeLogicielSerializer, TypeProblemeSerializer, MeSerializer,
     LogicielSerializer, TicketReadSerializer, TicketWriteSerializer,
-    RapportSerializer, FichierSerializer, UtilisateurCreateSerializer, PersonnelCreateSerializer, PersonnelClientCreateSerializer
+    RapportSerializer, FichierListeSerializer, FichierTicketSerializer, UtilisateurCreateSerializer, PersonnelCreateSerializer, PersonnelClientCreateSerializer,
+    TeleversementSerializer, TicketRechercheSerializer, TicketActionSerializer, TICKET_RESUME
 )
-from .utils import envoyer_mail_creation_ticket
+from .echange import export_csv, export_ndjson, importer, lire_csv, lire_ndjson
+from .evenements import ROLES_TOUT_VOIR, bus, concerne
+from .filtres import TicketFiltre
+from .metriques import collecter, exposition, metriques_base
+from .mixins import CacheReferenceMixin, EagerLoadingMixin, EtagTicketMixin, LectureReplicaMixin, ProjectionMixin
+from .pagination import IdCursorPagination, TicketCursorPagination
+from .prefetch import optimiser_queryset
+from .recherche import rechercher, surligner
+from .statistiques import tableau_de_bord
+from .telechargement import FichierRenderer, reponse_fichier
+from .televersement import ErreurTeleversement, ecrire_morceau, terminer
+from .triage import appliquer_actions
+from .utils import envoyer_mail_creation_ticket, envoyer_mail_prise_en_charge
 
 
 # === BASE PERMISSION ===
@@ -21,18 +51,28 @@ class IsAuthenticated(permissions.IsAuthenticated):
     pass
 
 
+class EstTriage(IsAuthenticated):
+    """Techniciens, administrateurs et superviseurs (Utilisateur.has_role)."""
+    roles = ("technicien", "administrateur", "superviseur")
+
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and any(request.user.has_role(role) for role in self.roles)
+
+
 # === ROLES ===
-class RoleListCreateAPIView(generics.ListCreateAPIView):
+class RoleListCreateAPIView(CacheReferenceMixin, generics.ListCreateAPIView):
+    groupe_cache = "roles"
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated]
 
 
 # === UTILISATEUR ===
-class UtilisateurListAPIView(generics.ListAPIView):
+class UtilisateurListAPIView(LectureReplicaMixin, EagerLoadingMixin, generics.ListAPIView):
     queryset = Utilisateur.objects.all()
     serializer_class = UtilisateurSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
 
 class UtilisateurCreateAPIView(generics.CreateAPIView):
     queryset = Utilisateur.objects.all()
@@ -40,7 +80,8 @@ class UtilisateurCreateAPIView(generics.CreateAPIView):
     permission_classes = [permissions.AllowAny]
 
 # === CLIENT ===
-class ClientListCreateAPIView(generics.ListCreateAPIView):
+class ClientListCreateAPIView(CacheReferenceMixin, generics.ListCreateAPIView):
+    groupe_cache = "clients"
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
@@ -53,8 +94,8 @@ class ClientDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # === PERSONNEL ===
-class PersonnelListAPIView(generics.ListAPIView):
-    queryset = Personnel.objects.select_related('utilisateur')
+class PersonnelListAPIView(EagerLoadingMixin, generics.ListAPIView):
+    queryset = Personnel.objects.all()
     serializer_class = PersonnelSerializer
     permission_classes = [IsAuthenticated]
 
@@ -65,17 +106,17 @@ class PersonnelCreateAPIView(generics.CreateAPIView):
 
 
 # === PERSONNELCLIENT ===
-class PersonnelClientListCreateAPIView(generics.ListCreateAPIView):
-    queryset = PersonnelClient.objects.all().select_related("client")
+class PersonnelClientListCreateAPIView(EagerLoadingMixin, generics.ListCreateAPIView):
+    queryset = PersonnelClient.objects.all()
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         personnel_id = self.request.query_params.get("personnel_id")
 
         if personnel_id:
-            return PersonnelClient.objects.filter(personnel__id=personnel_id).select_related("client")
+            return super().get_queryset().filter(personnel__id=personnel_id)
         # Par défaut : l'utilisateur connecté
-        return PersonnelClient.objects.filter(personnel=self.request.user).select_related("client")
+        return super().get_queryset().filter(personnel=self.request.user)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -83,14 +124,15 @@ class PersonnelClientListCreateAPIView(generics.ListCreateAPIView):
         return PersonnelClientSerializer
 
 
-class PersonnelClientDetailAPIView(generics.RetrieveDestroyAPIView):
+class PersonnelClientDetailAPIView(EagerLoadingMixin, generics.RetrieveDestroyAPIView):
     queryset = PersonnelClient.objects.all()
     serializer_class = PersonnelClientSerializer
     permission_classes = [IsAuthenticated]
 
 
 # === TYPE LOGICIEL ===
-class TypeLogicielListCreateAPIView(generics.ListCreateAPIView):
+class TypeLogicielListCreateAPIView(CacheReferenceMixin, generics.ListCreateAPIView):
+    groupe_cache = "types_logiciels"
     queryset = TypeLogiciel.objects.all()
     serializer_class = TypeLogicielSerializer
     permission_classes = [IsAuthenticated]
@@ -98,14 +140,16 @@ class TypeLogicielListCreateAPIView(generics.ListCreateAPIView):
 
 # === TYPE PROBLEME ===
 
-class TypeProblemeListCreateAPIView(generics.ListCreateAPIView):
+class TypeProblemeListCreateAPIView(CacheReferenceMixin, generics.ListCreateAPIView):
+    groupe_cache = "types_problemes"
     queryset = TypeProbleme.objects.all()
     serializer_class = TypeProblemeSerializer
     permission_classes = [IsAuthenticated]
 
 
 # === LOGICIEL ===
-class LogicielListCreateAPIView(generics.ListCreateAPIView):
+class LogicielListCreateAPIView(CacheReferenceMixin, EagerLoadingMixin, generics.ListCreateAPIView):
+    groupe_cache = "logiciels"
     queryset = Logiciel.objects.all()
     permission_classes = [IsAuthenticated]
 
@@ -122,9 +166,12 @@ class LogicielDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 
 
 # === TICKET ===
-class TicketListCreateAPIView(generics.ListCreateAPIView):
+class TicketListCreateAPIView(LectureReplicaMixin, ProjectionMixin, EagerLoadingMixin, generics.ListCreateAPIView):
     queryset = Ticket.objects.all()
+    projection = TICKET_RESUME
     permission_classes = [IsAuthenticated]
+    pagination_class = TicketCursorPagination
+    filter_backends = [TicketFiltre]
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -132,29 +179,207 @@ class TicketListCreateAPIView(generics.ListCreateAPIView):
         return TicketReadSerializer
 
     def perform_create(self, serializer):
-        ticket = serializer.save()
-        envoyer_mail_prise_en_charge(ticket)
-        envoyer_mail_creation_ticket(ticket)  # Notifie admin et superviseur
+        # Les mails sont mis en file dans la même transaction que le ticket,
+        # puis envoyés par la commande `envoyer_mails`.
+        with transaction.atomic():
+            ticket = serializer.save()
+            envoyer_mail_prise_en_charge(ticket)
+            envoyer_mail_creation_ticket(ticket)  # Notifie admin et superviseur
 
 
-class TicketDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class TicketDetailAPIView(EtagTicketMixin, EagerLoadingMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = Ticket.objects.all()
     serializer_class = TicketReadSerializer
     permission_classes = [IsAuthenticated]
 
+    def etag_tickets(self, request, pk):
+        version = self.get_queryset().filter(pk=pk).values_list("version", flat=True).first()
+        return None if version is None else f'"t{pk}-{version}"'
+
+
+class TicketRechercheAPIView(generics.GenericAPIView):
+    """?q=... (syntaxe websearch sous PostgreSQL), filtres de TicketFiltre, ?page_size=."""
+    queryset = Ticket.objects.all()
+    serializer_class = TicketRechercheSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [TicketFiltre]
+
+    def get(self, request):
+        texte = request.query_params.get("q", "").strip()
+        if not texte:
+            raise ValidationError({"q": "Texte de recherche requis."})
+        limite = TicketCursorPagination().get_page_size(request)
+        resultats = rechercher(self.filter_queryset(self.get_queryset()), texte, limite)
+
+        tickets = optimiser_queryset(Ticket.objects.all(), self.serializer_class).in_bulk(
+            [pk for pk, _, _ in resultats]
+        )
+        ordonnes = []
+        for pk, rang, extrait in resultats:
+            ticket = tickets[pk]
+            ticket.rang, ticket.extrait = rang, surligner(extrait)
+            ordonnes.append(ticket)
+        return Response({"results": self.get_serializer(ordonnes, many=True).data})
+
+
+class TableauDeBordAPIView(APIView):
+    """Compteurs par statut et durées de résolution, lus dans StatistiqueTicket."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(tableau_de_bord())
+
+
+class TicketActionsAPIView(generics.GenericAPIView):
+    """POST {"ids": [...], "technicien": id|null, "statut": "..."} : une transaction pour tout le lot."""
+    serializer_class = TicketActionSerializer
+    permission_classes = [EstTriage]
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changements = dict(serializer.validated_data)
+        ids = changements.pop("ids")
+        resultats = appliquer_actions(ids, changements)
+        return Response({
+            "modifies": sum(r["resultat"] == "modifie" for r in resultats),
+            "resultats": resultats,
+        })
+
+
+# === IMPORT / EXPORT EN MASSE (staff) ===
+class TicketImportAPIView(APIView):
+    """Corps NDJSON (application/x-ndjson) ou CSV (text/csv), lu en flux ; cf. support/echange.py."""
+    permission_classes = [permissions.IsAdminUser]
+    lecteurs = {
+        "application/x-ndjson": lire_ndjson,
+        "application/jsonl": lire_ndjson,
+        "text/csv": lire_csv,
+    }
+
+    def post(self, request):
+        type_contenu = request.content_type.split(";")[0].strip()
+        if type_contenu not in self.lecteurs:
+            raise UnsupportedMediaType(type_contenu)
+        flux = request.stream or []
+        lignes = (ligne.decode("utf-8-sig") for ligne in flux)
+        return Response(importer(self.lecteurs[type_contenu](lignes)))
+
+
+class TicketExportAPIView(generics.GenericAPIView):
+    """?type=ndjson (défaut) ou csv, mêmes filtres que la liste ; réponse en flux."""
+    queryset = Ticket.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [TicketFiltre]
+    renderer_classes = [JSONRenderer, FichierRenderer]
+
+    def get(self, request):
+        tickets = self.filter_queryset(self.get_queryset())
+        if request.query_params.get("type") == "csv":
+            reponse = StreamingHttpResponse(export_csv(tickets), content_type="text/csv; charset=utf-8")
+            nom = "tickets.csv"
+        else:
+            reponse = StreamingHttpResponse(export_ndjson(tickets), content_type="application/x-ndjson")
+            nom = "tickets.ndjson"
+        reponse["Content-Disposition"] = f'attachment; filename="{nom}"'
+        return reponse
+
 
 # === RAPPORT ===
 class RapportListCreateAPIView(generics.ListCreateAPIView):
     queryset = Rapport.objects.all()
     serializer_class = RapportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
 
 
 # === FICHIER ===
-class FichierListAPIView(generics.ListAPIView):
+class FichierListAPIView(LectureReplicaMixin, generics.ListAPIView):
+    """?expand=ticket développe le ticket de chaque fichier."""
     queryset = Fichier.objects.all()
-    serializer_class = FichierSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
+    expansions = {"ticket"}
+
+    def expansions_demandees(self):
+        demandees = {nom.strip() for nom in self.request.query_params.get("expand", "").split(",") if nom.strip()}
+        if demandees - self.expansions:
+            raise ValidationError({"expand": f"Valeurs possibles : {', '.join(sorted(self.expansions))}."})
+        return demandees
+
+    def get_serializer_class(self):
+        if "ticket" in self.expansions_demandees():
+            return FichierTicketSerializer
+        return FichierListeSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if "ticket" in self.expansions_demandees():
+            # Prefetch plutôt que select_related : une seule instance par ticket,
+            # chargée avec le même plan que les listes de tickets
+            queryset = queryset.prefetch_related(
+                Prefetch("ticket", queryset=optimiser_queryset(Ticket.objects.all(), TicketReadSerializer))
+            )
+        return queryset
+
+
+class FichierTelechargementAPIView(generics.GenericAPIView):
+    queryset = Fichier.objects.all()
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, FichierRenderer]
+
+    def get(self, request, pk):
+        fichier = self.get_object()
+        # ?inline pour un affichage direct dans le navigateur (images, PDF)
+        return reponse_fichier(
+            request, fichier.fichier, nom=fichier.nom, as_attachment="inline" not in request.query_params
+        )
+
+
+# === TELEVERSEMENT (par morceaux) ===
+class TeleversementCreateAPIView(generics.CreateAPIView):
+    serializer_class = TeleversementSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(utilisateur=self.request.user)
+
+
+class TeleversementDetailAPIView(generics.RetrieveAPIView):
+    """GET : état (octets reçus) pour reprendre ; PUT : envoi d'un morceau (Content-Range)."""
+    serializer_class = TeleversementSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Televersement.objects.filter(utilisateur=self.request.user)
+
+    def put(self, request, pk):
+        televersement = self.get_object()
+        try:
+            # Le corps n'est jamais chargé en mémoire : il est lu en flux
+            televersement = ecrire_morceau(
+                televersement, request.stream,
+                request.headers.get("Content-Range"),
+                request.headers.get("X-Chunk-Sha256"),
+            )
+        except ErreurTeleversement as exc:
+            return Response({"detail": str(exc), "recu": self.get_object().recu}, status=exc.status)
+        return Response(self.get_serializer(televersement).data)
+
+
+class TeleversementTerminerAPIView(generics.GenericAPIView):
+    serializer_class = TeleversementSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return Televersement.objects.filter(utilisateur=self.request.user)
+
+    def post(self, request, pk):
+        try:
+            televersement = terminer(self.get_object(), request.data.get("sha256"))
+        except ErreurTeleversement as exc:
+            return Response({"detail": str(exc)}, status=exc.status)
+        return Response(self.get_serializer(televersement).data)
 
 
 # === PROFILE ===
@@ -167,40 +392,120 @@ class MeAPIView(APIView):
 
 ##""" GPT URL FOR TICKETS
 
-class MesTicketsAPIView(ListAPIView):
+class MesTicketsAPIView(EtagTicketMixin, ProjectionMixin, EagerLoadingMixin, ListAPIView):
+    queryset = Ticket.objects.all()
+    projection = TICKET_RESUME
     serializer_class = TicketReadSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TicketCursorPagination
+    filter_backends = [TicketFiltre]
 
     def get_queryset(self):
-        return Ticket.objects.filter(lien__personnel=self.request.user).select_related("lien__client", "logiciel")
-
-####mailling
-# Code Python pour envoyer un email depuis Django (backend)
+        return super().get_queryset().filter(lien__personnel=self.request.user)
+
+    def etag_tickets(self, request):
+        # Identifiants et versions de la seule page demandée (même curseur, même
+        # LIMIT que la liste, deux colonnes, sans jointure ni sérialisation) et
+        # existence d'une page suivante : les autres pages n'en font pas partie
+        queryset = self.get_queryset()
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(request, queryset, self)
+        pagination = self.pagination_class()
+        page = pagination.paginate_queryset(queryset.values("id", "version"), request, view=self)
+        lignes = ",".join(f"{ligne['id']}:{ligne['version']}" for ligne in page)
+        cle = f"{request.user.pk}|{request.get_full_path()}|{pagination.has_more}|{lignes}"
+        return '"' + hashlib.sha256(cle.encode()).hexdigest()[:32] + '"'
+
+
+# === ÉVÉNEMENTS DES TICKETS (SSE, servi par ASGI) ===
+class JetonFlux(Token):
+    """Jeton d'ouverture du flux SSE, seul accepté dans ?token= : l'URL finit dans les
+    journaux d'accès et des proxys, il ne vaut que EVENEMENTS_JETON_DUREE secondes et
+    n'est reconnu par aucune autre route (type "flux", refusé par JWTAuthentication)."""
+    token_type = "flux"
+    lifetime = timedelta(seconds=settings.EVENEMENTS_JETON_DUREE)
+
+
+class JetonEvenementsAPIView(APIView):
+    """POST : jeton d'ouverture du flux, à demander avant chaque connexion ou reconnexion."""
+    permission_classes = [IsAuthenticated]
 
-from django.core.mail import send_mail
-from django.conf import settings
+    def post(self, request):
+        return Response({"token": str(JetonFlux.for_user(request.user)),
+                         "expire_dans": settings.EVENEMENTS_JETON_DUREE})
 
-from django.core.mail import send_mail
 
-def envoyer_mail_prise_en_charge(ticket):
-    personnel = ticket.lien.personnel
-    destinataire = personnel.email
-    sujet = "Votre ticket a été pris en charge"
+async def flux_evenements(request):
+    """text/event-stream des tickets du personnel, de ses clients ou assignés au technicien.
 
-    message = (
-        f"Bonjour {personnel.get_full_name()},\n\n"
-        f"Votre ticket TKK00{ticket.id} concernant le client {ticket.lien.client.nom} "
-        f"et le logiciel {ticket.logiciel.nom} a été pris en charge par notre équipe support.\n\n"
-        f"📝 Description du problème :\n{ticket.description}\n\n"
-        f"Nous reviendrons vers vous dès que possible.\n\n"
-        f"Merci,\nL'équipe support TECHEXPERT SARL"
-    )
+    Jeton d'accès JWT dans Authorization, ou jeton d'ouverture (JetonFlux) dans
+    ?token= : EventSource ne peut pas envoyer d'en-tête.
+    """
+    utilisateur = await sync_to_async(_utilisateur_jwt)(request)
+    if utilisateur is None:
+        return JsonResponse({"detail": "Informations d'authentification non fournies ou invalides."}, status=401)
+    clients, tout_voir = await sync_to_async(_perimetre_evenements)(utilisateur)
 
-    send_mail(
-        sujet,
-        message,
-        None,  # utilise DEFAULT_FROM_EMAIL comme expéditeur
-        [destinataire],
-        fail_silently=False,
+    reponse = StreamingHttpResponse(
+        _flux(utilisateur.pk, clients, tout_voir), content_type="text/event-stream"
     )
-
+    reponse["Cache-Control"] = "no-cache"
+    reponse["X-Accel-Buffering"] = "no"  # nginx : pas de mise en tampon
+    return reponse
+
+
+def _utilisateur_jwt(request):
+    authentification = JWTAuthentication()
+    try:
+        resultat = authentification.authenticate(request)
+        if resultat is None and request.GET.get("token"):
+            return authentification.get_user(JetonFlux(request.GET["token"]))
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return None
+    return resultat[0] if resultat else None
+
+
+def _perimetre_evenements(utilisateur):
+    clients = set(PersonnelClient.objects.filter(personnel=utilisateur).values_list("client_id", flat=True))
+    return clients, any(utilisateur.has_role(role) for role in ROLES_TOUT_VOIR)
+
+
+async def _flux(utilisateur_id, clients, tout_voir):
+    abonnement = bus().abonner()
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                evenement = await abonnement.suivant(settings.EVENEMENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if abonnement.perdus:
+                # Des événements ont été perdus : le client recharge ses listes
+                abonnement.perdus = False
+                yield "event: resynchroniser\ndata: {}\n\n"
+            if concerne(evenement, utilisateur_id, clients, tout_voir):
+                yield f"event: {evenement['type']}\ndata: {json.dumps(evenement)}\n\n"
+    finally:
+        abonnement.fermer()
+
+
+# === MÉTRIQUES (format d'exposition Prometheus, hors /api/) ===
+def _acces_metriques(request):
+    if settings.METRIQUES_JETON and hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRIQUES_JETON}"
+    ):
+        return True
+    try:
+        adresse = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(adresse in ipaddress.ip_network(reseau) for reseau in settings.METRIQUES_RESEAUX_AUTORISES)
+
+
+def exposition_metriques(request):
+    if not _acces_metriques(request):
+        return HttpResponse(status=401 if settings.METRIQUES_JETON else 403)
+    familles = collecter()
+    familles.update(metriques_base())
+    return HttpResponse(exposition(familles), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,67 @@
+import importlib.util
+
+from django.core.exceptions import ImproperlyConfigured
+
+
+# === Configuration des bases de données par variables d'environnement ===
+#
+#   DB_ENGINE, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#       base principale (par défaut : le PostgreSQL local de développement) ;
+#   DB_CONN_MAX_AGE (secondes, défaut 60)
+#       connexions persistantes : une connexion sert plusieurs requêtes du même
+#       fil au lieu d'être ouverte et fermée à chaque requête ; 0 pour revenir
+#       à une connexion par requête ;
+#   DB_CONN_HEALTH_CHECKS (défaut 1)
+#       vérifie une connexion persistante avant de la réutiliser (une connexion
+#       coupée par le serveur est rouverte au lieu de faire échouer la requête) ;
+#   DB_POOL=1, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT
+#       pool de connexions de Django (psycopg 3 et psycopg_pool requis ; avec
+#       psycopg2, s'en tenir aux connexions persistantes ou à pgbouncer).
+#       Le pool remplace les connexions persistantes : CONN_MAX_AGE vaut alors 0 ;
+#   DB_REPLICA_HOST et/ou DB_REPLICA_NAME (+ DB_REPLICA_USER, _PASSWORD, _PORT)
+#       réplique en lecture, alias "replica" : les listes marquées
+#       LectureReplicaMixin y lisent (cf. support/routeurs.py). Les autres
+#       réglages sont ceux de la base principale.
+
+ALIAS_REPLICA = "replica"
+
+
+def _booleen(valeur):
+    return str(valeur).strip().lower() in ("1", "true", "yes", "oui", "on")
+
+
+def bases_depuis_environnement(environ):
+    """Retourne (DATABASES, alias de lecture ou None)."""
+    principale = {
+        "ENGINE": environ.get("DB_ENGINE", "django.db.backends.postgresql"),
+        "NAME": environ.get("DB_NAME", "ticketsys"),
+        "USER": environ.get("DB_USER", "techtk"),
+        "PASSWORD": environ.get("DB_PASSWORD", "1974"),
+        "HOST": environ.get("DB_HOST", "localhost"),
+        "PORT": environ.get("DB_PORT", "5432"),
+        "CONN_MAX_AGE": int(environ.get("DB_CONN_MAX_AGE", 60)),
+        "CONN_HEALTH_CHECKS": _booleen(environ.get("DB_CONN_HEALTH_CHECKS", "1")),
+        "OPTIONS": {},
+    }
+
+    if _booleen(environ.get("DB_POOL", "0")):
+        if importlib.util.find_spec("psycopg") is None or importlib.util.find_spec("psycopg_pool") is None:
+            raise ImproperlyConfigured("DB_POOL nécessite psycopg 3 et psycopg_pool (pip install 'psycopg[pool]').")
+        principale["CONN_MAX_AGE"] = 0
+        principale["OPTIONS"]["pool"] = {
+            "min_size": int(environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": float(environ.get("DB_POOL_TIMEOUT", 10)),
+        }
+
+    bases = {"default": principale}
+    if not (environ.get("DB_REPLICA_HOST") or environ.get("DB_REPLICA_NAME")):
+        return bases, None
+
+    replica = {**principale, "OPTIONS": dict(principale["OPTIONS"])}
+    for cle in ("NAME", "USER", "PASSWORD", "HOST", "PORT"):
+        replica[cle] = environ.get(f"DB_REPLICA_{cle}", principale[cle])
+    # Tests : la réplique pointe sur la base de test principale
+    replica["TEST"] = {"MIRROR": "default"}
+    bases[ALIAS_REPLICA] = replica
+    return bases, ALIAS_REPLICA
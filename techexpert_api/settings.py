@@ -9,9 +9,12 @@ https://docs.djangoproject.com/en/5.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
+import os
 from datetime import timedelta
 from pathlib import Path
 
+from .base_donnees import bases_depuis_environnement
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +52,9 @@ AUTH_USER_MODEL = 'support.Utilisateur'
 
 
 MIDDLEWARE = [
+    # Premier : mesure toute la chaîne ; retiré d'office si PROFILAGE_ACTIF est faux
+    'support.profilage.ProfilageMiddleware',
+    'support.metriques.MetriquesMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -57,6 +63,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Lecture de ses propres écritures ; retiré d'office sans réplique (BASE_LECTURE)
+    'support.routeurs.CoherenceLecturesMiddleware',
 ]
 
 
@@ -83,16 +91,13 @@ WSGI_APPLICATION = 'techexpert_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'ticketsys',
-        'USER': 'techtk',
-        'PASSWORD': '1974',
-        'HOST': 'localhost',
-        'PORT': '5432',
-    }
-}
+# Variables DB_* (cf. techexpert_api/base_donnees.py) : connexions persistantes
+# par défaut, pool psycopg 3 et réplique en lecture optionnels.
+DATABASES, BASE_LECTURE = bases_depuis_environnement(os.environ)
+# Lectures des vues LectureReplicaMixin vers BASE_LECTURE ; sans réplique : default
+DATABASE_ROUTERS = ['support.routeurs.RouteurLectures']
+# Secondes pendant lesquelles un client qui vient d'écrire relit sur la principale
+LECTURE_REPLICA_COHERENCE = 5
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
@@ -101,8 +106,16 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Taille de page par défaut des listes paginées par curseur (support.pagination)
+    'PAGE_SIZE': 50,
 }
 
+# Taille maximale demandable via ?page_size=
+PAGINATION_MAX_PAGE_SIZE = 500
+
+# PAGE_SIZE est global mais la pagination est choisie vue par vue
+SILENCED_SYSTEM_CHECKS = ['rest_framework.W001']
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -139,6 +152,72 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Téléversement par morceaux (support.televersement) : fichiers partiels
+TELEVERSEMENT_DIR = BASE_DIR / 'televersements'
+TELEVERSEMENT_TAILLE_MAX = 2 * 1024 ** 3  # 2 Go
+# Sessions sans activité depuis ce délai (secondes) supprimées par la commande
+# nettoyer_televersements, avec leurs fichiers partiels
+TELEVERSEMENT_EXPIRATION = 24 * 3600
+
+# Téléchargement des pièces jointes : préfixe de l'emplacement interne nginx
+# (ex. '/protected/') pour déléguer le transfert via X-Accel-Redirect.
+FICHIERS_X_ACCEL_REDIRECT = None
+
+# Caches. "references" (support.cache_references) et les destinataires des
+# notifications (support.notifications, cache par défaut) sont invalidés par
+# changement de version : le backend doit être partagé par tous les workers
+# pour que l'invalidation soit vue de tous. Les fichiers suffisent sur un seul hôte ;
+# sur plusieurs, par ex. :
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+# LocMemCache (propre à chaque processus) est refusé hors DEBUG (support/checks.py).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default',
+    },
+    'references': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'references',
+    },
+}
+
+# Flux d'événements des tickets (support.evenements) : BusLocal tant qu'un seul
+# processus sert l'API, BusPostgres (LISTEN/NOTIFY) avec plusieurs workers.
+EVENEMENTS_BACKEND = 'support.evenements.BusLocal'
+EVENEMENTS_HEARTBEAT = 15  # secondes entre deux commentaires SSE de maintien
+# Durée (secondes) du jeton d'ouverture passé en ?token= au flux SSE ; jamais le
+# jeton d'accès, qui finirait dans les journaux d'accès
+EVENEMENTS_JETON_DUREE = 60
+
+# Import en masse des tickets (support.echange) : lignes validées et insérées par lot
+IMPORT_TAILLE_LOT = 1000
+
+# Assignation automatique d'un technicien aux tickets créés sans technicien
+# (support.routage), parmi les ProfilTechnicien actifs
+ROUTAGE_AUTOMATIQUE = True
+
+# Profilage des requêtes (support.profilage) : en-tête Server-Timing et journal
+# support.profilage. Désactivé, le middleware est retiré de la chaîne.
+PROFILAGE_ACTIF = False
+PROFILAGE_ECHANTILLON = 1.0  # part des requêtes mesurées (SQL, sérialisation)
+PROFILAGE_MEMOIRE_ECHANTILLON = 0.01  # part des requêtes mesurées suivies par tracemalloc
+PROFILAGE_CPROFILE_ECHANTILLON = 0.0  # part des requêtes mesurées passées sous cProfile
+PROFILAGE_CPROFILE_SEUIL_MS = 500  # profil écrit seulement au-delà de cette durée
+PROFILAGE_CPROFILE_DIR = BASE_DIR / 'profils'
+PROFILAGE_DOUBLONS_MAX = 5  # empreintes SQL répétées citées dans le journal
+
+# Métriques Prometheus (support.metriques), exposées sur /metrics.
+# Plusieurs processus (workers, envoyer_mails) : dossier local commun où chacun
+# écrit son état, à vider au démarrage ; None : ce processus seulement.
+METRIQUES_DIR = None
+METRIQUES_INTERVALLE_ECRITURE = 1  # secondes entre deux écritures de l'état d'un processus
+# Accès à /metrics, refusé par défaut : "Authorization: Bearer <METRIQUES_JETON>",
+# ou adresse (REMOTE_ADDR) dans METRIQUES_RESEAUX_AUTORISES. Derrière un proxy
+# du même hôte, REMOTE_ADDR est celle du proxy : n'utiliser alors que le jeton.
+METRIQUES_JETON = os.environ.get('METRIQUES_JETON')
+METRIQUES_RESEAUX_AUTORISES = []  # ex. ['10.0.0.0/8'] pour un Prometheus du réseau interne
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -159,6 +238,13 @@ EMAIL_HOST_PASSWORD = 'bjis senb eaen bnba'  # Mot de passe d'application Gmail
 # Expéditeur affiché dans les mails reçus
 DEFAULT_FROM_EMAIL = 'TECHEXPERT SARL SUPPORT <techexpert@support.com>'
 
+# File d'envoi (support.outbox) : vidée par `python manage.py envoyer_mails`
+MAIL_OUTBOX_TAILLE_LOT = 50
+MAIL_OUTBOX_MAX_TENTATIVES = 5
+MAIL_OUTBOX_BACKOFF = 60  # secondes avant la 1re nouvelle tentative, doublé ensuite
+MAIL_OUTBOX_FENETRE = 2  # secondes d'attente pour regrouper une rafale de mails
+MAIL_OUTBOX_BAIL = 300  # secondes pendant lesquelles un lot réservé est caché aux autres workers
+
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),        # ⏱️ Durée du token d'accès (par défaut : 5 min)
@@ -22,6 +22,8 @@ from django.conf.urls.static import static
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from support.views import exposition_metriques
+
 from rest_framework import permissions
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import (
@@ -52,6 +54,7 @@ urlpatterns = [
 
     # === App ===
     path('api/', include('support.urls')),
+    path('metrics', exposition_metriques, name='metriques'),
 
     # Swagger / Redoc
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),